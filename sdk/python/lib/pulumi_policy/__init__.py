@@ -17,8 +17,10 @@ The Pulumi Policy SDK for Python.
 """
 
 # Make all module members inside of this package available as package members.
+from .graph import StackGraph
 from .policy import (
     EnforcementLevel,
+    ExecutionMode,
     Policy,
     PolicyConfigSchema,
     PolicyCustomTimeouts,
@@ -34,3 +36,4 @@ from .policy import (
     StackValidationArgs,
     StackValidationPolicy,
 )
+from .table import ResourceTable
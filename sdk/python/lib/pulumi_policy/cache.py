@@ -0,0 +1,416 @@
+# Copyright 2016-2020, Pulumi Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Caches that let the analyzer reuse work across RPCs: the engine calls `Analyze` for every resource
+and then `AnalyzeStack` with the same resources, and preview and update often run against the same
+plugin. A `DiskCache` lets the results of cacheable policies outlive the plugin, for repeated runs
+against the same stacks.
+"""
+
+from collections import OrderedDict
+import hashlib
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+from typing import Any, Generic, Hashable, List, NamedTuple, Optional, Set, Tuple, TypeVar
+
+from google.protobuf.message import Message
+
+try:
+    from importlib import metadata as _metadata
+except ImportError:  # Python < 3.8
+    _metadata = None  # type: ignore
+
+V = TypeVar("V")
+
+_LOGGER = logging.getLogger(__name__)
+
+# The size of a fingerprint's digest, in bytes: large enough that collisions aren't a concern for
+# the number of resources in a stack.
+_FINGERPRINT_SIZE = 16
+
+# How long a plugin waits for another plugin process writing to the same disk cache, in seconds.
+_DISK_CACHE_TIMEOUT = 5.0
+
+# Once a disk cache is over its limit, it evicts down to this fraction of the limit, so that it isn't
+# evicting on every write.
+_DISK_CACHE_LOW_WATER = 0.8
+
+
+class CacheStats(NamedTuple):
+    """
+    A snapshot of a cache's size and effectiveness.
+    """
+
+    hits: int
+    """
+    The number of lookups that found a value.
+    """
+
+    misses: int
+    """
+    The number of lookups that didn't find a value.
+    """
+
+    evictions: int
+    """
+    The number of values evicted to stay within the cache's size limit.
+    """
+
+    entries: int
+    """
+    The number of values in the cache.
+    """
+
+    size_bytes: int
+    """
+    The estimated size of the values in the cache.
+    """
+
+    max_size_bytes: int
+    """
+    The limit on the estimated size of the values in the cache.
+    """
+
+    errors: int = 0
+    """
+    The number of operations on the cache that failed. Only a `DiskCache` has failures.
+    """
+
+
+class LRUCache(Generic[V]):
+    """
+    A thread-safe cache that evicts the least recently used values once the estimated size of its
+    values is over a limit. Values are shared by everyone who looks them up, so they should be
+    immutable.
+    """
+
+    def __init__(self, max_size_bytes: int) -> None:
+        """
+        :param int max_size_bytes: The limit on the estimated size of the values in the cache. A value
+               larger than the limit is never cached.
+        """
+        if not isinstance(max_size_bytes, int) or max_size_bytes <= 0:
+            raise TypeError("Expected max_size_bytes to be a positive integer")
+        self.__max_size_bytes = max_size_bytes
+        self.__entries: 'OrderedDict[Hashable, Any]' = OrderedDict()
+        self.__lock = threading.Lock()
+        self.__size_bytes = 0
+        self.__hits = 0
+        self.__misses = 0
+        self.__evictions = 0
+
+    def get(self, key: Hashable) -> Optional[V]:
+        """
+        Returns the value for the key, or `None` if it isn't in the cache.
+        """
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is None:
+                self.__misses += 1
+                return None
+            self.__entries.move_to_end(key)
+            self.__hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, value: V, size_bytes: int) -> None:
+        """
+        Adds a value with the given estimated size, evicting the least recently used values if the
+        cache is over its limit.
+        """
+        if size_bytes > self.__max_size_bytes:
+            return
+        with self.__lock:
+            previous = self.__entries.pop(key, None)
+            if previous is not None:
+                self.__size_bytes -= previous[1]
+            self.__entries[key] = (value, size_bytes)
+            self.__size_bytes += size_bytes
+            while self.__size_bytes > self.__max_size_bytes:
+                _, (_, evicted_size) = self.__entries.popitem(last=False)
+                self.__size_bytes -= evicted_size
+                self.__evictions += 1
+
+    def clear(self) -> None:
+        """
+        Removes every value from the cache.
+        """
+        with self.__lock:
+            self.__entries.clear()
+            self.__size_bytes = 0
+
+    def stats(self) -> CacheStats:
+        """
+        Returns a snapshot of the cache's size and effectiveness.
+        """
+        with self.__lock:
+            return CacheStats(self.__hits, self.__misses, self.__evictions, len(self.__entries),
+                              self.__size_bytes, self.__max_size_bytes)
+
+
+class DiskCache:
+    """
+    A cache of byte strings in a SQLite database, shared by every plugin process that opens the same
+    file. The database uses write-ahead logging, so that readers don't block each other or the
+    writer, and each write is a transaction of its own. Once the total size of the values is over a
+    limit, the least recently used values are evicted.
+
+    The cache is best-effort: if the database can't be read or written, e.g. because another process
+    holds the write lock for too long, lookups miss and values aren't stored, and the error is counted
+    rather than raised. If the database can't be opened at all, e.g. because the file isn't a SQLite
+    database or is read-only, the error is logged and the cache stays empty.
+    """
+
+    def __init__(self, path: str, max_size_bytes: int) -> None:
+        """
+        :param str path: The path of the database file, which is created if it doesn't exist.
+        :param int max_size_bytes: The limit on the total size of the values in the cache.
+        """
+        if not path or not isinstance(path, str):
+            raise TypeError("Expected path to be a non-empty string")
+        if not isinstance(max_size_bytes, int) or max_size_bytes <= 0:
+            raise TypeError("Expected max_size_bytes to be a positive integer")
+        self.__max_size_bytes = max_size_bytes
+        self.__lock = threading.Lock()
+        self.__hits = 0
+        self.__misses = 0
+        self.__evictions = 0
+        self.__errors = 0
+        self.__size_bytes = 0
+        self.__db: Optional[sqlite3.Connection] = None
+        db: Optional[sqlite3.Connection] = None
+        try:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            db = sqlite3.connect(path, timeout=_DISK_CACHE_TIMEOUT, isolation_level=None, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute("CREATE TABLE IF NOT EXISTS entries ("
+                       "key BLOB PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, accessed REAL NOT NULL)")
+            db.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+            # The total size is only read from the database when the cache is opened. Other processes
+            # writing to the same file are accounted for when this one next evicts.
+            self.__size_bytes = db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        except (sqlite3.Error, OSError) as e:
+            _LOGGER.warning("Disabling the disk cache: can't open %s: %s", path, e)
+            self.__errors += 1
+            if db is not None:
+                db.close()
+            return
+        self.__db = db
+
+    def get(self, key: bytes) -> Optional[bytes]:
+        """
+        Returns the value for the key, or `None` if it isn't in the cache.
+        """
+        with self.__lock:
+            if self.__db is None:
+                return None
+            try:
+                row = self.__db.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    self.__db.execute("UPDATE entries SET accessed = ? WHERE key = ?", (time.time(), key))
+            except sqlite3.Error:
+                self.__errors += 1
+                row = None
+            if row is None:
+                self.__misses += 1
+                return None
+            self.__hits += 1
+            return row[0]
+
+    def put(self, key: bytes, value: bytes) -> None:
+        """
+        Adds a value, evicting the least recently used values if the cache is over its limit.
+        """
+        size = len(key) + len(value)
+        if size > self.__max_size_bytes:
+            return
+        with self.__lock:
+            if self.__db is None:
+                return
+            try:
+                self.__db.execute("INSERT OR REPLACE INTO entries (key, value, size, accessed) VALUES (?, ?, ?, ?)",
+                                  (key, value, size, time.time()))
+                self.__size_bytes += size
+                if self.__size_bytes > self.__max_size_bytes:
+                    self.__evict()
+            except sqlite3.Error:
+                self.__errors += 1
+
+    def clear(self) -> None:
+        """
+        Removes every value from the cache, for every process using it.
+        """
+        with self.__lock:
+            if self.__db is None:
+                return
+            try:
+                self.__db.execute("DELETE FROM entries")
+                self.__size_bytes = 0
+            except sqlite3.Error:
+                self.__errors += 1
+
+    def close(self) -> None:
+        """
+        Closes the database. Lookups on a closed cache miss, and values aren't stored.
+        """
+        with self.__lock:
+            if self.__db is not None:
+                self.__db.close()
+                self.__db = None
+
+    def errors(self) -> int:
+        """
+        Returns the number of database operations that failed.
+        """
+        with self.__lock:
+            return self.__errors
+
+    def stats(self) -> CacheStats:
+        """
+        Returns a snapshot of the cache's size and effectiveness. The entries and size include the
+        values stored by other processes.
+        """
+        with self.__lock:
+            entries, size = 0, 0
+            if self.__db is not None:
+                try:
+                    entries, size = self.__db.execute(
+                        "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+                except sqlite3.Error:
+                    self.__errors += 1
+            return CacheStats(self.__hits, self.__misses, self.__evictions, entries, size, self.__max_size_bytes,
+                              self.__errors)
+
+    def __evict(self) -> None:
+        """
+        Evicts the least recently used values until the cache is under its low-water mark, in a single
+        transaction so that concurrent evictions by other processes don't overshoot.
+        """
+        assert self.__db is not None
+        self.__db.execute("BEGIN IMMEDIATE")
+        try:
+            total = self.__db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            target = int(self.__max_size_bytes * _DISK_CACHE_LOW_WATER)
+            evicted: List[Tuple[bytes]] = []
+            if total > self.__max_size_bytes:
+                for key, size in self.__db.execute("SELECT key, size FROM entries ORDER BY accessed"):
+                    if total <= target:
+                        break
+                    evicted.append((key,))
+                    total -= size
+                self.__db.executemany("DELETE FROM entries WHERE key = ?", evicted)
+            self.__db.execute("COMMIT")
+        except BaseException:
+            self.__db.execute("ROLLBACK")
+            raise
+        self.__evictions += len(evicted)
+        self.__size_bytes = total
+
+
+def source_digest(directory: str) -> bytes:
+    """
+    Returns a digest of the Python source files in a directory and its subdirectories, skipping
+    hidden directories, `__pycache__`, and virtual environments. Results cached on disk are keyed by
+    the digest of the policy pack's source, so that editing a policy invalidates them.
+    """
+    h = hashlib.blake2b(digest_size=_FINGERPRINT_SIZE)
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = sorted(d for d in dirs if not d.startswith(".") and d != "__pycache__"
+                         and not os.path.exists(os.path.join(root, d, "pyvenv.cfg")))
+        for name in sorted(files):
+            if not name.endswith(".py"):
+                continue
+            path = os.path.join(root, name)
+            with open(path, "rb") as f:
+                data = f.read()
+            relative = os.path.relpath(path, directory).encode("utf-8")
+            for part in (relative, data):
+                h.update(len(part).to_bytes(8, "little"))
+                h.update(part)
+    return h.digest()
+
+
+def environment_digest() -> bytes:
+    """
+    Returns a digest of the Python version and of the names and versions of the installed
+    distributions. Results cached on disk are also keyed by the digest, so that upgrading a library
+    the policy pack imports invalidates them. Changes to modules that aren't installed distributions,
+    or to a distribution that's edited in place without changing its version, aren't noticed.
+    """
+    parts = [sys.version]
+    if _metadata is not None:
+        parts.extend(sorted(f"{dist.metadata['Name']}=={dist.version}" for dist in _metadata.distributions()))
+    return fingerprint(*parts)
+
+
+def fingerprint(*parts: Any) -> bytes:
+    """
+    Returns a digest of the given protobuf messages and strings. Messages are serialized
+    deterministically, so equal messages have equal fingerprints.
+    """
+    h = hashlib.blake2b(digest_size=_FINGERPRINT_SIZE)
+    for part in parts:
+        data = (part.SerializeToString(deterministic=True) if isinstance(part, Message)
+                else str(part).encode("utf-8"))
+        # Prefix each part with its length, so that different splits of the same bytes differ.
+        h.update(len(data).to_bytes(8, "little"))
+        h.update(data)
+    return h.digest()
+
+
+def estimate_size(value: Any) -> int:
+    """
+    Returns an estimate of the memory held by a value: the sizes of the value and of the objects it
+    refers to through containers and slots, counting shared objects once.
+    """
+    seen: Set[int] = set()
+    total = 0
+    stack: List[Any] = [value]
+    while stack:
+        v = stack.pop()
+        if id(v) in seen:
+            continue
+        seen.add(id(v))
+        total += sys.getsizeof(v)
+        cls = v.__class__
+        if cls is str or cls is float or cls is bool or cls is int or v is None:
+            continue
+        if isinstance(v, dict):
+            stack.extend(v.keys())
+            stack.extend(v.values())
+        elif isinstance(v, (tuple, list, set, frozenset)):
+            stack.extend(v)
+        else:
+            stack.extend(_attribute_values(v))
+    return total
+
+
+def _attribute_values(obj: Any) -> List[Any]:
+    values: List[Any] = list(vars(obj).values()) if hasattr(obj, "__dict__") else []
+    for cls in obj.__class__.__mro__:
+        slots = cls.__dict__.get("__slots__", ())
+        for name in (slots,) if isinstance(slots, str) else slots:
+            if name.startswith("__") and not name.endswith("__"):
+                name = f"_{cls.__name__.lstrip('_')}{name}"
+            value = getattr(obj, name, None)
+            if value is not None:
+                values.append(value)
+    return values
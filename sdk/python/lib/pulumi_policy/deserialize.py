@@ -12,9 +12,11 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from typing import Any, Dict, List, Union
+import math
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 
 import pulumi
+from google.protobuf import struct_pb2
 
 # SPECIAL_SIG_KEY is sometimes used to encode type identity inside of a map.
 # See https://github.com/pulumi/pulumi/blob/master/sdk/go/common/resource/properties.go.
@@ -32,6 +34,110 @@ SPECIAL_ARCHIVE_SIG = "0def7320c3a5731c473e5ecbe6d01bc7"
 # See https://github.com/pulumi/pulumi/blob/master/sdk/go/common/resource/properties.go.
 SPECIAL_SECRET_SIG = "1b47061264138c4ac30d75fd1eb44270"
 
+def deserialize_struct(struct: struct_pb2.Struct) -> Dict[str, Any]:
+    """
+    Deserializes properties from a gRPC `Struct`. The result is the same as
+    `deserialize_properties(json_format.MessageToDict(struct))`, but the `Struct` is walked once,
+    decoding assets, archives, and secrets along the way. The walk is iterative, so deeply nested
+    properties don't hit the recursion limit.
+    """
+    return _convert_struct(struct, True)
+
+def _convert_struct(struct: struct_pb2.Struct, decode: bool) -> Dict[str, Any]:
+    result: Dict[str, Any] = {}
+    _fill([(struct.fields, result)], decode)
+    return result
+
+def _fill(pending: List[Tuple[Any, Any]], decode: bool) -> None:
+    """
+    Converts the values of the pending structs and lists, given with the dict or list that receives
+    them. A nested struct or list is added to its parent right away, as an empty container that's
+    added to `pending` and filled in later, so the order of keys and elements is preserved.
+    """
+    while pending:
+        values, target = pending.pop()
+        if isinstance(target, dict):
+            for key, value in values.items():
+                target[key] = _VALUE_CONVERTERS[value.WhichOneof("kind")](value, pending, decode)
+        else:
+            for value in values:
+                target.append(_VALUE_CONVERTERS[value.WhichOneof("kind")](value, pending, decode))
+
+def _convert_value(value: struct_pb2.Value, pending: List[Tuple[Any, Any]], decode: bool) -> Any:
+    return _VALUE_CONVERTERS[value.WhichOneof("kind")](value, pending, decode)
+
+# The converters for each kind of `Value` share a signature so that they can be dispatched with a table.
+# pylint: disable=unused-argument
+
+def _convert_null(value: struct_pb2.Value, pending: List[Tuple[Any, Any]], decode: bool) -> Any:
+    return None
+
+def _convert_number(value: struct_pb2.Value, pending: List[Tuple[Any, Any]], decode: bool) -> Any:
+    number = value.number_value
+    # Like `MessageToDict`, which can't represent these as JSON numbers.
+    if math.isinf(number):
+        raise ValueError("Fail to serialize Infinity for Value.number_value, which would parse as string_value")
+    if math.isnan(number):
+        raise ValueError("Fail to serialize NaN for Value.number_value, which would parse as string_value")
+    return number
+
+def _convert_string(value: struct_pb2.Value, pending: List[Tuple[Any, Any]], decode: bool) -> Any:
+    return value.string_value
+
+def _convert_bool(value: struct_pb2.Value, pending: List[Tuple[Any, Any]], decode: bool) -> Any:
+    return value.bool_value
+
+def _convert_struct_value(value: struct_pb2.Value, pending: List[Tuple[Any, Any]], decode: bool) -> Any:
+    fields = value.struct_value.fields
+    if decode and SPECIAL_SIG_KEY in fields:
+        return _decode_special(value.struct_value, pending)
+    d: Dict[str, Any] = {}
+    pending.append((fields, d))
+    return d
+
+def _convert_list_value(value: struct_pb2.Value, pending: List[Tuple[Any, Any]], decode: bool) -> Any:
+    elems: List[Any] = []
+    pending.append((value.list_value.values, elems))
+    return elems
+
+# pylint: enable=unused-argument
+
+_VALUE_CONVERTERS: Dict[Any, Callable[[struct_pb2.Value, List[Tuple[Any, Any]], bool], Any]] = {
+    None: _convert_null,
+    "null_value": _convert_null,
+    "number_value": _convert_number,
+    "string_value": _convert_string,
+    "bool_value": _convert_bool,
+    "struct_value": _convert_struct_value,
+    "list_value": _convert_list_value,
+}
+
+def _decode_special(struct: struct_pb2.Struct, pending: List[Tuple[Any, Any]]) -> Any:
+    secret, decoded = _decode_signature(struct)
+    if secret is not None:
+        return _convert_value(secret, pending, True)
+    return decoded
+
+def _decode_signature(struct: struct_pb2.Struct) -> Tuple[Optional[struct_pb2.Value], Any]:
+    """
+    Decodes a `Struct` with a `SPECIAL_SIG_KEY`. Returns the secret's value, still to be converted, for
+    a secret, or the `Asset` or `Archive` otherwise.
+    """
+    fields = struct.fields
+    sig_pending: List[Tuple[Any, Any]] = []
+    sig = _convert_value(fields[SPECIAL_SIG_KEY], sig_pending, False)
+    _fill(sig_pending, False)
+    # Assets and archives are small, so convert them as is and decode them like `deserialize_properties`.
+    if sig == SPECIAL_ASSET_SIG:
+        return None, _deserialize_asset(_convert_struct(struct, False))
+    if sig == SPECIAL_ARCHIVE_SIG:
+        return None, _deserialize_archive(_convert_struct(struct, False))
+    if sig == SPECIAL_SECRET_SIG:
+        if "value" not in fields:
+            raise AssertionError("Invalid secret encountered when unmarshaling resource property")
+        return fields["value"], None
+    raise AssertionError(f"Unrecognized signature '{sig}' when unmarshaling resource property")
+
 def deserialize_properties(props: Dict[str, Any]) -> Dict[str, Any]:
     """
     Deserializes properties from a gRPC call result.
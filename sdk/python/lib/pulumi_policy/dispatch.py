@@ -0,0 +1,72 @@
+# Copyright 2016-2020, Pulumi Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import fnmatch
+import re
+from typing import Dict, Generic, List, Optional, Pattern, Sequence, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class ResourceTypeIndex(Generic[T]):
+    """
+    Maps a resource type to the items (policies) that apply to it, in the order the items were given.
+    Each item declares the resource types it applies to, either exact type tokens or glob-style
+    patterns such as `kubernetes:*`, or `None` to apply to every type. Exact types are indexed up front;
+    patterns are matched the first time a resource type is seen, and the result is memoized so later
+    lookups for the same type are a single dictionary lookup.
+    """
+
+    __items: List[T]
+    __all: List[int]
+    __exact: Dict[str, List[int]]
+    __patterns: List[Tuple[int, Pattern[str]]]
+    __cache: Dict[str, List[T]]
+
+    def __init__(self, items: Sequence[Tuple[T, Optional[Sequence[str]]]]) -> None:
+        self.__items = []
+        self.__all = []
+        self.__exact = {}
+        self.__patterns = []
+        self.__cache = {}
+        for i, (item, resource_types) in enumerate(items):
+            self.__items.append(item)
+            if resource_types is None:
+                self.__all.append(i)
+                continue
+            for t in resource_types:
+                if is_resource_type_pattern(t):
+                    self.__patterns.append((i, re.compile(fnmatch.translate(t))))
+                else:
+                    self.__exact.setdefault(t, []).append(i)
+
+    def lookup(self, resource_type: str) -> List[T]:
+        """
+        Returns the items that apply to resources of the given type.
+        """
+        items = self.__cache.get(resource_type)
+        if items is None:
+            indices = set(self.__all)
+            indices.update(self.__exact.get(resource_type, []))
+            indices.update(i for i, pattern in self.__patterns if pattern.match(resource_type))
+            items = [self.__items[i] for i in sorted(indices)]
+            self.__cache[resource_type] = items
+        return items
+
+
+def is_resource_type_pattern(resource_type: str) -> bool:
+    """
+    Returns whether the resource type is a glob-style pattern rather than an exact type token.
+    """
+    return any(c in resource_type for c in "*?[")
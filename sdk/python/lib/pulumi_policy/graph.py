@@ -0,0 +1,434 @@
+# Copyright 2016-2020, Pulumi Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import heapq
+from typing import (TYPE_CHECKING, Any, Callable, Dict, FrozenSet, Iterable, List, Mapping, Optional, Sequence, Set,
+                    Tuple, cast)
+
+if TYPE_CHECKING:
+    from .policy import PolicyResource
+    from .table import ResourceTable
+
+_EMPTY: Tuple = ()
+
+
+class StackGraph:
+    """
+    StackGraph indexes the resources in a stack by type, by URN, and by their relationships to each
+    other, so that stack validations can look resources up without scanning the whole stack, and
+    walks the resource tree and dependency graph without recursion, so deep graphs don't hit the
+    recursion limit. Each index and result is computed the first time it's used, and the graph is
+    shared by every stack validation in a request, so it's computed at most once per request. The
+    graph must not be modified while it's in use.
+
+    The indexes are built from the columns of the stack's `ResourceTable`, so building them doesn't
+    create a `PolicyResource` for every resource: only the resources a lookup returns are created.
+    """
+
+    __slots__ = ("__resources", "__table", "__by_type", "__children", "__dependents", "__property_dependents",
+                 "__found", "__edges", "__reverse_edges", "__ancestors", "__descendants", "__transitive_dependencies",
+                 "__transitive_dependents", "__topological_order", "__cycles", "__components")
+
+    def __init__(self, resources: Sequence['PolicyResource'], table: Optional['ResourceTable'] = None) -> None:
+        """
+        :param Sequence[PolicyResource] resources: The resources in the stack.
+        :param Optional[ResourceTable] table: The table of the resources, which the indexes are built from.
+               When not specified, it's built from the resources on first use.
+        """
+        self.__resources = resources
+        self.__table = table
+        # Validations may run concurrently, so two of them can race to build the same index. Each
+        # index is only assigned once it's complete, so that just duplicates the work.
+        # The indexes and graph algorithms work on resource ids in the table rather than on resources.
+        self.__by_type: Optional[Dict[str, Tuple[int, ...]]] = None
+        self.__children: Optional[Dict[int, Tuple[int, ...]]] = None
+        self.__dependents: Optional[Dict[int, Tuple[int, ...]]] = None
+        self.__property_dependents: Optional[Dict[int, Tuple[Tuple[int, str], ...]]] = None
+        # The resources returned by each lookup, by the name of the index and the key, so that the same
+        # lookup returns the same tuple.
+        self.__found: Dict[Tuple[str, Any], Tuple] = {}
+        self.__edges: Optional[List[Tuple[int, ...]]] = None
+        self.__reverse_edges: Optional[List[Tuple[int, ...]]] = None
+        self.__ancestors: Dict[int, Tuple['PolicyResource', ...]] = {}
+        self.__descendants: Dict[int, Tuple['PolicyResource', ...]] = {}
+        self.__transitive_dependencies: Dict[int, FrozenSet[int]] = {}
+        self.__transitive_dependents: Dict[int, FrozenSet[int]] = {}
+        self.__topological_order: Optional[Tuple['PolicyResource', ...]] = None
+        self.__cycles: Optional[Tuple[Tuple['PolicyResource', ...], ...]] = None
+        self.__components: Optional[Tuple[Tuple['PolicyResource', ...], ...]] = None
+
+    @property
+    def resources(self) -> Sequence['PolicyResource']:
+        """
+        The resources in the stack.
+        """
+        return self.__resources
+
+    def of_type(self, resource_type: str) -> Sequence['PolicyResource']:
+        """
+        Returns the resources of the given type, e.g. `aws:s3/bucket:Bucket`, in stack order.
+        """
+        if self.__by_type is None:
+            by_type: Dict[str, List[int]] = {}
+            for i, t in enumerate(self.__get_table().types):
+                by_type.setdefault(t, []).append(i)
+            self.__by_type = _freeze(by_type)
+        return self.__lookup("type", resource_type, self.__by_type)
+
+    def get(self, urn: str) -> Optional['PolicyResource']:
+        """
+        Returns the resource with the given URN, or `None` if there is no such resource in the stack.
+        """
+        table = self.__get_table()
+        i = table.id(urn)
+        return table.resource(i) if i is not None else None
+
+    def children(self, resource: 'PolicyResource') -> Sequence['PolicyResource']:
+        """
+        Returns the resources whose parent is the given resource, in stack order.
+        """
+        return self.__lookup("children", self.__get_table().id(resource.urn), self.__child_ids())
+
+    def dependents(self, resource: 'PolicyResource') -> Sequence['PolicyResource']:
+        """
+        Returns the resources that depend on the given resource, in stack order.
+        """
+        if self.__dependents is None:
+            table = self.__get_table()
+            dependents: Dict[int, List[int]] = {}
+            for i in range(len(table)):
+                for d in table.dependencies(i):
+                    dependents.setdefault(d, []).append(i)
+            self.__dependents = _freeze(dependents)
+        return self.__lookup("dependents", self.__get_table().id(resource.urn), self.__dependents)
+
+    def property_dependents(self, resource: 'PolicyResource') -> Sequence[Tuple['PolicyResource', str]]:
+        """
+        Returns the resources with a property that depends on the given resource, in stack order, as
+        pairs of the dependent resource and the name of its property.
+        """
+        table = self.__get_table()
+        if self.__property_dependents is None:
+            offsets, names, ids = (table.property_dependency_offsets, table.property_dependency_names,
+                                   table.property_dependency_ids)
+            dependents: Dict[int, List[Tuple[int, str]]] = {}
+            for i in range(len(table)):
+                for j in range(offsets[i], offsets[i + 1]):
+                    if ids[j] >= 0:
+                        dependents.setdefault(ids[j], []).append((i, names[j]))
+            self.__property_dependents = _freeze(dependents)
+        target = table.id(resource.urn)
+        key = ("property_dependents", target)
+        found = self.__found.get(key)
+        if found is None:
+            pairs = self.__property_dependents.get(target, _EMPTY) if target is not None else _EMPTY
+            found = tuple((table.resource(i), prop) for i, prop in pairs)
+            self.__found[key] = found
+        return found
+
+    def ancestors(self, resource: 'PolicyResource') -> Sequence['PolicyResource']:
+        """
+        Returns the given resource's parent, its parent's parent, and so on up to the root of the
+        resource tree, nearest first. The number of ancestors is the resource's depth in the tree. If
+        the parents form a cycle, the walk stops before it returns a resource a second time.
+        """
+        table = self.__get_table()
+        i = table.id(resource.urn)
+        if i is None:
+            return _EMPTY
+        cached = self.__ancestors.get(i)
+        if cached is not None:
+            return cached
+        chain: List[int] = []
+        seen: Set[int] = set()
+        parent = table.parent(i)
+        while parent is not None and parent not in seen:
+            chain.append(parent)
+            seen.add(parent)
+            found = self.__ancestors.get(parent)
+            if found is not None:
+                for ancestor in found:
+                    j = cast(int, table.id(ancestor.urn))
+                    if j in seen:
+                        break
+                    chain.append(j)
+                    seen.add(j)
+                break
+            parent = table.parent(parent)
+        result = tuple(table.resource(j) for j in chain)
+        self.__ancestors[i] = result
+        return result
+
+    def descendants(self, resource: 'PolicyResource') -> Sequence['PolicyResource']:
+        """
+        Returns the given resource's children, their children, and so on, in stack order. If the
+        parents form a cycle, each resource on it is only returned once.
+        """
+        i = self.__get_table().id(resource.urn)
+        if i is None:
+            return _EMPTY
+        cached = self.__descendants.get(i)
+        if cached is not None:
+            return cached
+        children = self.__child_ids()
+        found: List[int] = []
+        seen: Set[int] = set()
+        stack = list(children.get(i, _EMPTY))
+        while stack:
+            child = stack.pop()
+            if child in seen:
+                continue
+            found.append(child)
+            seen.add(child)
+            stack.extend(children.get(child, _EMPTY))
+        result = self.__in_stack_order(found)
+        self.__descendants[i] = result
+        return result
+
+    def transitive_dependencies(self, resource: 'PolicyResource') -> Sequence['PolicyResource']:
+        """
+        Returns the resources the given resource depends on, directly or indirectly, in stack order. A
+        resource depends on its `dependencies` and on the resources in its `property_dependencies`.
+        """
+        edges = self.__dependency_edges()
+        closure = _closure(self.__position(resource), edges.__getitem__, self.__transitive_dependencies)
+        return self.__in_stack_order(closure)
+
+    def transitive_dependents(self, resource: 'PolicyResource') -> Sequence['PolicyResource']:
+        """
+        Returns the resources that depend on the given resource, directly or indirectly, in stack order.
+        """
+        dependents = self.__dependent_edges()
+        closure = _closure(self.__position(resource), dependents.__getitem__, self.__transitive_dependents)
+        return self.__in_stack_order(closure)
+
+    def topological_order(self) -> Sequence['PolicyResource']:
+        """
+        Returns the resources ordered so that every resource comes after the resources it depends on,
+        otherwise keeping stack order. Raises a `ValueError` if the dependencies have a cycle.
+        """
+        if self.__topological_order is None:
+            edges = self.__dependency_edges()
+            dependents = self.__dependent_edges()
+            remaining = [len(e) for e in edges]
+            # Resources become ready in stack order, and a heap keeps the order stable when a
+            # resource's last dependency is resolved.
+            ready = [i for i, n in enumerate(remaining) if n == 0]
+            heapq.heapify(ready)
+            order: List[int] = []
+            while ready:
+                i = heapq.heappop(ready)
+                order.append(i)
+                for j in dependents[i]:
+                    remaining[j] -= 1
+                    if remaining[j] == 0:
+                        heapq.heappush(ready, j)
+            if len(order) < len(edges):
+                raise ValueError("The stack's resource dependencies have a cycle")
+            table = self.__get_table()
+            self.__topological_order = tuple(table.resource(i) for i in order)
+        return self.__topological_order
+
+    def cycles(self) -> Sequence[Sequence['PolicyResource']]:
+        """
+        Returns the groups of resources whose dependencies form a cycle: each group is a strongly
+        connected component of the dependency graph with more than one resource, or a single resource
+        that depends on itself. Groups and the resources in them are in stack order.
+        """
+        if self.__cycles is None:
+            edges = self.__dependency_edges()
+            groups = [g for g in _strongly_connected(edges) if len(g) > 1 or g[0] in edges[g[0]]]
+            self.__cycles = tuple(self.__in_stack_order(g) for g in sorted(groups, key=min))
+        return self.__cycles
+
+    def components(self) -> Sequence[Sequence['PolicyResource']]:
+        """
+        Returns the groups of resources that are connected to each other by parent, dependency, or
+        property dependency relationships, in either direction. Groups and the resources in them are
+        in stack order.
+        """
+        if self.__components is None:
+            table = self.__get_table()
+            edges = self.__dependency_edges()
+            roots = list(range(len(edges)))
+
+            def find(i: int) -> int:
+                while roots[i] != i:
+                    roots[i] = roots[roots[i]]
+                    i = roots[i]
+                return i
+
+            for i, deps in enumerate(edges):
+                linked = list(deps)
+                parent = table.parent(i)
+                if parent is not None:
+                    linked.append(parent)
+                for j in linked:
+                    a, b = find(i), find(j)
+                    if a != b:
+                        roots[max(a, b)] = min(a, b)
+            groups: Dict[int, List[int]] = {}
+            for i in range(len(edges)):
+                groups.setdefault(find(i), []).append(i)
+            self.__components = tuple(tuple(table.resource(i) for i in g) for g in groups.values())
+        return self.__components
+
+    def __get_table(self) -> 'ResourceTable':
+        if self.__table is None:
+            # pylint: disable=import-outside-toplevel,cyclic-import
+            from .table import table_from_resources
+            self.__table = table_from_resources(self.__resources)
+        return self.__table
+
+    def __lookup(self, name: str, key: Any, index: Mapping[Any, Tuple[int, ...]]) -> Tuple['PolicyResource', ...]:
+        """
+        Returns the resources with the ids under `key` in the index, creating them on first use.
+        """
+        found = self.__found.get((name, key))
+        if found is None:
+            table = self.__get_table()
+            found = tuple(table.resource(i) for i in index.get(key, _EMPTY))
+            self.__found[(name, key)] = found
+        return found
+
+    def __child_ids(self) -> Dict[int, Tuple[int, ...]]:
+        if self.__children is None:
+            children: Dict[int, List[int]] = {}
+            for i, parent in enumerate(self.__get_table().parents):
+                if parent >= 0:
+                    children.setdefault(parent, []).append(i)
+            self.__children = _freeze(children)
+        return self.__children
+
+    def __position(self, resource: 'PolicyResource') -> int:
+        i = self.__get_table().id(resource.urn)
+        if i is None:
+            raise KeyError(resource.urn)
+        return i
+
+    def __in_stack_order(self, positions: Iterable[int]) -> Tuple['PolicyResource', ...]:
+        table = self.__get_table()
+        return tuple(table.resource(i) for i in sorted(positions))
+
+    def __dependency_edges(self) -> List[Tuple[int, ...]]:
+        """
+        Returns the ids of each resource's direct dependencies.
+        """
+        if self.__edges is None:
+            table = self.__get_table()
+            offsets, ids = table.property_dependency_offsets, table.property_dependency_ids
+            edges: List[Tuple[int, ...]] = []
+            for i in range(len(table)):
+                deps = dict.fromkeys(table.dependencies(i))
+                for j in range(offsets[i], offsets[i + 1]):
+                    if ids[j] >= 0:
+                        deps[ids[j]] = None
+                edges.append(tuple(deps))
+            self.__edges = edges
+        return self.__edges
+
+    def __dependent_edges(self) -> List[Tuple[int, ...]]:
+        """
+        Returns the ids of each resource's direct dependents, derived from the dependency edges.
+        """
+        if self.__reverse_edges is None:
+            edges = self.__dependency_edges()
+            dependents: List[List[int]] = [[] for _ in edges]
+            for i, deps in enumerate(edges):
+                for d in deps:
+                    dependents[d].append(i)
+            self.__reverse_edges = [tuple(d) for d in dependents]
+        return self.__reverse_edges
+
+
+def _closure(start: int, edges: Callable[[int], Tuple[int, ...]], memo: Dict[int, FrozenSet[int]]) -> FrozenSet[int]:
+    """
+    Returns the positions reachable from `start` by following `edges`, not including `start` unless
+    it's on a cycle. Closures already in `memo` are reused rather than walked again.
+    """
+    cached = memo.get(start)
+    if cached is not None:
+        return cached
+    seen: Set[int] = set()
+    stack = list(edges(start))
+    while stack:
+        i = stack.pop()
+        if i in seen:
+            continue
+        seen.add(i)
+        known = memo.get(i)
+        if known is not None:
+            seen.update(known)
+            continue
+        stack.extend(edges(i))
+    result = frozenset(seen)
+    memo[start] = result
+    return result
+
+
+def _strongly_connected(edges: Sequence[Tuple[int, ...]]) -> List[List[int]]:
+    """
+    Returns the strongly connected components of the graph, with Tarjan's algorithm using an explicit
+    stack instead of recursion.
+    """
+    index: List[Optional[int]] = [None] * len(edges)
+    low = [0] * len(edges)
+    on_stack = [False] * len(edges)
+    stack: List[int] = []
+    components: List[List[int]] = []
+    counter = 0
+    for root in range(len(edges)):
+        if index[root] is not None:
+            continue
+        # Each frame is a node and the position of the next of its edges to visit.
+        frames: List[List[int]] = [[root, 0]]
+        index[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack[root] = True
+        while frames:
+            frame = frames[-1]
+            node, next_edge = frame
+            if next_edge < len(edges[node]):
+                frame[1] += 1
+                succ = edges[node][next_edge]
+                succ_index = index[succ]
+                if succ_index is None:
+                    index[succ] = low[succ] = counter
+                    counter += 1
+                    stack.append(succ)
+                    on_stack[succ] = True
+                    frames.append([succ, 0])
+                elif on_stack[succ]:
+                    low[node] = min(low[node], succ_index)
+                continue
+            frames.pop()
+            if frames:
+                parent = frames[-1][0]
+                low[parent] = min(low[parent], low[node])
+            if low[node] == index[node]:
+                component: List[int] = []
+                while True:
+                    member = stack.pop()
+                    on_stack[member] = False
+                    component.append(member)
+                    if member == node:
+                        break
+                components.append(component)
+    return components
+
+
+def _freeze(index: Mapping[Any, List]) -> Dict[Any, Tuple]:
+    # Policies share the index, so hand out tuples they can't modify.
+    return {k: tuple(v) for k, v in index.items()}
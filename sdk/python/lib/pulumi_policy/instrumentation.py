@@ -0,0 +1,176 @@
+# Copyright 2016-2020, Pulumi Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Timing instrumentation for the analyzer. When enabled, the servicer times each stage of handling an
+RPC, each policy, and each function in a policy's validate list, and aggregates the timings into
+histograms that can be dumped as JSON. When disabled, the servicer doesn't create a `Metrics` at
+all, and skips the timing altogether.
+"""
+
+from bisect import bisect_left
+import json
+import os
+import signal
+import tempfile
+import threading
+from typing import Any, Callable, Dict, List, Tuple
+
+STAGES = "stages"
+"""
+The category of the timings of the stages of handling an RPC: converting the resource, building the
+arguments, and so on.
+"""
+
+POLICIES = "policies"
+"""
+The category of the timings of each policy's `validate`, by policy name.
+"""
+
+VALIDATIONS = "validations"
+"""
+The category of the timings of each function in a policy's validate list, by policy name, index, and
+function name.
+"""
+
+RESOURCE_TYPES = "resource_types"
+"""
+The category of the timings of `Analyze` calls, by resource type.
+"""
+
+# The upper bounds of the histogram buckets, in seconds: powers of two from 1µs to about 67s. Timings
+# over the last bound go in an overflow bucket.
+_BUCKET_BOUNDS: List[float] = [2 ** i / 1_000_000 for i in range(27)]
+
+
+class Histogram:
+    """
+    A histogram of durations, with exponentially sized buckets. It isn't thread-safe.
+    """
+
+    __slots__ = ("__counts", "__count", "__total", "__min", "__max")
+
+    def __init__(self) -> None:
+        self.__counts = [0] * (len(_BUCKET_BOUNDS) + 1)
+        self.__count = 0
+        self.__total = 0.0
+        self.__min = float("inf")
+        self.__max = 0.0
+
+    def record(self, seconds: float) -> None:
+        self.__counts[bisect_left(_BUCKET_BOUNDS, seconds)] += 1
+        self.__count += 1
+        self.__total += seconds
+        self.__min = min(self.__min, seconds)
+        self.__max = max(self.__max, seconds)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Returns the histogram as a JSON-serializable dict: the count, total, mean, minimum, maximum,
+        estimated percentiles, and the non-empty buckets as `[upper bound, count]` pairs. The last
+        bucket's upper bound is `null`.
+        """
+        if self.__count == 0:
+            return {"count": 0, "total_seconds": 0.0, "buckets": []}
+        buckets = [[_BUCKET_BOUNDS[i] if i < len(_BUCKET_BOUNDS) else None, n]
+                   for i, n in enumerate(self.__counts) if n]
+        return {
+            "count": self.__count,
+            "total_seconds": self.__total,
+            "mean_seconds": self.__total / self.__count,
+            "min_seconds": self.__min,
+            "max_seconds": self.__max,
+            "p50_seconds": self.__percentile(0.5),
+            "p90_seconds": self.__percentile(0.9),
+            "p99_seconds": self.__percentile(0.99),
+            "buckets": buckets,
+        }
+
+    def __percentile(self, fraction: float) -> float:
+        """
+        Estimates a percentile as the upper bound of the bucket it falls in, which is at most twice
+        the actual value, capped at the maximum.
+        """
+        rank = fraction * self.__count
+        seen = 0
+        for i, n in enumerate(self.__counts):
+            seen += n
+            if seen >= rank and n:
+                return min(_BUCKET_BOUNDS[i], self.__max) if i < len(_BUCKET_BOUNDS) else self.__max
+        return self.__max
+
+
+class Metrics:
+    """
+    A thread-safe collection of histograms, by category and name.
+    """
+
+    def __init__(self) -> None:
+        self.__lock = threading.Lock()
+        self.__histograms: Dict[Tuple[str, str], Histogram] = {}
+
+    def record(self, category: str, name: str, seconds: float) -> None:
+        """
+        Adds a duration to the histogram of the given category and name.
+        """
+        key = (category, name)
+        with self.__lock:
+            histogram = self.__histograms.get(key)
+            if histogram is None:
+                histogram = self.__histograms[key] = Histogram()
+            histogram.record(seconds)
+
+    def snapshot(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """
+        Returns the histograms as JSON-serializable dicts, by category and name.
+        """
+        result: Dict[str, Dict[str, Dict[str, Any]]] = {
+            STAGES: {}, POLICIES: {}, VALIDATIONS: {}, RESOURCE_TYPES: {}}
+        with self.__lock:
+            for (category, name), histogram in sorted(self.__histograms.items()):
+                result.setdefault(category, {})[name] = histogram.snapshot()
+        return result
+
+
+def write_metrics(path: str, metrics: Dict[str, Any]) -> None:
+    """
+    Writes metrics to a file as JSON. The file is replaced atomically, so readers never see a partial
+    dump.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".metrics-", suffix=".json")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(metrics, f, indent=2, sort_keys=True)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def install_dump_signal(dump: Callable[[], None]) -> bool:
+    """
+    Calls `dump` on a new thread whenever the process receives `SIGUSR1`, so metrics can be dumped on
+    demand with `kill -USR1`. The handler doesn't dump on the signaled thread, which may be holding
+    the locks the dump needs. Returns whether the handler was installed: signals are only available
+    on POSIX, and handlers can only be installed from the main thread.
+    """
+    if not hasattr(signal, "SIGUSR1") or threading.current_thread() is not threading.main_thread():
+        return False
+
+    def handler(*_: Any) -> None:
+        threading.Thread(target=dump, name="pulumi-policy-metrics", daemon=True).start()
+
+    signal.signal(signal.SIGUSR1, handler)
+    return True
@@ -0,0 +1,215 @@
+# Copyright 2016-2020, Pulumi Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Hash-consing for read-only resource properties. Large stacks repeat the same type tokens, property
+names, tags, and policy documents on thousands of resources; an `Interner` makes equal strings and
+equal read-only subtrees share a single object, so the repeated data is only held once.
+"""
+
+import math
+import threading
+from typing import Any, Dict, List, Mapping, NamedTuple, Optional, Tuple
+
+from .proxy import FrozenDict, unknown_checking_proxy, unwrap_proxy
+
+
+class InternStats(NamedTuple):
+    """
+    Counts of the values an interner has seen, and of those it replaced with an equal value it had
+    already seen.
+    """
+
+    strings: int
+    """
+    The number of strings interned.
+    """
+
+    strings_shared: int
+    """
+    The number of strings replaced with an equal string seen before.
+    """
+
+    subtrees: int
+    """
+    The number of read-only mappings and tuples interned.
+    """
+
+    subtrees_shared: int
+    """
+    The number of read-only mappings and tuples replaced with an equal one seen before.
+    """
+
+    def __add__(self, other: Any) -> 'InternStats':  # type: ignore[override]
+        if not isinstance(other, InternStats):
+            return NotImplemented
+        return InternStats(*(a + b for a, b in zip(self, other)))
+
+    def __sub__(self, other: Any) -> 'InternStats':
+        if not isinstance(other, InternStats):
+            return NotImplemented
+        return InternStats(*(a - b for a, b in zip(self, other)))
+
+
+class Interner:
+    """
+    Interns strings and read-only property values: `FrozenDict`s and tuples, as built by
+    `frozen_properties`, along with the strings, numbers, booleans, and `None`s they contain. Equal
+    values passed to the same interner come back as the same object. Subtrees holding values of any
+    other type (e.g. assets and archives, which are mutable) are never shared themselves, though the
+    values within them are still interned.
+
+    An interner holds on to every value it has interned, so it's meant to live for a single request.
+    It isn't thread-safe.
+    """
+
+    def __init__(self) -> None:
+        self.__strings: Dict[str, str] = {}
+        # Interned subtrees by structural key. A subtree's key refers to its interned children by id,
+        # which stays valid because the table keeps the children alive.
+        self.__subtrees: Dict[Tuple[Any, ...], Any] = {}
+        self.__strings_seen = 0
+        self.__strings_shared = 0
+        self.__subtrees_seen = 0
+        self.__subtrees_shared = 0
+
+    def string(self, value: str) -> str:
+        """
+        Returns a string equal to `value`, the same object for every equal string.
+        """
+        self.__strings_seen += 1
+        interned = self.__strings.setdefault(value, value)
+        if interned is not value:
+            self.__strings_shared += 1
+        return interned
+
+    def value(self, value: Any) -> Any:
+        """
+        Returns a value equal to `value`, sharing its strings and read-only subtrees with the equal
+        values previously passed to this interner.
+        """
+        result, _ = self.__intern(value)
+        return result
+
+    def stats(self) -> InternStats:
+        """
+        Returns the counts of values seen and shared so far.
+        """
+        return InternStats(self.__strings_seen, self.__strings_shared,
+                           self.__subtrees_seen, self.__subtrees_shared)
+
+    def __intern(self, root: Any) -> Tuple[Any, Any]:
+        """
+        Interns `root` bottom-up and returns it along with its structural key, or `None` as the key
+        if it can't be shared.
+        """
+        leaf = self.__intern_leaf(root)
+        if leaf is not None:
+            return leaf
+        # Each frame is a container, its items, and the interned (value, key) of each child so far.
+        # Containers are interned after all of their children, without recursion, so deeply nested
+        # properties don't hit the recursion limit.
+        root_result: List[Tuple[Any, Any]] = []
+        stack: List[Tuple[Any, List[Any], List[Tuple[Any, Any]], List[Tuple[Any, Any]]]] = [
+            (root, _items(root), [], root_result)]
+        while stack:
+            container, items, children, out = stack[-1]
+            if len(children) < len(items):
+                child = items[len(children)][1]
+                result = self.__intern_leaf(child)
+                if result is None:
+                    stack.append((child, _items(child), [], children))
+                else:
+                    children.append(result)
+                continue
+            stack.pop()
+            out.append(self.__intern_container(container, items, children))
+        return root_result[0]
+
+    def __intern_leaf(self, value: Any) -> Optional[Tuple[Any, Any]]:
+        cls = value.__class__
+        if cls is FrozenDict or cls is tuple:
+            return None
+        if cls is str:
+            value = self.string(value)
+            return value, value
+        if value is None or cls is bool or cls is int:
+            return value, (cls, value)
+        if cls is float:
+            # 0.0 and -0.0 are equal, but they shouldn't be replaced with one another.
+            return value, (cls, value, math.copysign(1.0, value))
+        return value, None
+
+    def __intern_container(self, container: Any, items: List[Any],
+                           children: List[Tuple[Any, Any]]) -> Tuple[Any, Any]:
+        self.__subtrees_seen += 1
+        is_mapping = container.__class__ is FrozenDict
+        keys = [self.string(k) for k, _ in items] if is_mapping else None
+        shareable = all(key is not None for _, key in children)
+        if shareable:
+            child_keys = tuple(key for _, key in children)
+            subtree_key = (FrozenDict, tuple(keys), child_keys) if keys is not None else (tuple, child_keys)
+            existing = self.__subtrees.get(subtree_key)
+            if existing is not None:
+                self.__subtrees_shared += 1
+                return existing, id(existing)
+        values = [value for value, _ in children]
+        if all(v is item for v, (_, item) in zip(values, items)) and (
+                keys is None or all(k is key for k, (key, _) in zip(keys, items))):
+            # Nothing in the container was replaced, so it can be kept as is.
+            result = container
+        elif keys is not None:
+            result = FrozenDict(zip(keys, values))
+        else:
+            result = tuple(values)
+        if not shareable:
+            return result, None
+        self.__subtrees[subtree_key] = result
+        return result, id(result)
+
+
+def _items(container: Any) -> List[Any]:
+    if container.__class__ is FrozenDict:
+        return list(container.items())
+    return list(enumerate(container))
+
+
+def intern_properties(props: Mapping[str, Any], interner: Interner) -> Mapping[str, Any]:
+    """
+    Returns resource properties with their values interned. Properties with unknown values are behind
+    an unknown-checking proxy, so the properties it wraps are interned and wrapped again.
+    """
+    wrapped = unwrap_proxy(props)
+    interned = interner.value(wrapped)
+    if interned is wrapped:
+        return props
+    return unknown_checking_proxy(interned) if props is not wrapped else interned
+
+
+class InternCounters:
+    """
+    A thread-safe running total of the `InternStats` of the interners used across requests.
+    """
+
+    def __init__(self) -> None:
+        self.__lock = threading.Lock()
+        self.__total = InternStats(0, 0, 0, 0)
+
+    def add(self, stats: InternStats) -> None:
+        with self.__lock:
+            self.__total = self.__total + stats
+
+    def total(self) -> InternStats:
+        with self.__lock:
+            return self.__total
@@ -0,0 +1,113 @@
+# Copyright 2016-2020, Pulumi Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+from concurrent import futures
+import threading
+from typing import Any, Awaitable, Iterable, Optional
+
+
+class EventLoopThread:
+    """
+    A long-lived asyncio event loop running on a dedicated daemon thread. Synchronous gRPC handlers
+    submit awaitables to it with `run` and block until they complete, so async validations share
+    one loop (and any async clients or caches bound to it) across calls instead of paying for a new
+    loop on every call. The loop is started lazily, on the first call to `run`.
+    """
+
+    __lock: threading.Lock
+    __loop: Optional[asyncio.AbstractEventLoop]
+    __thread: Optional[threading.Thread]
+
+    def __init__(self, name: str = "pulumi-policy-event-loop") -> None:
+        self.__name = name
+        self.__lock = threading.Lock()
+        self.__loop = None
+        self.__thread = None
+
+    def run(self, awaitable: Awaitable) -> Any:
+        """
+        Runs `awaitable` on the event loop thread, blocking the calling thread until it completes,
+        and returns its result (or raises its exception). Must not be called from the loop thread.
+        """
+        return self.submit(awaitable).result()
+
+    def submit(self, awaitable: Awaitable) -> futures.Future:
+        """
+        Schedules `awaitable` on the event loop thread without waiting for it, and returns a future of
+        its result. Must not be called from the loop thread.
+        """
+        loop = self.__ensure_started()
+        return asyncio.run_coroutine_threadsafe(_await(awaitable), loop)
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """
+        Cancels any pending tasks, stops the event loop, and waits for its thread to exit. A later call
+        to `run` starts a new loop.
+        """
+        with self.__lock:
+            loop, thread = self.__loop, self.__thread
+            self.__loop, self.__thread = None, None
+        if loop is None or thread is None:
+            return
+        asyncio.run_coroutine_threadsafe(_shutdown(loop), loop).result(timeout)
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout)
+        loop.close()
+
+    def __ensure_started(self) -> asyncio.AbstractEventLoop:
+        loop = self.__loop
+        if loop is not None:
+            return loop
+        with self.__lock:
+            if self.__loop is None:
+                loop = asyncio.new_event_loop()
+                started = threading.Event()
+                thread = threading.Thread(target=_run_forever, args=(loop, started),
+                                          name=self.__name, daemon=True)
+                thread.start()
+                started.wait()
+                self.__loop, self.__thread = loop, thread
+            return self.__loop
+
+
+def _run_forever(loop: asyncio.AbstractEventLoop, started: threading.Event) -> None:
+    asyncio.set_event_loop(loop)
+    loop.call_soon(started.set)
+    loop.run_forever()
+
+
+async def _await(awaitable: Awaitable) -> Any:
+    return await awaitable
+
+
+async def _shutdown(loop: asyncio.AbstractEventLoop) -> None:
+    current = asyncio.current_task()
+    tasks = [t for t in asyncio.all_tasks(loop) if t is not current]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await loop.shutdown_asyncgens()
+
+
+async def gather_all(awaitables: Iterable[Awaitable]) -> None:
+    """
+    Awaits all of the awaitables concurrently, like a task group: every awaitable runs to completion
+    even if another one fails, and only then is the first exception (in the order the awaitables
+    were given) raised.
+    """
+    results = await asyncio.gather(*awaitables, return_exceptions=True)
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
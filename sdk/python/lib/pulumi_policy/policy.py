@@ -12,33 +12,25 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import asyncio
-from concurrent import futures
 import re
 import sys
 import time
 
 from enum import Enum
-from inspect import isawaitable
-from typing import Any, Awaitable, Callable, Dict, Mapping, List, NamedTuple, Optional, Union, cast
+from inspect import isawaitable, iscoroutinefunction
+from typing import (TYPE_CHECKING, AbstractSet, Any, Awaitable, Callable, Dict, FrozenSet, Mapping, List, NamedTuple,
+                    Optional, Sequence, Tuple, Union, cast)
 from abc import ABC
 
-import grpc
-from google.protobuf import empty_pb2, json_format, struct_pb2
-from pulumi.runtime import proto
-from pulumi.runtime.proto import analyzer_pb2_grpc
+from .graph import StackGraph
+from .loop import gather_all
 
-from .deserialize import deserialize_properties
-from .proxy import UnknownValueError, unknown_checking_proxy
-from .version import SEMVERSION
-
-_ONE_DAY_IN_SECONDS = 60 * 60 * 24
+if TYPE_CHECKING:
+    from .table import ResourceTable
 
 _POLICY_PACK_NAME_RE = re.compile("^[a-zA-Z0-9-_.]{1,100}$")
 
-# _MAX_RPC_MESSAGE_SIZE raises the gRPC Max Message size from `4194304` (4mb) to `419430400` (400mb)
-_MAX_RPC_MESSAGE_SIZE = 1024 * 1024 * 400
-_GRPC_CHANNEL_OPTIONS = [("grpc.max_receive_message_length", _MAX_RPC_MESSAGE_SIZE)]
+_NO_UNKNOWN_PATHS: FrozenSet[Tuple[str, ...]] = frozenset()
 
 class PolicyPack:
     """
@@ -49,7 +41,8 @@ class PolicyPack:
                  name: str,
                  policies: List['Policy'],
                  enforcement_level: Optional['EnforcementLevel'] = None,
-                 initial_config: Optional[Dict[str, Union['EnforcementLevel', Dict[str, Any]]]] = None) -> None:
+                 initial_config: Optional[Dict[str, Union['EnforcementLevel', Dict[str, Any]]]] = None,
+                 execution_mode: Optional['ExecutionMode'] = None) -> None:
         """
         :param str name: The name of the policy pack.
         :param List[Policy] policies: The policies associated with a policy pack.
@@ -60,6 +53,9 @@ class PolicyPack:
         :param Optional[Dict[str, Union['EnforcementLevel', Dict[str, Any]]]] initial_config: Initial
                configuration for the policy pack. Allows specifying configuration programmatically from reusable
                policy libraries.
+        :param Optional[ExecutionMode] execution_mode: Where the resource validation policies in the policy
+               pack run. This is the default used for all resource validation policies in the policy pack.
+               Individual policies can override.
         """
         if not name:
             raise TypeError("Missing name argument")
@@ -90,32 +86,37 @@ class PolicyPack:
                     for vk in v:
                         if not isinstance(vk, str):
                             raise TypeError(f"Expected initial_config['{k}'] key to be a string")
+        if execution_mode is not None and not isinstance(execution_mode, ExecutionMode):
+            raise TypeError("Expected execution_mode to be an ExecutionMode")
 
         # Python policy packs should specify a version in PulumiPolicy.yaml; the CLI will use the
         # version specified there. We always return "0.0.1" from here which will only be used if
         # there isn't a version in PulumiPolicy.yaml.
         version = "0.0.1"
 
-        servicer = _PolicyAnalyzerServicer(
-            name,
-            version,
-            policies,
-            enforcement_level if enforcement_level is not None else EnforcementLevel.ADVISORY,
-            initial_config)
-        server = grpc.server(
-            futures.ThreadPoolExecutor(max_workers=4),  # pylint: disable=consider-using-with
-            options=_GRPC_CHANNEL_OPTIONS
-        )
-        analyzer_pb2_grpc.add_AnalyzerServicer_to_server(
-            servicer, server)
-        port = server.add_insecure_port(address="0.0.0.0:0")
-        server.start()
-        sys.stdout.buffer.write(f"{port}\n".encode())
-        try:
-            while True:
-                time.sleep(_ONE_DAY_IN_SECONDS)
-        except KeyboardInterrupt:
-            server.stop(0)
+        # The file that created the policy pack, so that worker processes can load the policy pack
+        # themselves when policies run in a process pool.
+        pack_file = sys._getframe(1).f_globals.get("__file__")  # pylint: disable=protected-access
+
+        # Imported here since these modules depend on the types defined in this module.
+        # pylint: disable=import-outside-toplevel,cyclic-import
+        from .process import in_worker, register_worker_policies
+        from .server import serve
+
+        enforcement_level = enforcement_level if enforcement_level is not None else EnforcementLevel.ADVISORY
+        if in_worker():
+            # This is a process pool worker loading the policy pack: make the policies available to
+            # run, rather than serving them.
+            register_worker_policies(name, version, policies, enforcement_level, initial_config)
+            return
+
+        serve(name,
+              version,
+              policies,
+              enforcement_level,
+              initial_config,
+              execution_mode if execution_mode is not None else ExecutionMode.IN_PROCESS,
+              pack_file)
 
 
 class EnforcementLevel(Enum):
@@ -128,6 +129,17 @@ class EnforcementLevel(Enum):
     DISABLED = "disabled"
 
 
+class ExecutionMode(Enum):
+    """
+    Indicates where a resource validation policy runs. `IN_PROCESS` policies run on the policy pack's
+    threads, sharing the GIL. `PROCESS_POOL` policies run in a pool of worker processes that each load
+    the policy pack once, which lets CPU-heavy policies use more than one core.
+    """
+
+    IN_PROCESS = "in-process"
+    PROCESS_POOL = "process-pool"
+
+
 class PolicyConfigSchema:
     """
     Represents the configuration schema for a policy.
@@ -252,6 +264,8 @@ class ResourceValidationArgs:
     ResourceValidationArgs is the argument bag passed to a resource validation.
     """
 
+    __slots__ = ("resource_type", "props", "urn", "name", "opts", "provider", "unknown_paths", "__config")
+
     resource_type: str
     """
     The type of the resource.
@@ -282,6 +296,14 @@ class ResourceValidationArgs:
     The provider of the resource.
     """
 
+    unknown_paths: AbstractSet[Tuple[str, ...]]
+    """
+    The paths to the resource's unknown input values, as tuples of keys (with list indexes as strings),
+    e.g. `("tags", "owner")`. Reading an unknown value raises an `UnknownValueError`. Empty when all of
+    the inputs are known, which is typical during an update, so policies can check it to skip reads
+    that would fail during preview.
+    """
+
     __config: Mapping[str, Any]
     """
     Private field holding the configuration for this policy.
@@ -300,7 +322,8 @@ class ResourceValidationArgs:
                  name: str,
                  opts: 'PolicyResourceOptions',
                  provider: Optional['PolicyProviderResource'],
-                 config: Optional[Mapping[str, Any]] = None) -> None:
+                 config: Optional[Mapping[str, Any]] = None,
+                 unknown_paths: Optional[AbstractSet[Tuple[str, ...]]] = None) -> None:
         self.resource_type = resource_type
         self.props = props
         self.urn = urn
@@ -308,6 +331,7 @@ class ResourceValidationArgs:
         self.opts = opts
         self.provider = provider
         self.__config = config if config is not None else {}
+        self.unknown_paths = unknown_paths if unknown_paths is not None else _NO_UNKNOWN_PATHS
 
 
 class PolicyResourceOptions:
@@ -315,12 +339,15 @@ class PolicyResourceOptions:
     PolicyResourceOptions is the bag of settings that control a resource's behavior.
     """
 
+    __slots__ = ("protect", "ignore_changes", "delete_before_replace", "aliases", "custom_timeouts",
+                 "additional_secret_outputs")
+
     protect: bool
     """
     When set to true, protect ensures this resource cannot be deleted.
     """
 
-    ignore_changes: List[str]
+    ignore_changes: Sequence[str]
     """
     Ignore changes to any of the specified properties.
     """
@@ -331,7 +358,7 @@ class PolicyResourceOptions:
     its replacement is created when replacement is necessary.
     """
 
-    aliases: List[str]
+    aliases: Sequence[str]
     """
     Additional URNs that should be aliased to this resource.
     """
@@ -341,18 +368,18 @@ class PolicyResourceOptions:
     Custom timeouts for resource create, update, and delete operations.
     """
 
-    additional_secret_outputs: List[str]
+    additional_secret_outputs: Sequence[str]
     """
     Outputs that should always be treated as secrets.
     """
 
     def __init__(self,
                  protect: bool,
-                 ignore_changes: List[str],
+                 ignore_changes: Sequence[str],
                  delete_before_replace: Optional[bool],
-                 aliases: List[str],
+                 aliases: Sequence[str],
                  custom_timeouts: 'PolicyCustomTimeouts',
-                 additional_secret_outputs: List[str]) -> None:
+                 additional_secret_outputs: Sequence[str]) -> None:
         self.protect = protect
         self.ignore_changes = ignore_changes
         self.delete_before_replace = delete_before_replace
@@ -366,6 +393,8 @@ class PolicyCustomTimeouts:
     Custom timeout options.
     """
 
+    __slots__ = ("create_seconds", "update_seconds", "delete_seconds")
+
     create_seconds: float
     """
     The create resource timeout.
@@ -395,6 +424,8 @@ class PolicyProviderResource:
     Information about the provider.
     """
 
+    __slots__ = ("resource_type", "props", "urn", "name")
+
     resource_type: str
     """
     The type of the provider resource.
@@ -442,12 +473,44 @@ class ResourceValidationPolicy(Policy):
     ResourceValidationPolicy is a policy that validates a resource definition.
     """
 
+    resource_types: Optional[List[str]]
+    """
+    The resource types this policy applies to. Each entry is either an exact type token, such as
+    `aws:s3/bucket:Bucket`, or a pattern using `*` wildcards, such as `kubernetes:*`. When not set,
+    the policy applies to all resources.
+    """
+
+    execution_mode: Optional[ExecutionMode]
+    """
+    Where this policy runs. When not set, the policy pack's execution mode is used.
+    """
+
+    cacheable: bool
+    """
+    Whether this policy's violations only depend on the resource and the policy's configuration, so that
+    the analyzer can replay the violations it reported for an unchanged resource instead of running it
+    again.
+    """
+
     __validate: Optional[Union[ResourceValidation, List[ResourceValidation]]]
     """
     Private field holding the optional validation callback.
     """
 
     def validate(self, args: ResourceValidationArgs, report_violation: ReportViolation) -> Optional[Awaitable]:
+        return self._call_validations(args, report_violation)
+
+    def _call_validations(self,
+                          args: ResourceValidationArgs,
+                          report_violation: ReportViolation,
+                          on_complete: Optional[Callable[[int, Callable, float], None]] = None) -> Optional[Awaitable]:
+        """
+        Calls each function in the validate list. When `on_complete` is specified, it's called with the
+        index, the function, and the duration in seconds of each call, once the call completes. The
+        duration of an async function includes the time it spends waiting. If a function raises after
+        earlier ones returned awaitables, the awaitable returned completes those before raising the
+        error, like `gather_all`.
+        """
         if not self.__validate:
             raise NotImplementedError(f'`validate must be overridden by policy "{self.name}"'
                                       + ' since `validate was not specified')
@@ -457,22 +520,55 @@ class ResourceValidationPolicy(Policy):
         validations = (self.__validate if isinstance(self.__validate, list)
                        else [self.__validate])
 
-        for validation in validations:
-            result = validation(args, report_violation)
+        for i, validation in enumerate(validations):
+            try:
+                if on_complete is None:
+                    result = validation(args, report_violation)
+                else:
+                    started = time.perf_counter()
+                    try:
+                        result = validation(args, report_violation)
+                    except BaseException:
+                        on_complete(i, validation, time.perf_counter() - started)
+                        raise
+                    if result is not None and isawaitable(result):
+                        result = _timed(cast(Awaitable, result), i, validation, started, on_complete)
+                    else:
+                        on_complete(i, validation, time.perf_counter() - started)
+            except Exception as e:  # pylint: disable=broad-except
+                if not awaitable_results:
+                    raise
+                # The earlier functions' awaitables still need to run, or they'd never be awaited and
+                # their violations would be lost.
+                return _raise_after(gather_all(awaitable_results), e)
             if result is not None and isawaitable(result):
                 awaitable_results.append(cast(Awaitable, result))
 
         if awaitable_results:
-            return asyncio.wait(awaitable_results)
+            return gather_all(awaitable_results)
 
         return None
 
+    def _validate_is_async(self) -> bool:
+        """
+        Returns whether `validate` only starts async validations, without doing any synchronous work, so
+        that it can be called directly on an event loop.
+        """
+        if type(self).validate is not ResourceValidationPolicy.validate:
+            return iscoroutinefunction(self.validate)
+        validations = (self.__validate if isinstance(self.__validate, list)
+                       else [self.__validate])
+        return all(iscoroutinefunction(v) for v in validations)
+
     def __init__(self,
                  name: str,
                  description: str,
                  validate: Optional[Union[ResourceValidation, List[ResourceValidation]]] = None,
                  enforcement_level: Optional[EnforcementLevel] = None,
-                 config_schema: Optional[PolicyConfigSchema] = None) -> None:
+                 config_schema: Optional[PolicyConfigSchema] = None,
+                 resource_types: Optional[List[str]] = None,
+                 execution_mode: Optional[ExecutionMode] = None,
+                 cacheable: bool = False) -> None:
         """
         :param str name: An ID for the policy. Must be unique within the current policy set.
         :param str description: A brief description of the policy rule. e.g., "S3 buckets should have
@@ -483,9 +579,38 @@ class ResourceValidationPolicy(Policy):
         :param Optional[EnforcementLevel] enforcement_level: Indicates what to do on policy violation,
                e.g., block deployment but allow override with proper permissions.
         :param Optional[PolicyConfigSchema] config_schema: This policy's configuration schema.
+        :param Optional[List[str]] resource_types: The resource types this policy applies to, either exact
+               type tokens (e.g. "aws:s3/bucket:Bucket") or patterns with `*` wildcards (e.g. "kubernetes:*").
+               The policy is only called for matching resources. When not specified, the policy applies to all
+               resources.
+        :param Optional[ExecutionMode] execution_mode: Where this policy runs. Policies that run in a process
+               pool, along with their validate callbacks and any violation messages they report, must be
+               defined by the policy pack's program so that worker processes can load them. When not
+               specified, the policy pack's execution mode is used.
+        :param bool cacheable: Whether the policy is deterministic: its violations only depend on the
+               resource's type, name, URN, properties, options, and provider, and on the policy's
+               configuration. The analyzer keeps the violations of cacheable policies and replays them for
+               unchanged resources, e.g. when a preview is followed by an update, instead of calling
+               `validate` again.
         """
         super().__init__(name, description, enforcement_level, config_schema)
 
+        if resource_types is not None:
+            if not isinstance(resource_types, list):
+                raise TypeError("Expected resource_types to be a list of strings")
+            for t in resource_types:
+                if not t or not isinstance(t, str):
+                    raise TypeError("Expected resource_types to be a list of strings")
+        self.resource_types = resource_types
+
+        if execution_mode is not None and not isinstance(execution_mode, ExecutionMode):
+            raise TypeError("Expected execution_mode to be an ExecutionMode")
+        self.execution_mode = execution_mode
+
+        if not isinstance(cacheable, bool):
+            raise TypeError("Expected cacheable to be a bool")
+        self.cacheable = cacheable
+
         # If this instance isn't a subclass, then validate must be specified.
         not_subclassed = type(self) is ResourceValidationPolicy # pylint: disable=unidiomatic-typecheck
         if not_subclassed and not validate:
@@ -505,6 +630,11 @@ class PolicyResource:
     PolicyResource represents a resource in the stack.
     """
 
+    # A stack can have tens of thousands of resources, so keep the attributes in slots rather than a
+    # dict per instance.
+    __slots__ = ("resource_type", "props", "urn", "name", "opts", "provider", "parent", "dependencies",
+                 "property_dependencies", "unknown_paths")
+
     resource_type: str
     """
     The type of the resource.
@@ -550,6 +680,12 @@ class PolicyResource:
     The set of dependencies that affect each property.
     """
 
+    unknown_paths: AbstractSet[Tuple[str, ...]]
+    """
+    The paths to the resource's unknown output values, as tuples of keys (with list indexes as strings).
+    Empty when all of the outputs are known.
+    """
+
     def __init__(self,
                  resource_type: str,
                  props: Mapping[str, Any],
@@ -559,7 +695,8 @@ class PolicyResource:
                  provider: Optional[PolicyProviderResource],
                  parent: Optional['PolicyResource'],
                  dependencies: List['PolicyResource'],
-                 property_dependencies: Dict[str, List['PolicyResource']]) -> None:
+                 property_dependencies: Dict[str, List['PolicyResource']],
+                 unknown_paths: Optional[AbstractSet[Tuple[str, ...]]] = None) -> None:
         self.resource_type = resource_type
         self.props = props
         self.urn = urn
@@ -569,6 +706,7 @@ class PolicyResource:
         self.parent = parent
         self.dependencies = dependencies
         self.property_dependencies = property_dependencies
+        self.unknown_paths = unknown_paths if unknown_paths is not None else _NO_UNKNOWN_PATHS
 
 
 class StackValidationArgs:
@@ -576,9 +714,22 @@ class StackValidationArgs:
     StackValidationArgs is the argument bag passed to a stack validation.
     """
 
-    resources: List[PolicyResource]
+    __slots__ = ("resources", "__graph", "__table", "__config")
+
+    resources: Sequence[PolicyResource]
+    """
+    The resources in the stack. The same resources are shared by every stack validation in a request,
+    so the sequence is immutable.
+    """
+
+    __graph: Optional[StackGraph]
     """
-    The resources in the stack.
+    Private field holding the index of the resources, created on first use if not passed in.
+    """
+
+    __table: Optional['ResourceTable']
+    """
+    Private field holding the table of the resources, created on first use if not passed in.
     """
 
     __config: Mapping[str, Any]
@@ -592,10 +743,39 @@ class StackValidationArgs:
         """
         return self.__config
 
+    @property
+    def graph(self) -> StackGraph:
+        """
+        An index of the resources in the stack, for looking them up by type, by URN, and by their
+        relationships without scanning `resources`. The same graph is shared by every stack
+        validation in a request.
+        """
+        if self.__graph is None:
+            self.__graph = StackGraph(self.resources, self.table)
+        return self.__graph
+
+    @property
+    def table(self) -> 'ResourceTable':
+        """
+        A compact, column-oriented representation of the resources in the stack, with an integer id for
+        each resource (its index in `resources`). Policies that walk large stacks by type, URN, parent,
+        or dependencies can use the table without creating a `PolicyResource` for every resource. The
+        same table is shared by every stack validation in a request.
+        """
+        if self.__table is None:
+            # pylint: disable=import-outside-toplevel,cyclic-import
+            from .table import table_from_resources
+            self.__table = table_from_resources(self.resources)
+        return self.__table
+
     def __init__(self,
-                 resources: List[PolicyResource],
-                 config: Optional[Mapping[str, Any]] = None) -> None:
+                 resources: Sequence[PolicyResource],
+                 config: Optional[Mapping[str, Any]] = None,
+                 graph: Optional[StackGraph] = None,
+                 table: Optional['ResourceTable'] = None) -> None:
         self.resources = resources
+        self.__graph = graph
+        self.__table = table
         self.__config = config if config is not None else {}
 
 
@@ -631,6 +811,15 @@ class StackValidationPolicy(Policy):
 
         return None
 
+    def _validate_is_async(self) -> bool:
+        """
+        Returns whether `validate` only starts an async validation, without doing any synchronous work, so
+        that it can be called directly on an event loop.
+        """
+        if type(self).validate is not StackValidationPolicy.validate:
+            return iscoroutinefunction(self.validate)
+        return iscoroutinefunction(self.__validate)
+
     def __init__(self,
                  name: str,
                  description: str,
@@ -660,293 +849,6 @@ class StackValidationPolicy(Policy):
         self.__validate = validate # type: ignore
 
 
-class _PolicyAnalyzerServicer(proto.AnalyzerServicer):
-    __policy_pack_name: str
-    __policy_pack_version: str
-    __policies: List[Policy]
-    __policy_pack_enforcement_level: EnforcementLevel
-    __initial_config: Optional[Dict[str, Union[EnforcementLevel, Dict[str, Any]]]]
-    __policy_pack_config: Dict[str, Dict[str, Any]]
-    __policy_pack_config_enforcement_level: Dict[str, EnforcementLevel]
-
-    class IntermediateStackResource(NamedTuple):
-        resource: PolicyResource
-        parent: Optional[str]
-        dependencies: List[str]
-        property_dependencies: Dict[str, List[str]]
-
-    def Analyze(self, request, context):
-        diagnostics: List[proto.AnalyzeDiagnostic] = []
-        for policy in self.__policies:
-            enforcement_level = self._get_enforcement_level(policy)
-            if enforcement_level == EnforcementLevel.DISABLED or not isinstance(policy, ResourceValidationPolicy):
-                continue
-
-            report_violation = self._create_report_violation(diagnostics, policy.name,
-                                                             policy.description, enforcement_level)
-
-            deserialized = deserialize_properties(json_format.MessageToDict(request.properties))
-            props = unknown_checking_proxy(deserialized)
-            opts = self._get_resource_options(request)
-            provider = self._get_provider_resource(request)
-            config = self._get_policy_config(policy.name)
-            args = ResourceValidationArgs(request.type, props, request.urn, request.name, opts, provider, config)
-
-            try:
-                result = policy.validate(args, report_violation)
-                if isawaitable(result):
-                    loop = asyncio.new_event_loop()
-                    loop.run_until_complete(result)
-                    loop.close()
-            except UnknownValueError as e:
-                diagnostics.append(proto.AnalyzeDiagnostic(
-                    policyName=policy.name,
-                    policyPackName=self.__policy_pack_name,
-                    policyPackVersion=self.__policy_pack_version,
-                    message=f"can't run policy '{policy.name}' during preview: {e.message}",
-                    urn="",
-                    description=policy.description,
-                    enforcementLevel=self._map_enforcement_level(EnforcementLevel.ADVISORY),
-                ))
-
-        return proto.AnalyzeResponse(diagnostics=diagnostics)
-
-    def AnalyzeStack(self, request, context):
-        diagnostics: List[proto.AnalyzeDiagnostic] = []
-        for policy in self.__policies:
-            enforcement_level = self._get_enforcement_level(policy)
-            if enforcement_level == EnforcementLevel.DISABLED or not isinstance(policy, StackValidationPolicy):
-                continue
-
-            report_violation = self._create_report_violation(diagnostics, policy.name,
-                                                             policy.description, enforcement_level)
-
-            intermediates: List[_PolicyAnalyzerServicer.IntermediateStackResource] = []
-            for r in request.resources:
-                deserialized = deserialize_properties(json_format.MessageToDict(r.properties))
-                props = unknown_checking_proxy(deserialized)
-                opts = self._get_resource_options(r)
-                provider = self._get_provider_resource(r)
-                resource = PolicyResource(r.type, props, r.urn, r.name, opts, provider, None, [], {})
-                property_dependencies: Dict[str, List[str]] = {}
-                for k, v in r.propertyDependencies.items():
-                    property_dependencies[k] = list(v.urns)
-                intermediates.append(_PolicyAnalyzerServicer.IntermediateStackResource(resource, r.parent, list(r.dependencies), property_dependencies))
-
-            # Create a map of URNs to resources, used to fill in the parent and dependencies
-            # with references to the actual resource objects.
-            urns_to_resources: Dict[str, PolicyResource] = {}
-            for i in intermediates:
-                urns_to_resources[i.resource.urn] = i.resource
-
-            # Go through each intermediate result and set the parent and dependencies.
-            for i in intermediates:
-                # If the resource has a parent, lookup and set it to the actual resource object.
-                if i.parent is not None and i.parent in urns_to_resources:
-                    i.resource.parent = urns_to_resources[i.parent]
-
-                # Set dependencies to actual resource objects.
-                for d in i.dependencies:
-                    if d in urns_to_resources:
-                        i.resource.dependencies.append(urns_to_resources[d])
-
-                # Set property_dependencies to actual resource objects.
-                for k in i.property_dependencies:
-                    v = i.property_dependencies[k]
-                    deps: List[PolicyResource] = []
-                    for d in v:
-                        if d in urns_to_resources:
-                            deps.append(urns_to_resources[d])
-                    i.resource.property_dependencies[k] = deps
-
-            resources: List[PolicyResource] = []
-            for i in intermediates:
-                resources.append(i.resource)
-            config = self._get_policy_config(policy.name)
-            args = StackValidationArgs(resources, config)
-
-            try:
-                result = policy.validate(args, report_violation)
-                if isawaitable(result):
-                    loop = asyncio.new_event_loop()
-                    loop.run_until_complete(result)
-                    loop.close()
-            except UnknownValueError as e:
-                diagnostics.append(proto.AnalyzeDiagnostic(
-                    policyName=policy.name,
-                    policyPackName=self.__policy_pack_name,
-                    policyPackVersion=self.__policy_pack_version,
-                    message=f"can't run policy '{policy.name}' during preview: {e.message}",
-                    urn="",
-                    description=policy.description,
-                    enforcementLevel=self._map_enforcement_level(EnforcementLevel.ADVISORY),
-                ))
-
-        return proto.AnalyzeResponse(diagnostics=diagnostics)
-
-    def GetAnalyzerInfo(self, request, context):
-        policies: List[proto.PolicyInfo] = []
-        for policy in self.__policies:
-            enforcement_level = (policy.enforcement_level if policy.enforcement_level is not None
-                                 else self.__policy_pack_enforcement_level)
-
-            schema = {}
-            if policy.config_schema is not None:
-                if policy.config_schema.properties:
-                    properties = struct_pb2.Struct()
-                    for k, v in policy.config_schema.properties.items():
-                        # pylint: disable=unsupported-assignment-operation
-                        properties[k] = v
-                    schema["properties"] = properties
-                if policy.config_schema.required:
-                    schema["required"] = policy.config_schema.required
-
-            policies.append(proto.PolicyInfo(
-                name=policy.name,
-                description=policy.description,
-                enforcementLevel=self._map_enforcement_level(enforcement_level),
-                configSchema=proto.PolicyConfigSchema(**schema) if schema else None,
-            ))
-
-        initial_config = {}
-        if self.__initial_config is not None:
-            normalized_config = _normalize_config(self.__initial_config)
-            for key, val in normalized_config.items():
-                config = {}
-                if val.enforcement_level is not None:
-                    config["enforcementLevel"] = self._map_enforcement_level(val.enforcement_level)
-                if val.properties:
-                    properties = struct_pb2.Struct()
-                    for k, v in val.properties.items():
-                        # pylint: disable=unsupported-assignment-operation
-                        properties[k] = v
-                    config["properties"] = properties
-                if config:
-                    initial_config[key] = proto.PolicyConfig(**config)
-
-        return proto.AnalyzerInfo(
-            name=self.__policy_pack_name,
-            version=self.__policy_pack_version,
-            supportsConfig=True,
-            policies=policies,
-            initialConfig=initial_config,
-        )
-
-    def GetPluginInfo(self, request, context):
-        return proto.PluginInfo(version=SEMVERSION)
-
-    def Configure(self, request, context):
-        config, config_enforcement_level = {}, {}
-        for k in request.policyConfig:
-            v = request.policyConfig[k]
-            config[k] = json_format.MessageToDict(v.properties)
-            config_enforcement_level[k] = self._convert_enforcement_level(v.enforcementLevel)
-        self.__policy_pack_config = config
-        self.__policy_pack_config_enforcement_level = config_enforcement_level
-        return empty_pb2.Empty()
-
-    def __init__(self,
-                 name: str,
-                 version: str,
-                 policies: List[Policy],
-                 enforcement_level: EnforcementLevel,
-                 initial_config: Optional[Dict[str, Union['EnforcementLevel', Dict[str, Any]]]] = None) -> None:
-        assert name and isinstance(name, str)
-        assert version and isinstance(version, str)
-        assert policies and isinstance(policies, list)
-        assert enforcement_level and isinstance(
-            enforcement_level, EnforcementLevel)
-        assert initial_config is None or isinstance(initial_config, dict)
-        self.__policy_pack_name = name
-        self.__policy_pack_version = version
-        self.__policies = policies
-        self.__policy_pack_enforcement_level = enforcement_level
-        self.__initial_config = initial_config
-        self.__policy_pack_config = {}
-        self.__policy_pack_config_enforcement_level = {}
-
-    def _get_enforcement_level(self, policy: Policy) -> EnforcementLevel:
-        if policy.name in self.__policy_pack_config_enforcement_level:
-            return self.__policy_pack_config_enforcement_level[policy.name]
-
-        return (policy.enforcement_level if policy.enforcement_level is not None
-                else self.__policy_pack_enforcement_level)
-
-    def _create_report_violation(self,
-                                 diagnostics: List[Any],
-                                 policy_name: str,
-                                 policy_description: str,
-                                 enforcement_level: EnforcementLevel) -> ReportViolation:
-        def report_violation(message: str, urn: Optional[str] = None) -> None:
-            if message and not isinstance(message, str):
-                raise TypeError("Expected message to be a string")
-            if urn is not None and not isinstance(urn, str):
-                raise TypeError("Expected urn to be a string")
-
-            violation_message = policy_description
-            if message:
-                violation_message += f"\n{message}"
-
-            diagnostics.append(proto.AnalyzeDiagnostic(
-                policyName=policy_name,
-                policyPackName=self.__policy_pack_name,
-                policyPackVersion=self.__policy_pack_version,
-                message=violation_message,
-                urn=urn if urn else "",
-                description=policy_description,
-                enforcementLevel=self._map_enforcement_level(enforcement_level),
-            ))
-        return report_violation
-
-    def _map_enforcement_level(self, enforcement_level: EnforcementLevel) -> int:
-        if enforcement_level == EnforcementLevel.ADVISORY:
-            return proto.ADVISORY
-        if enforcement_level == EnforcementLevel.MANDATORY:
-            return proto.MANDATORY
-        if enforcement_level == EnforcementLevel.DISABLED:
-            return proto.DISABLED
-        raise AssertionError(
-            f"unknown enforcement level: {enforcement_level}")
-
-    def _convert_enforcement_level(self, enforcement_level: int) -> EnforcementLevel:
-        if enforcement_level == proto.ADVISORY:
-            return EnforcementLevel.ADVISORY
-        if enforcement_level == proto.MANDATORY:
-            return EnforcementLevel.MANDATORY
-        if enforcement_level == proto.DISABLED:
-            return EnforcementLevel.DISABLED
-        raise AssertionError(
-            f"unknown enforcement level: {enforcement_level}")
-
-    def _get_resource_options(self, request) -> PolicyResourceOptions:
-        opts = request.options
-        protect = opts.protect
-        ignore_changes = opts.ignoreChanges
-        delete_before_replace = None if not opts.deleteBeforeReplaceDefined else opts.deleteBeforeReplace
-        aliases = opts.aliases
-        custom_timeouts = (PolicyCustomTimeouts(opts.customTimeouts.create, opts.customTimeouts.update,
-                                                opts.customTimeouts.delete) if opts.HasField("customTimeouts")
-                           else PolicyCustomTimeouts(0, 0, 0))
-        additional_secret_outputs = opts.additionalSecretOutputs
-        return PolicyResourceOptions(
-            protect, ignore_changes, delete_before_replace, aliases, custom_timeouts, additional_secret_outputs)
-
-    def _get_provider_resource(self, request) -> Optional[PolicyProviderResource]:
-        if not request.HasField("provider"):
-            return None
-        prov = request.provider
-        deserialized = deserialize_properties(json_format.MessageToDict(prov.properties))
-        props = unknown_checking_proxy(deserialized)
-        return PolicyProviderResource(prov.type, props, prov.urn, prov.name)
-
-    def _get_policy_config(self, name: str) -> Optional[Dict[str, Any]]:
-        if name in self.__policy_pack_config:
-            config = self.__policy_pack_config[name]
-            if config:
-                return config.copy()
-        return None
-
-
 class _NormalizedConfigValue(NamedTuple):
     enforcement_level: Optional[EnforcementLevel]
     properties: Optional[Dict[str, Any]]
@@ -976,3 +878,16 @@ def _normalize_config(config: Dict[str, Union[EnforcementLevel, Dict[str, Any]]]
         result[key] = _NormalizedConfigValue(enforcement_level, properties)
 
     return result
+
+
+async def _raise_after(awaitable: Awaitable, error: Exception) -> None:
+    await awaitable
+    raise error
+
+
+async def _timed(awaitable: Awaitable, index: int, validation: Callable, started: float,
+                 on_complete: Callable[[int, Callable, float], None]) -> None:
+    try:
+        await awaitable
+    finally:
+        on_complete(index, validation, time.perf_counter() - started)
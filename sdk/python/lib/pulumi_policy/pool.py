@@ -0,0 +1,298 @@
+# Copyright 2016-2020, Pulumi Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from concurrent import futures
+import os
+import queue
+import threading
+import time
+from typing import Any, Callable, NamedTuple, Optional, Set
+
+# _ADAPT_WINDOW is the number of completed tasks between two adjustments of an adaptive pool's size.
+_ADAPT_WINDOW = 32
+
+# _MIN_ADAPTIVE_WORKERS is the smallest size an adaptive pool shrinks to, so that cheap RPCs don't
+# queue behind a single long-running validation.
+_MIN_ADAPTIVE_WORKERS = 2
+
+# An adaptive pool with a backlog tries doubling its size, and keeps the new size only if the next
+# window's throughput (tasks completed per second) is at least _MIN_THROUGHPUT_GAIN higher. Time a task
+# spends off the CPU doesn't tell blocking apart from waiting for the GIL, but throughput only improves
+# when the extra threads actually run tasks in parallel.
+_MIN_THROUGHPUT_GAIN = 0.2
+
+# After a size increase that didn't pay off, an adaptive pool waits this many windows before trying
+# again, doubling the wait after each failed try up to _MAX_GROW_BACKOFF_WINDOWS.
+_MIN_GROW_BACKOFF_WINDOWS = 1
+_MAX_GROW_BACKOFF_WINDOWS = 64
+
+# _IDLE_TIMEOUT_SECONDS is how long a worker above an adaptive pool's size waits for work before exiting.
+_IDLE_TIMEOUT_SECONDS = 5.0
+
+
+def default_max_workers() -> int:
+    """
+    Returns the default size of the worker pool, scaled to the number of CPUs.
+    """
+    return min(32, (os.cpu_count() or 1) + 4)
+
+
+class PoolStats(NamedTuple):
+    """
+    A snapshot of a worker pool's size and backpressure measurements.
+    """
+
+    workers: int
+    """
+    The number of live worker threads.
+    """
+
+    max_workers: int
+    """
+    The current limit on the number of worker threads. Fixed unless the pool is adaptive.
+    """
+
+    queue_depth: int
+    """
+    The number of tasks waiting for a worker.
+    """
+
+    max_queue_depth: int
+    """
+    The largest number of tasks that have been waiting for a worker at once.
+    """
+
+    submitted: int
+    """
+    The number of tasks submitted.
+    """
+
+    completed: int
+    """
+    The number of tasks that have finished running.
+    """
+
+    total_wait_seconds: float
+    """
+    The total time tasks spent waiting in the queue before a worker picked them up.
+    """
+
+    max_wait_seconds: float
+    """
+    The longest time a task spent waiting in the queue.
+    """
+
+    blocked_ratio: float
+    """
+    The fraction of the tasks' running time spent off the CPU rather than running on the thread, which
+    includes time spent waiting for the GIL.
+    """
+
+
+class _WorkItem(NamedTuple):
+    future: futures.Future
+    fn: Callable[..., Any]
+    args: Any
+    kwargs: Any
+    enqueued: float
+
+
+class WorkerPool(futures.Executor):
+    """
+    A thread pool executor that measures queue depth and queue wait times. Like
+    `concurrent.futures.ThreadPoolExecutor`, threads are started on demand up to the pool's size. An
+    adaptive pool also grows or shrinks its size between a small minimum and `max_workers`: while there
+    is a backlog, it tries a larger size and keeps it only if throughput improves, which happens when
+    tasks release the GIL (I/O, C extensions) but not when they're CPU-bound, and without a backlog it
+    shrinks.
+    """
+
+    def __init__(self,
+                 max_workers: Optional[int] = None,
+                 adaptive: bool = False,
+                 thread_name_prefix: str = "pulumi-policy-worker") -> None:
+        if max_workers is None:
+            max_workers = default_max_workers()
+        if max_workers <= 0:
+            raise ValueError("max_workers must be greater than 0")
+        self.__max_workers = max_workers
+        self.__min_workers = min(_MIN_ADAPTIVE_WORKERS, max_workers) if adaptive else max_workers
+        self.__adaptive = adaptive
+        self.__limit = min(os.cpu_count() or 1, max_workers) if adaptive else max_workers
+        self.__limit = max(self.__limit, self.__min_workers)
+        self.__thread_name_prefix = thread_name_prefix
+        self.__queue: queue.SimpleQueue = queue.SimpleQueue()
+        self.__lock = threading.Lock()
+        self.__threads: Set[threading.Thread] = set()
+        self.__idle = 0
+        self.__shutdown = False
+        self.__submitted = 0
+        self.__completed = 0
+        self.__max_queue_depth = 0
+        self.__total_wait = 0.0
+        self.__max_wait = 0.0
+        self.__total_wall = 0.0
+        self.__total_cpu = 0.0
+        self.__window_tasks = 0
+        self.__window_wait = 0.0
+        self.__window_started: Optional[float] = None
+        # The throughput of the last window, the size to go back to if growing didn't pay off, and how
+        # many windows to wait before growing again.
+        self.__last_throughput = 0.0
+        self.__grown_from: Optional[int] = None
+        self.__grow_cooldown = 0
+        self.__grow_backoff = _MIN_GROW_BACKOFF_WINDOWS
+
+    def submit(self, fn, *args, **kwargs):  # pylint: disable=arguments-differ
+        future: futures.Future = futures.Future()
+        with self.__lock:
+            if self.__shutdown:
+                raise RuntimeError("cannot schedule new futures after shutdown")
+            self.__queue.put(_WorkItem(future, fn, args, kwargs, time.perf_counter()))
+            self.__submitted += 1
+            depth = self.__queue.qsize()
+            self.__max_queue_depth = max(self.__max_queue_depth, depth)
+            if depth > self.__idle and len(self.__threads) < self.__limit:
+                self.__start_worker()
+        return future
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False) -> None:
+        with self.__lock:
+            self.__shutdown = True
+            if cancel_futures:
+                while True:
+                    try:
+                        item = self.__queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is not None:
+                        item.future.cancel()
+            threads = list(self.__threads)
+            # Wake every worker so that it sees the shutdown.
+            for _ in threads:
+                self.__queue.put(None)
+        if wait:
+            for t in threads:
+                t.join()
+
+    def stats(self) -> PoolStats:
+        """
+        Returns a snapshot of the pool's size and backpressure measurements.
+        """
+        with self.__lock:
+            blocked_ratio = 1.0 - self.__total_cpu / self.__total_wall if self.__total_wall > 0 else 0.0
+            return PoolStats(
+                workers=len(self.__threads),
+                max_workers=self.__limit,
+                queue_depth=self.__queue.qsize(),
+                max_queue_depth=self.__max_queue_depth,
+                submitted=self.__submitted,
+                completed=self.__completed,
+                total_wait_seconds=self.__total_wait,
+                max_wait_seconds=self.__max_wait,
+                blocked_ratio=max(blocked_ratio, 0.0),
+            )
+
+    def __start_worker(self) -> None:
+        t = threading.Thread(target=self.__work,
+                             name=f"{self.__thread_name_prefix}-{self.__submitted}",
+                             daemon=True)
+        self.__threads.add(t)
+        t.start()
+
+    def __work(self) -> None:
+        me = threading.current_thread()
+        timeout = _IDLE_TIMEOUT_SECONDS if self.__adaptive else None
+        while True:
+            with self.__lock:
+                self.__idle += 1
+            try:
+                item = self.__queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            with self.__lock:
+                self.__idle -= 1
+                if item is None:
+                    # Exit on shutdown, or when an adaptive pool has shrunk below its live workers.
+                    if self.__shutdown or len(self.__threads) > self.__limit:
+                        self.__threads.discard(me)
+                        return
+                    continue
+
+            started = time.perf_counter()
+            wait = started - item.enqueued
+            wall = cpu = 0.0
+            if item.future.set_running_or_notify_cancel():
+                cpu_started = time.thread_time()
+                try:
+                    result = item.fn(*item.args, **item.kwargs)
+                except BaseException as e:  # pylint: disable=broad-except
+                    item.future.set_exception(e)
+                else:
+                    item.future.set_result(result)
+                wall = time.perf_counter() - started
+                cpu = time.thread_time() - cpu_started
+            del item
+
+            with self.__lock:
+                self.__record(started, wait, wall, cpu)
+                # An adaptive pool that shrank retires workers as they finish tasks, even under load.
+                if len(self.__threads) > self.__limit:
+                    self.__threads.discard(me)
+                    return
+
+    def __record(self, started: float, wait: float, wall: float, cpu: float) -> None:
+        self.__completed += 1
+        self.__total_wait += wait
+        self.__max_wait = max(self.__max_wait, wait)
+        self.__total_wall += wall
+        self.__total_cpu += min(cpu, wall)
+        if not self.__adaptive:
+            return
+
+        if self.__window_started is None:
+            self.__window_started = started
+        self.__window_tasks += 1
+        self.__window_wait += wait
+        if self.__window_tasks < _ADAPT_WINDOW:
+            return
+
+        now = time.perf_counter()
+        elapsed = now - self.__window_started
+        throughput = self.__window_tasks / elapsed if elapsed > 0 else 0.0
+        backlog = self.__window_wait > 0 and self.__queue.qsize() > 0
+        if self.__grown_from is not None:
+            if throughput < self.__last_throughput * (1 + _MIN_THROUGHPUT_GAIN):
+                # The extra threads didn't complete more tasks, e.g. because the tasks are CPU-bound
+                # and contend for the GIL, so go back to the previous size for a while.
+                self.__limit = self.__grown_from
+                self.__grow_cooldown = self.__grow_backoff
+                self.__grow_backoff = min(self.__grow_backoff * 2, _MAX_GROW_BACKOFF_WINDOWS)
+            else:
+                self.__grow_backoff = _MIN_GROW_BACKOFF_WINDOWS
+            self.__grown_from = None
+        elif not backlog:
+            self.__limit = max(self.__limit - 1, self.__min_workers)
+        elif self.__grow_cooldown > 0:
+            self.__grow_cooldown -= 1
+        elif self.__limit < self.__max_workers:
+            self.__grown_from = self.__limit
+            self.__limit = min(self.__limit * 2, self.__max_workers)
+            # Start workers for the queued tasks right away rather than on the next submit.
+            for _ in range(min(self.__queue.qsize(), self.__limit - len(self.__threads))):
+                self.__start_worker()
+        self.__last_throughput = throughput
+        self.__window_tasks = 0
+        self.__window_wait = 0.0
+        self.__window_started = now
@@ -0,0 +1,198 @@
+# Copyright 2016-2020, Pulumi Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Runs `ExecutionMode.PROCESS_POOL` resource validation policies in a pool of worker processes.
+
+Each worker process loads the policy pack once, by running the policy pack's program: `PolicyPack`
+notices that it's running in a worker and registers its policies here instead of serving them. The
+parent ships each validation to a worker as the serialized `AnalyzeRequest` and the policy's config,
+and the worker sends back the violations the policy reported and the `UnknownValueError` it raised,
+if any, which the parent replays so that the diagnostics are the same as when the policy runs
+in-process.
+"""
+
+import asyncio
+from concurrent import futures
+from inspect import isawaitable
+import multiprocessing
+import os
+import runpy
+import sys
+import threading
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple, Union, TYPE_CHECKING
+
+from pulumi.runtime import proto
+
+from .loop import EventLoopThread
+from .policy import EnforcementLevel, Policy, ReportViolation, ResourceValidationArgs, ResourceValidationPolicy
+from .proxy import UnknownValueError
+
+if TYPE_CHECKING:
+    from .server import _PolicyAnalyzerServicer
+
+
+# Set to the process id of a process with a process pool, so that its worker processes know they're
+# workers as soon as they start.
+_PARENT_PID_ENV = "PULUMI_POLICY_PROCESS_POOL_PARENT"
+
+
+class _Outcome(NamedTuple):
+    violations: List[Tuple[str, Optional[str]]]
+    """
+    The `(message, urn)` of each violation the policy reported, in order.
+    """
+
+    unknown: Optional[Tuple[str, List[str]]]
+    """
+    The sentinel and property path of the `UnknownValueError` the policy raised, if any.
+    """
+
+
+class ProcessPool:
+    """
+    A pool of worker processes running resource validation policies. The worker processes are started
+    on first use, with the "spawn" start method so that they don't inherit the gRPC server's threads.
+    """
+
+    __executor: Optional[futures.ProcessPoolExecutor]
+
+    def __init__(self, pack_file: str, max_processes: Optional[int] = None) -> None:
+        """
+        :param str pack_file: The path of the policy pack's program, which each worker process runs to
+               load the policies.
+        :param Optional[int] max_processes: The number of worker processes. Defaults to the number of CPUs.
+        """
+        self.__pack_file = os.path.abspath(pack_file)
+        self.__max_processes = max_processes
+        self.__lock = threading.Lock()
+        self.__executor = None
+
+    async def validate(self,
+                       policy_name: str,
+                       request: bytes,
+                       config: Optional[Dict[str, Any]],
+                       report_violation: ReportViolation) -> None:
+        """
+        Runs the policy in a worker process against the serialized `AnalyzeRequest`, then reports the
+        policy's violations with `report_violation` and raises its `UnknownValueError`, if any.
+        """
+        future = self.__get_executor().submit(_validate, policy_name, request, config)
+        outcome: _Outcome = await asyncio.wrap_future(future)
+        for message, urn in outcome.violations:
+            report_violation(message, urn)
+        if outcome.unknown is not None:
+            sentinel, props = outcome.unknown
+            raise UnknownValueError(sentinel, props)
+
+    def close(self) -> None:
+        """
+        Shuts down the worker processes, if they were started.
+        """
+        with self.__lock:
+            executor, self.__executor = self.__executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def __get_executor(self) -> futures.ProcessPoolExecutor:
+        with self.__lock:
+            if self.__executor is None:
+                # Worker processes are spawned as they're needed, so this stays set.
+                os.environ[_PARENT_PID_ENV] = str(os.getpid())
+                self.__executor = futures.ProcessPoolExecutor(
+                    max_workers=self.__max_processes,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_initialize_worker,
+                    initargs=(self.__pack_file,))
+            return self.__executor
+
+
+# The state of a worker process. `_worker_servicer` is set once the policy pack has been loaded.
+_in_worker = False
+_worker_servicer: Optional['_PolicyAnalyzerServicer'] = None
+_worker_policies: Dict[str, ResourceValidationPolicy] = {}
+_worker_event_loop: Optional[EventLoopThread] = None
+_last_view: Optional[Tuple[bytes, proto.AnalyzeRequest, Any]] = None
+
+
+def in_worker() -> bool:
+    """
+    Returns whether this is a worker process loading the policy pack. A spawned worker re-imports the
+    plugin's main module, which may create the `PolicyPack`, before `_initialize_worker` runs, so a
+    worker is also recognized by its parent, which started a process pool.
+    """
+    return _in_worker or os.environ.get(_PARENT_PID_ENV) == str(os.getppid())
+
+
+def register_worker_policies(name: str,
+                             version: str,
+                             policies: List[Policy],
+                             enforcement_level: EnforcementLevel,
+                             initial_config: Optional[Dict[str, Union[EnforcementLevel, Dict[str, Any]]]]) -> None:
+    """
+    Makes the policy pack's resource validation policies available to run in this worker process.
+    """
+    global _worker_servicer  # pylint: disable=global-statement
+    # Imported here since the server module depends on this module.
+    from .server import _PolicyAnalyzerServicer  # pylint: disable=import-outside-toplevel,cyclic-import
+    _worker_servicer = _PolicyAnalyzerServicer(name, version, policies, enforcement_level, initial_config,
+                                                worker=True)
+    for policy in policies:
+        if isinstance(policy, ResourceValidationPolicy):
+            _worker_policies[policy.name] = policy
+
+
+def _initialize_worker(pack_file: str) -> None:
+    global _in_worker, _worker_event_loop  # pylint: disable=global-statement
+    _in_worker = True
+    _worker_event_loop = EventLoopThread()
+    # Like `python -m pulumi.policy`, make the policy pack's own modules importable.
+    sys.path.insert(0, os.path.dirname(pack_file))
+    # The policy pack has already been loaded if it's the plugin's main module and doesn't check
+    # `__name__`, since the worker re-imported it on startup.
+    if _worker_servicer is None:
+        runpy.run_path(pack_file, run_name="__main__")
+    if _worker_servicer is None:
+        raise RuntimeError(f"{pack_file} didn't create a PolicyPack")
+
+
+def _validate(policy_name: str, request: bytes, config: Optional[Dict[str, Any]]) -> _Outcome:
+    global _last_view  # pylint: disable=global-statement
+    assert _worker_servicer is not None and _worker_event_loop is not None
+    policy = _worker_policies[policy_name]
+
+    # Several policies usually validate the same resource one after another, so keep the parsed request
+    # and the view of the last resource rather than parsing and converting it again for each policy.
+    last_view = _last_view
+    if last_view is not None and last_view[0] == request:
+        _, analyze_request, view = last_view
+    else:
+        analyze_request = proto.AnalyzeRequest.FromString(request)
+        view = _worker_servicer._get_resource_view(analyze_request)  # pylint: disable=protected-access
+        _last_view = (request, analyze_request, view)
+
+    args = ResourceValidationArgs(analyze_request.type, view.props, analyze_request.urn, analyze_request.name,
+                                  view.opts, view.provider, config, view.unknown_paths)
+    violations: List[Tuple[str, Optional[str]]] = []
+
+    def report_violation(message: str, urn: Optional[str] = None) -> None:
+        violations.append((message, urn))
+
+    try:
+        result = policy.validate(args, report_violation)
+        if isawaitable(result):
+            _worker_event_loop.run(result)
+    except UnknownValueError as e:
+        return _Outcome(violations, (e.unknown_type_sentinel, e.props))
+    return _Outcome(violations, None)
@@ -0,0 +1,193 @@
+# Copyright 2016-2020, Pulumi Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Profilers for the work the analyzer does in a policy pack's plugin process. The servicer profiles
+each unit of work, i.e. preparing the arguments of an RPC or calling a policy's `validate`, under a
+label naming the RPC and the policy, so that profiles can be attributed to policies.
+"""
+
+from abc import ABC, abstractmethod
+from collections import Counter
+from contextlib import contextmanager
+import cProfile
+import itertools
+import os
+import re
+import sys
+import threading
+from typing import ContextManager, Dict, Iterator, List
+
+CPROFILE = "cprofile"
+"""
+Profiles sampled units of work with `cProfile`, writing a `.prof` file per unit, which can be read
+with `pstats` or converted to a flame graph with tools like `flameprof`.
+"""
+
+SAMPLE = "sample"
+"""
+Samples the stacks of the threads doing sampled units of work from a background thread, writing all
+of the samples to a single file of collapsed stacks, which `flamegraph.pl` and speedscope can read.
+"""
+
+# How often the sampling profiler samples stacks, in seconds.
+_SAMPLE_INTERVAL = 0.005
+
+_UNSAFE_FILE_CHARACTERS = re.compile(r"[^A-Za-z0-9_.-]")
+
+
+class Profiler(ABC):
+    """
+    A profiler of units of work, which only profiles one unit in every `every`.
+    """
+
+    def __init__(self, directory: str, every: int = 1) -> None:
+        """
+        :param str directory: The directory profiles are written to, which is created if it doesn't exist.
+        :param int every: Profile one unit of work in every `every`.
+        """
+        if not directory or not isinstance(directory, str):
+            raise TypeError("Expected directory to be a non-empty string")
+        if not isinstance(every, int) or every <= 0:
+            raise TypeError("Expected every to be a positive integer")
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.__every = every
+        self.__counter = itertools.count()
+
+    @contextmanager
+    def profile(self, rpc: str, label: str) -> Iterator[None]:
+        """
+        Profiles the work done in the context, on the current thread, if it's sampled.
+        """
+        sequence = next(self.__counter)
+        if sequence % self.__every != 0:
+            yield
+            return
+        with self._profile(sequence, rpc, label):
+            yield
+
+    @abstractmethod
+    def _profile(self, sequence: int, rpc: str, label: str) -> ContextManager[None]:
+        """
+        Profiles the work done in the context, the sampled unit of work numbered `sequence`, done for
+        `rpc` under `label`.
+        """
+
+    def close(self) -> None:
+        """
+        Writes any profiles that haven't been written yet.
+        """
+
+
+class CProfileProfiler(Profiler):
+    """
+    Profiles each sampled unit of work with `cProfile`, writing `<sequence>-<rpc>-<label>.prof` files.
+    """
+
+    @contextmanager
+    def _profile(self, sequence: int, rpc: str, label: str) -> Iterator[None]:
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Newer versions of Python only allow one profiler to be active at a time in the process,
+            # so a unit of work that overlaps another one on a different thread isn't profiled.
+            yield
+            return
+        try:
+            yield
+        finally:
+            profile.disable()
+            name = f"{sequence:06d}-{rpc}-{_UNSAFE_FILE_CHARACTERS.sub('_', label)}.prof"
+            profile.dump_stats(os.path.join(self.directory, name))
+
+
+class SamplingProfiler(Profiler):
+    """
+    Samples the stacks of the threads doing sampled units of work every few milliseconds, and writes
+    the samples, prefixed with the RPC and label of their unit of work, as collapsed stacks to
+    `pulumi-policy-<pid>.folded` when closed. Async validations continue on the event loop, outside of
+    the unit of work that started them, so only their synchronous part is sampled.
+    """
+
+    def __init__(self, directory: str, every: int = 1, interval: float = _SAMPLE_INTERVAL) -> None:
+        """
+        :param float interval: How often to sample, in seconds.
+        """
+        super().__init__(directory, every)
+        self.__interval = interval
+        self.__labels: Dict[int, List[str]] = {}
+        self.__samples: 'Counter[str]' = Counter()
+        self.__lock = threading.Lock()
+        self.__stopped = threading.Event()
+        self.__sampler = threading.Thread(target=self.__run, name="pulumi-policy-profiler", daemon=True)
+        self.__sampler.start()
+
+    @contextmanager
+    def _profile(self, sequence: int, rpc: str, label: str) -> Iterator[None]:
+        tid = threading.get_ident()
+        with self.__lock:
+            self.__labels.setdefault(tid, []).append(f"{rpc}:{label}".replace(";", "_"))
+        try:
+            yield
+        finally:
+            with self.__lock:
+                labels = self.__labels[tid]
+                labels.pop()
+                if not labels:
+                    del self.__labels[tid]
+
+    def sample(self) -> None:
+        """
+        Samples the stacks of the threads doing sampled units of work.
+        """
+        frames = sys._current_frames()  # pylint: disable=protected-access
+        with self.__lock:
+            for tid, labels in self.__labels.items():
+                frame = frames.get(tid)
+                if frame is None:
+                    continue
+                stack: List[str] = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(labels[-1])
+                self.__samples[";".join(reversed(stack))] += 1
+
+    def close(self) -> None:
+        if self.__stopped.is_set():
+            return
+        self.__stopped.set()
+        self.__sampler.join()
+        with self.__lock:
+            lines = [f"{stack} {count}\n" for stack, count in sorted(self.__samples.items())]
+        with open(os.path.join(self.directory, f"pulumi-policy-{os.getpid()}.folded"), "w", encoding="utf-8") as f:
+            f.writelines(lines)
+
+    def __run(self) -> None:
+        while not self.__stopped.wait(self.__interval):
+            self.sample()
+
+
+def create_profiler(directory: str, mode: str, every: int = 1) -> Profiler:
+    """
+    Returns a profiler of the given mode, `CPROFILE` or `SAMPLE`.
+    """
+    if mode == CPROFILE:
+        return CProfileProfiler(directory, every)
+    if mode == SAMPLE:
+        return SamplingProfiler(directory, every)
+    raise ValueError(f"Expected the profiler mode to be '{CPROFILE}' or '{SAMPLE}', got '{mode}'")
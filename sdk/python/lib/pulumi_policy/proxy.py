@@ -12,9 +12,14 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from typing import Any, Dict, List
+import copy
+from typing import AbstractSet, Any, Dict, FrozenSet, Iterator, List, NoReturn, Optional, Tuple
 
-from collections.abc import Mapping, Sequence
+from collections.abc import Mapping, Sequence, Set
+
+from google.protobuf import struct_pb2
+
+from .deserialize import SPECIAL_SECRET_SIG, SPECIAL_SIG_KEY, _VALUE_CONVERTERS, _decode_signature
 
 # UNKNOWN_BOOLEAN_VALUE is a sentinel indicating that a boolean property's value is not known,
 # because it depends on a computation with values whose values themselves are not yet known (e.g.,
@@ -51,6 +56,20 @@ UNKNOWN_ARCHIVE_VALUE = "e48ece36-62e2-4504-bad9-02848725956a"
 # dependent upon an output property).
 UNKNOWN_OBJECT_VALUE = "dd056dcd-154b-4c76-9bd3-c8f88648b5ff"
 
+_UNKNOWN_VALUES = frozenset([
+    UNKNOWN_BOOLEAN_VALUE,
+    UNKNOWN_NUMBER_VALUE,
+    UNKNOWN_STRING_VALUE,
+    UNKNOWN_ARRAY_VALUE,
+    UNKNOWN_ASSET_VALUE,
+    UNKNOWN_ARCHIVE_VALUE,
+    UNKNOWN_OBJECT_VALUE,
+])
+
+# The containers that `unknown_checking_proxy` wraps: those built by `deserialize_struct` and
+# `frozen_properties`.
+_CONTAINER_TYPES = (list, tuple, dict)
+
 
 class UnknownValueError(Exception):
     """
@@ -69,7 +88,30 @@ class UnknownValueError(Exception):
         self.message = f"{unknown_type} value at .{path} can't be known during preview"
 
 
-def unknown_checking_proxy(props: Dict[str, Any]) -> Dict[str, Any]:
+class FrozenDict(dict):
+    """
+    A read-only dict, as built by `frozen_properties`. Methods that would modify it raise a
+    `TypeError`. It can be copied and pickled like a dict, and `dict(...)` returns a mutable copy.
+    """
+
+    __slots__ = ()
+
+    def __copy__(self) -> 'FrozenDict':
+        return self
+
+    def __deepcopy__(self, memo: Dict[int, Any]) -> 'FrozenDict':
+        return FrozenDict((k, copy.deepcopy(v, memo)) for k, v in self.items())
+
+    def __reduce__(self) -> Any:
+        return FrozenDict, (dict(self),)
+
+    def __read_only(self, *args: Any, **kwargs: Any) -> NoReturn:
+        raise TypeError(f"'{type(self).__name__}' object is read-only")
+
+    __setitem__ = __delitem__ = __ior__ = clear = pop = popitem = setdefault = update = __read_only
+
+
+def unknown_checking_proxy(props: Mapping[str, Any]) -> Mapping[str, Any]:
     """
     Takes a set of resource inputs, and returns a wrapped version that
     intercepts all property accesses to check if they are unknown, raising an `UnknownValueError` if
@@ -77,28 +119,225 @@ def unknown_checking_proxy(props: Dict[str, Any]) -> Dict[str, Any]:
     until the resource has been initialized by the cloud provider, this value would be unknown during
     `pulumi preview`, and only filled in during the update.
     """
-    return _proxy_helper(props, [])
+    return _proxy_helper(props, None, None)
+
+
+def unwrap_proxy(props: Mapping[str, Any]) -> Mapping[str, Any]:
+    """
+    Returns the properties wrapped by an `unknown_checking_proxy`, or `props` itself if it isn't a proxy.
+    """
+    if isinstance(props, _DictProxy):
+        return props._wrapped()  # pylint: disable=protected-access
+    return props
+
+
+def frozen_properties(struct: struct_pb2.Struct) -> Tuple[Mapping[str, Any], FrozenSet[Tuple[str, ...]]]:
+    """
+    Deserializes a gRPC `Struct` of resource inputs like `deserialize_struct`, but into read-only
+    containers (`FrozenDict`s instead of dicts and tuples instead of lists), and returns them
+    along with the path to each unknown value found along the way. When there are no unknown
+    values, the containers can be handed to policies as is, without an unknown-checking proxy.
+    """
+    result: Dict[str, Any] = {}
+    unknown_paths: List[Tuple[str, ...]] = []
+    # The path to each container that's still to be filled in, as a (parent path, key) pair, and
+    # the containers to freeze, with their parent container and key, once they're filled in.
+    paths: Dict[int, Any] = {}
+    containers: List[Tuple[Any, Any, Any]] = []
+    pending: List[Tuple[Any, Any]] = [(struct.fields, result)]
+    while pending:
+        values, target = pending.pop()
+        path = paths.pop(id(target), None)
+        items = values.items() if target.__class__ is dict else enumerate(values)
+        for key, value in items:
+            val = _VALUE_CONVERTERS[value.WhichOneof("kind")](value, pending, True)
+            cls = val.__class__
+            if cls is str:
+                if val in _UNKNOWN_VALUES:
+                    unknown_paths.append(_materialize_path(path, key))
+            elif cls is dict or cls is list:
+                paths[id(val)] = (path, key)
+                containers.append((target, key, val))
+            if target.__class__ is dict:
+                target[key] = val
+            else:
+                target.append(val)
+    # Children are added after their parents, so going backwards freezes nested containers before
+    # the containers that hold them.
+    for parent, key, container in reversed(containers):
+        parent[key] = FrozenDict(container) if container.__class__ is dict else tuple(container)
+    return FrozenDict(result), frozenset(unknown_paths)
+
+
+def unknown_paths_view(struct: struct_pb2.Struct) -> AbstractSet[Tuple[str, ...]]:
+    """
+    Returns the paths to the unknown values in a gRPC `Struct` of resource inputs, as a set that's
+    only computed when it's first used. Paths are tuples of keys, with list indexes as strings, like
+    the path of an `UnknownValueError`.
+    """
+    return _LazyUnknownPaths(struct)
+
+
+def struct_view(struct: struct_pb2.Struct) -> Mapping:
+    """
+    Returns a read-only view of a gRPC `Struct` of resource inputs that behaves like
+    `unknown_checking_proxy(deserialize_struct(struct))`, without converting the `Struct` up front.
+    Values are converted when they're read: nested structs and lists are wrapped in views of their
+    own, assets, archives, and secrets are decoded, and unknown values raise `UnknownValueError`.
+    The `Struct` must not be modified while the view is in use.
+    """
+    return _StructProxy(struct, None, None)
+
+
+def _materialize_path(path: Any, key: Any) -> Tuple[str, ...]:
+    keys = [str(key)]
+    while path is not None:
+        path, parent_key = path
+        keys.append(str(parent_key))
+    keys.reverse()
+    return tuple(keys)
+
+
+class _LazyUnknownPaths(Set):
+    __slots__ = ("__struct", "__paths")
+
+    def __init__(self, struct: struct_pb2.Struct):
+        self.__struct = struct
+        self.__paths: Optional[FrozenSet[Tuple[str, ...]]] = None
+
+    def __contains__(self, path: object) -> bool:
+        return path in self.__get()
+
+    def __iter__(self) -> Iterator[Tuple[str, ...]]:
+        return iter(self.__get())
+
+    def __len__(self) -> int:
+        return len(self.__get())
+
+    def __get(self) -> FrozenSet[Tuple[str, ...]]:
+        if self.__paths is None:
+            self.__paths = _find_unknown_paths(self.__struct)
+        return self.__paths
+
+
+def _find_unknown_paths(struct: struct_pb2.Struct) -> FrozenSet[Tuple[str, ...]]:
+    unknown_paths: List[Tuple[str, ...]] = []
+    pending: List[Tuple[Any, Iterator[Tuple[Any, struct_pb2.Value]]]] = [(None, iter(struct.fields.items()))]
+    while pending:
+        path, items = pending.pop()
+        for key, value in items:
+            kind = value.WhichOneof("kind")
+            # Secrets are read as their value.
+            while kind == "struct_value" and _is_secret(value.struct_value):
+                value = value.struct_value.fields["value"]
+                kind = value.WhichOneof("kind")
+            if kind == "string_value":
+                if value.string_value in _UNKNOWN_VALUES:
+                    unknown_paths.append(_materialize_path(path, key))
+            elif kind == "struct_value" and SPECIAL_SIG_KEY not in value.struct_value.fields:
+                pending.append(((path, key), iter(value.struct_value.fields.items())))
+            elif kind == "list_value":
+                pending.append(((path, key), enumerate(value.list_value.values)))
+    return frozenset(unknown_paths)
+
+
+def _is_secret(struct: struct_pb2.Struct) -> bool:
+    fields = struct.fields
+    return (SPECIAL_SIG_KEY in fields and fields[SPECIAL_SIG_KEY].string_value == SPECIAL_SECRET_SIG
+            and "value" in fields)
 
 
-class _ListProxy(Sequence):
-    def __init__(self, elems: List[Any], props_acc: List[str]):
+class _Proxy:
+    """
+    The base of the list and dict proxies. Rather than each proxy holding the path to its value, which
+    would mean building a path for every proxy, a proxy points to its parent and its key in the
+    parent, and the path is only materialized when an `UnknownValueError` is raised.
+
+    There's a proxy for every list and dict that's read, so proxies keep their attributes in slots.
+    """
+
+    __slots__ = ("_parent", "_key")
+
+    def __init__(self, parent: Optional['_Proxy'], key: Any):
+        self._parent = parent
+        self._key = key
+
+    def _unknown_value_error(self, val: str, key: Any) -> UnknownValueError:
+        props = [str(key)]
+        proxy: Optional[_Proxy] = self
+        while proxy is not None and proxy._parent is not None:
+            props.append(str(proxy._key))
+            proxy = proxy._parent
+        props.reverse()
+        return UnknownValueError(val, props)
+
+
+class _ListProxy(_Proxy, Sequence):
+    """
+    Wraps a list, raising `UnknownValueError` when an unknown element is read. Elements that are
+    themselves lists or dicts are wrapped when they're first read, and the wrappers are kept so that
+    reading the same element again returns the same proxy.
+    """
+
+    __slots__ = ("__elems", "__children")
+
+    def __init__(self, elems: Sequence, parent: Optional[_Proxy], key: Any):
+        super().__init__(parent, key)
         self.__elems = elems
-        self.__props_acc = props_acc
+        self.__children: Optional[Dict[int, Any]] = None
 
     def __getitem__(self, key):
-        return _raise_if_unknown(key, self.__elems[key], self.__props_acc)
+        if isinstance(key, slice):
+            # Like indexing a list of proxies, slicing returns a list of the elements without
+            # checking whether they're unknown.
+            return [self.__child(i) for i in range(len(self.__elems))[key]]
+        val = self.__elems[key]
+        if _is_unknown(val):
+            raise self._unknown_value_error(val, key)
+        if isinstance(val, _CONTAINER_TYPES):
+            return self.__child(key if key >= 0 else key + len(self.__elems))
+        return val
 
     def __len__(self):
         return len(self.__elems)
 
+    def __child(self, index: int) -> Any:
+        if self.__children is None:
+            self.__children = {}
+        child = self.__children.get(index)
+        if child is None:
+            child = _proxy_helper(self.__elems[index], self, index)
+            self.__children[index] = child
+        return child
+
+
+class _DictProxy(_Proxy, Mapping):
+    """
+    Wraps a dict, raising `UnknownValueError` when an unknown value is read. Values that are
+    themselves lists or dicts are wrapped when they're first read, and the wrappers are kept so that
+    reading the same key again returns the same proxy.
+    """
+
+    __slots__ = ("__map", "__children")
 
-class _DictProxy(Mapping):
-    def __init__(self, d: Dict[str, Any], props_acc: List[str]):
+    def __init__(self, d: Mapping, parent: Optional[_Proxy], key: Any):
+        super().__init__(parent, key)
         self.__map = d
-        self.__props_acc = props_acc
+        self.__children: Optional[Dict[str, Any]] = None
 
     def __getitem__(self, key):
-        return _raise_if_unknown(key, self.__map[key], self.__props_acc)
+        val = self.__map[key]
+        if _is_unknown(val):
+            raise self._unknown_value_error(val, key)
+        if isinstance(val, _CONTAINER_TYPES):
+            if self.__children is None:
+                self.__children = {}
+            child = self.__children.get(key)
+            if child is None:
+                child = _proxy_helper(val, self, key)
+                self.__children[key] = child
+            return child
+        return val
 
     def __len__(self):
         return self.__map.__len__()
@@ -106,46 +345,118 @@ class _DictProxy(Mapping):
     def __iter__(self):
         return iter(self.__map)
 
+    def _wrapped(self) -> Mapping:
+        return self.__map
 
-def _raise_if_unknown(key: Any, val: Any, props_acc: List[str]) -> Any:
-    if _is_unknown(val):
-        raise UnknownValueError(val, _append_prop(props_acc, key))
-    return val
 
+class _ProtoProxy(_Proxy):
+    """
+    The base of the views over a `Struct` and a `ListValue`, which converts values as they're read.
+    Values that aren't scalars are kept, so that reading the same value again returns the same object.
+    """
 
-def _append_prop(props_acc: List[str], key: Any) -> List[str]:
-    props = props_acc.copy()
-    props.append(str(key))
-    return props
+    __slots__ = ("_children",)
+
+    def __init__(self, parent: Optional[_Proxy], key: Any):
+        super().__init__(parent, key)
+        self._children: Optional[Dict[Any, Any]] = None
+
+    def _convert(self, key: Any, value: struct_pb2.Value) -> Any:
+        if self._children is not None and key in self._children:
+            return self._children[key]
+
+        kind = value.WhichOneof("kind")
+        if kind in ("struct_value", "list_value"):
+            child: Any
+            if kind == "list_value":
+                child = _ListValueProxy(value.list_value, self, key)
+            elif SPECIAL_SIG_KEY in value.struct_value.fields:
+                secret, child = _decode_signature(value.struct_value)
+                if secret is not None:
+                    # Secrets are read as their value.
+                    return self._convert(key, secret)
+            else:
+                child = _StructProxy(value.struct_value, self, key)
+            if self._children is None:
+                self._children = {}
+            self._children[key] = child
+            return child
+
+        val = _VALUE_CONVERTERS[kind](value, [], False)
+        if _is_unknown(val):
+            raise self._unknown_value_error(val, key)
+        return val
+
+
+class _StructProxy(_ProtoProxy, Mapping):
+    """
+    A read-only view of a `Struct`.
+    """
+
+    __slots__ = ("__fields",)
+
+    def __init__(self, struct: struct_pb2.Struct, parent: Optional[_Proxy], key: Any):
+        super().__init__(parent, key)
+        self.__fields = struct.fields
+
+    def __getitem__(self, key):
+        # Reading a missing key of a protobuf map would add it, so check first.
+        if not isinstance(key, str) or key not in self.__fields:
+            raise KeyError(key)
+        return self._convert(key, self.__fields[key])
+
+    def __len__(self):
+        return len(self.__fields)
+
+    def __iter__(self):
+        return iter(self.__fields)
+
+
+class _ListValueProxy(_ProtoProxy, Sequence):
+    """
+    A read-only view of a `ListValue`.
+    """
+
+    __slots__ = ("__values",)
+
+    def __init__(self, list_value: struct_pb2.ListValue, parent: Optional[_Proxy], key: Any):
+        super().__init__(parent, key)
+        self.__values = list_value.values
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            # Like the list proxy, slicing returns a list of the elements without checking whether
+            # they're unknown.
+            return [self.__convert_unchecked(i) for i in range(len(self.__values))[key]]
+        value = self.__values[key]
+        return self._convert(key if key >= 0 else key + len(self.__values), value)
+
+    def __len__(self):
+        return len(self.__values)
+
+    def __convert_unchecked(self, index: int) -> Any:
+        try:
+            return self._convert(index, self.__values[index])
+        except UnknownValueError as e:
+            return e.unknown_type_sentinel
 
 
-def _proxy_helper(to_proxy: Any, props_acc: List[str]) -> Any:
+def _proxy_helper(to_proxy: Any, parent: Optional[_Proxy], key: Any) -> Any:
     """
     Returns a wrapper "proxy" arround lists and dicts that raises
-    `UnknownValueError` when accessing unknown values.
+    `UnknownValueError` when accessing unknown values. Nested lists and dicts are
+    wrapped lazily, when they're read.
     """
 
-    if isinstance(to_proxy, list):
-        elems: List[Any] = []
-        for i, e in enumerate(to_proxy):
-            elems.append(_proxy_helper(e, _append_prop(props_acc, i)))
-        return _ListProxy(elems, props_acc)
+    if isinstance(to_proxy, (list, tuple)):
+        return _ListProxy(to_proxy, parent, key)
     if isinstance(to_proxy, dict):
-        d: Dict[str, Any] = {}
-        for key in to_proxy:
-            d[key] = _proxy_helper(to_proxy[key], _append_prop(props_acc, key))
-        return _DictProxy(d, props_acc)
+        return _DictProxy(to_proxy, parent, key)
     return to_proxy
 
 
 def _is_unknown(o: Any) -> bool:
-    return isinstance(o, str) and o in (UNKNOWN_BOOLEAN_VALUE,
-                                        UNKNOWN_NUMBER_VALUE,
-                                        UNKNOWN_STRING_VALUE,
-                                        UNKNOWN_ARRAY_VALUE,
-                                        UNKNOWN_ASSET_VALUE,
-                                        UNKNOWN_ARCHIVE_VALUE,
-                                        UNKNOWN_OBJECT_VALUE)
+    return isinstance(o, str) and o in _UNKNOWN_VALUES
 
 
 def _unknown_to_str(o: str) -> str:
@@ -0,0 +1,996 @@
+# Copyright 2016-2020, Pulumi Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+from concurrent import futures
+import copy
+import json
+import os
+import sys
+import threading
+import time
+
+from inspect import isawaitable
+from typing import AbstractSet, Any, Awaitable, Callable, Dict, Hashable, Mapping, List, NamedTuple, Optional, Sequence, Tuple, TypeVar, Union, cast
+
+import grpc
+from google.protobuf import empty_pb2, json_format, struct_pb2
+from pulumi.runtime import proto
+from pulumi.runtime.proto import analyzer_pb2_grpc
+
+from . import settings
+from .cache import CacheStats, DiskCache, LRUCache, environment_digest, estimate_size, fingerprint, source_digest
+from .dispatch import ResourceTypeIndex
+from .graph import StackGraph
+from .instrumentation import (POLICIES, RESOURCE_TYPES, STAGES, VALIDATIONS, Metrics, install_dump_signal,
+                              write_metrics)
+from .intern import InternCounters, Interner, InternStats, intern_properties
+from .loop import EventLoopThread, gather_all
+from .policy import (
+    EnforcementLevel,
+    ExecutionMode,
+    Policy,
+    PolicyCustomTimeouts,
+    PolicyProviderResource,
+    PolicyResource,
+    PolicyResourceOptions,
+    ReportViolation,
+    ResourceValidationArgs,
+    ResourceValidationPolicy,
+    StackValidationArgs,
+    StackValidationPolicy,
+    _normalize_config,
+)
+from .pool import WorkerPool
+from .process import ProcessPool
+from .profiling import Profiler, create_profiler
+from .proxy import UnknownValueError, frozen_properties, struct_view, unknown_checking_proxy, unknown_paths_view
+from .table import ResourceData, ResourceTable, ResourceTableBuilder
+from .tracing import Tracer
+from .version import SEMVERSION
+
+T = TypeVar("T")
+
+_ONE_DAY_IN_SECONDS = 60 * 60 * 24
+
+# _MAX_RPC_MESSAGE_SIZE raises the gRPC Max Message size from `4194304` (4mb) to `419430400` (400mb)
+_MAX_RPC_MESSAGE_SIZE = 1024 * 1024 * 400
+_GRPC_CHANNEL_OPTIONS = [("grpc.max_receive_message_length", _MAX_RPC_MESSAGE_SIZE)]
+
+
+def serve(name: str,
+          version: str,
+          policies: List[Policy],
+          enforcement_level: EnforcementLevel,
+          initial_config: Optional[Dict[str, Union[EnforcementLevel, Dict[str, Any]]]] = None,
+          execution_mode: ExecutionMode = ExecutionMode.IN_PROCESS,
+          pack_file: Optional[str] = None) -> None:
+    """
+    Serves the policy pack's analyzer over gRPC, writing the port to stdout, until interrupted.
+    """
+    # The worker pool runs the RPCs or, with the asyncio server, the synchronous validations.
+    pool = WorkerPool(settings.max_workers(), settings.adaptive_workers())
+
+    if settings.use_asyncio_server():
+        servicer: _PolicyAnalyzerServicer = _AsyncPolicyAnalyzerServicer(
+            name, version, policies, enforcement_level, initial_config, execution_mode, pack_file, pool)
+        dump_metrics = _install_metrics_dump(servicer, pool)
+        try:
+            asyncio.run(_serve_asyncio(servicer))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if dump_metrics is not None:
+                dump_metrics()
+            servicer.close()
+            pool.shutdown(wait=False)
+        return
+
+    servicer = _PolicyAnalyzerServicer(name, version, policies, enforcement_level, initial_config,
+                                       execution_mode, pack_file)
+    dump_metrics = _install_metrics_dump(servicer, pool)
+    server = grpc.server(pool, options=_GRPC_CHANNEL_OPTIONS)
+    analyzer_pb2_grpc.add_AnalyzerServicer_to_server(
+        servicer, server)
+    port = server.add_insecure_port(address="0.0.0.0:0")
+    server.start()
+    sys.stdout.buffer.write(f"{port}\n".encode())
+    try:
+        while True:
+            time.sleep(_ONE_DAY_IN_SECONDS)
+    except KeyboardInterrupt:
+        server.stop(0)
+    finally:
+        if dump_metrics is not None:
+            dump_metrics()
+        servicer.close()
+        pool.shutdown(wait=False)
+
+
+def _install_metrics_dump(servicer: '_PolicyAnalyzerServicer', pool: WorkerPool) -> Optional[Callable[[], None]]:
+    """
+    Returns a function that writes the servicer's metrics, along with the worker pool's statistics, to
+    the metrics file, and arranges for it to be called on `SIGUSR1`. Returns `None` if metrics are
+    disabled.
+    """
+    path = settings.metrics_path()
+    if path is None:
+        return None
+
+    def dump_metrics() -> None:
+        write_metrics(path, {**servicer.metrics(), "pool": pool.stats()._asdict()})
+
+    install_dump_signal(dump_metrics)
+    return dump_metrics
+
+
+async def _serve_asyncio(servicer: '_PolicyAnalyzerServicer') -> None:
+    server = grpc.aio.server(options=_GRPC_CHANNEL_OPTIONS)
+    analyzer_pb2_grpc.add_AnalyzerServicer_to_server(
+        servicer, server)
+    port = server.add_insecure_port(address="0.0.0.0:0")
+    await server.start()
+    sys.stdout.buffer.write(f"{port}\n".encode())
+    try:
+        await server.wait_for_termination()
+    finally:
+        await server.stop(0)
+
+
+class _PolicyAnalyzerServicer(proto.AnalyzerServicer):
+    __policy_pack_name: str
+    __policy_pack_version: str
+    __policies: List[Policy]
+    __resource_type_index: ResourceTypeIndex[ResourceValidationPolicy]
+    __policy_pack_enforcement_level: EnforcementLevel
+    __initial_config: Optional[Dict[str, Union[EnforcementLevel, Dict[str, Any]]]]
+    __policy_pack_config: Dict[str, Dict[str, Any]]
+    __policy_pack_config_enforcement_level: Dict[str, EnforcementLevel]
+    __execution_mode: ExecutionMode
+    __process_pool: Optional[ProcessPool]
+    __lazy_properties: bool
+    __config_fingerprints: Dict[str, bytes]
+    __intern_properties: bool
+    __intern_counters: InternCounters
+    __conversion_cache: Optional[LRUCache]
+    __result_cache: Optional[LRUCache]
+    __metrics: Optional[Metrics]
+    __tracer: Optional[Tracer]
+    __profiler: Optional[Profiler]
+    __disk_cache: Optional[DiskCache]
+    __disk_cache_namespace: bytes
+    __event_loop: EventLoopThread
+
+    class ResourceView(NamedTuple):
+        props: Mapping[str, Any]
+        opts: PolicyResourceOptions
+        provider: Optional[PolicyProviderResource]
+        unknown_paths: AbstractSet[Tuple[str, ...]]
+
+    class ProcessArgs(NamedTuple):
+        """
+        The arguments of a validation that runs in the process pool: the serialized request, converted
+        by the worker process, the policy's config, and the resource's URN, for tracing.
+        """
+        request: bytes
+        config: Optional[Dict[str, Any]]
+        urn: str
+
+    class ValidationRun(NamedTuple):
+        """
+        A policy to run, along with its arguments and the diagnostics it reports. A run whose arguments
+        are `None` replays cached diagnostics instead of calling the policy. The diagnostics of a run
+        with a cache key are cached under that key once the validation completes.
+        """
+        policy: Union[ResourceValidationPolicy, StackValidationPolicy]
+        args: Optional[Union[ResourceValidationArgs, StackValidationArgs, '_PolicyAnalyzerServicer.ProcessArgs']]
+        report_violation: ReportViolation
+        diagnostics: List[Any]
+        cache_key: Optional[Hashable] = None
+
+    def Analyze(self, request, context):
+        started = self._start_timer()
+        runs = self._profiled("Analyze", "prepare", self._get_analyze_runs, request)
+        response = self._run_validations(runs)
+        self._record_analyze(request, started)
+        return response
+
+    def AnalyzeStack(self, request, context):
+        started = self._start_timer()
+        runs = self._profiled("AnalyzeStack", "prepare", self._get_analyze_stack_runs, request)
+        response = self._run_validations(runs)
+        self._record_analyze_stack(request, started)
+        return response
+
+    def GetAnalyzerInfo(self, request, context):
+        policies: List[proto.PolicyInfo] = []
+        for policy in self.__policies:
+            enforcement_level = (policy.enforcement_level if policy.enforcement_level is not None
+                                 else self.__policy_pack_enforcement_level)
+
+            schema = {}
+            if policy.config_schema is not None:
+                if policy.config_schema.properties:
+                    properties = struct_pb2.Struct()
+                    for k, v in policy.config_schema.properties.items():
+                        # pylint: disable=unsupported-assignment-operation
+                        properties[k] = v
+                    schema["properties"] = properties
+                if policy.config_schema.required:
+                    schema["required"] = policy.config_schema.required
+
+            policies.append(proto.PolicyInfo(
+                name=policy.name,
+                description=policy.description,
+                enforcementLevel=self._map_enforcement_level(enforcement_level),
+                configSchema=proto.PolicyConfigSchema(**schema) if schema else None,
+            ))
+
+        initial_config = {}
+        if self.__initial_config is not None:
+            normalized_config = _normalize_config(self.__initial_config)
+            for key, val in normalized_config.items():
+                config = {}
+                if val.enforcement_level is not None:
+                    config["enforcementLevel"] = self._map_enforcement_level(val.enforcement_level)
+                if val.properties:
+                    properties = struct_pb2.Struct()
+                    for k, v in val.properties.items():
+                        # pylint: disable=unsupported-assignment-operation
+                        properties[k] = v
+                    config["properties"] = properties
+                if config:
+                    initial_config[key] = proto.PolicyConfig(**config)
+
+        return proto.AnalyzerInfo(
+            name=self.__policy_pack_name,
+            version=self.__policy_pack_version,
+            supportsConfig=True,
+            policies=policies,
+            initialConfig=initial_config,
+        )
+
+    def GetPluginInfo(self, request, context):
+        return proto.PluginInfo(version=SEMVERSION)
+
+    def Configure(self, request, context):
+        config, config_enforcement_level = {}, {}
+        for k in request.policyConfig:
+            v = request.policyConfig[k]
+            config[k] = json_format.MessageToDict(v.properties)
+            config_enforcement_level[k] = self._convert_enforcement_level(v.enforcementLevel)
+        changed = (config != self.__policy_pack_config
+                   or config_enforcement_level != self.__policy_pack_config_enforcement_level)
+        self.__policy_pack_config = config
+        self.__policy_pack_config_enforcement_level = config_enforcement_level
+        self.__config_fingerprints = {}
+        # Cached results are keyed by the config they were validated with, so they'd never be hit
+        # again; free them rather than waiting for them to be evicted.
+        if changed and self.__result_cache is not None:
+            self.__result_cache.clear()
+        return empty_pb2.Empty()
+
+    def __init__(self,
+                 name: str,
+                 version: str,
+                 policies: List[Policy],
+                 enforcement_level: EnforcementLevel,
+                 initial_config: Optional[Dict[str, Union['EnforcementLevel', Dict[str, Any]]]] = None,
+                 execution_mode: ExecutionMode = ExecutionMode.IN_PROCESS,
+                 pack_file: Optional[str] = None,
+                 worker: bool = False) -> None:
+        """
+        :param ExecutionMode execution_mode: Where resource validation policies that don't specify an
+               execution mode run.
+        :param Optional[str] pack_file: The path of the policy pack's program, which process pool workers
+               run to load the policies. When not specified, all policies run in-process.
+        :param bool worker: Whether the servicer only converts resources for a process pool worker, without
+               the caches, metrics, trace, and profiler, which belong to the plugin process.
+        """
+        assert name and isinstance(name, str)
+        assert version and isinstance(version, str)
+        assert policies and isinstance(policies, list)
+        assert enforcement_level and isinstance(
+            enforcement_level, EnforcementLevel)
+        assert initial_config is None or isinstance(initial_config, dict)
+        assert isinstance(execution_mode, ExecutionMode)
+        self.__policy_pack_name = name
+        self.__policy_pack_version = version
+        self.__policies = policies
+        self.__resource_type_index = ResourceTypeIndex(
+            [(p, p.resource_types) for p in policies if isinstance(p, ResourceValidationPolicy)])
+        self.__policy_pack_enforcement_level = enforcement_level
+        self.__initial_config = initial_config
+        self.__policy_pack_config = {}
+        self.__policy_pack_config_enforcement_level = {}
+        self.__execution_mode = execution_mode
+        # The worker processes are only started if a policy is called that runs in the process pool.
+        self.__process_pool = None
+        if pack_file and not worker and any(
+                self._get_execution_mode(p) == ExecutionMode.PROCESS_POOL for p in policies):
+            self.__process_pool = ProcessPool(pack_file, settings.max_processes())
+        self.__lazy_properties = settings.lazy_properties()
+        self.__intern_properties = settings.intern_properties() and not self.__lazy_properties
+        self.__intern_counters = InternCounters()
+        # Lazy properties read from the request, so they can't outlive it in a cache.
+        cache_bytes = settings.conversion_cache_bytes()
+        self.__conversion_cache = (LRUCache(cache_bytes) if cache_bytes is not None
+                                   and not self.__lazy_properties and not worker else None)
+        self.__result_cache = (
+            LRUCache(settings.result_cache_bytes())
+            if not worker and any(isinstance(p, ResourceValidationPolicy) and p.cacheable for p in policies)
+            else None)
+        self.__config_fingerprints = {}
+        self.__metrics = Metrics() if not worker and settings.metrics_path() is not None else None
+        trace_path = settings.trace_path() if not worker else None
+        self.__tracer = Tracer(trace_path) if trace_path is not None else None
+        profile_dir = settings.profile_dir() if not worker else None
+        self.__profiler = (
+            create_profiler(profile_dir, settings.profile_mode(), settings.profile_every())
+            if profile_dir is not None else None)
+        # The disk cache is keyed by the pack's source, so it needs the pack's program to find it.
+        self.__disk_cache = None
+        self.__disk_cache_namespace = b""
+        disk_cache_path = settings.disk_cache_path()
+        if self.__result_cache is not None and disk_cache_path and pack_file:
+            self.__disk_cache = DiskCache(disk_cache_path, settings.disk_cache_bytes())
+            self.__disk_cache_namespace = fingerprint(
+                SEMVERSION, name, version, source_digest(os.path.dirname(os.path.abspath(pack_file))),
+                environment_digest())
+        self.__event_loop = EventLoopThread()
+
+    def close(self) -> None:
+        """
+        Shuts down the event loop used to run async validations and the process pool, if any, and
+        closes the disk cache, the trace, and the profiler.
+        """
+        self.__event_loop.close()
+        if self.__process_pool is not None:
+            self.__process_pool.close()
+        if self.__disk_cache is not None:
+            self.__disk_cache.close()
+        if self.__tracer is not None:
+            self.__tracer.close()
+        if self.__profiler is not None:
+            self.__profiler.close()
+
+    def _get_analyze_runs(self, request) -> List['ValidationRun']:
+        """
+        Returns a validation run for each resource validation policy that applies to the resource.
+        """
+        runs: List[_PolicyAnalyzerServicer.ValidationRun] = []
+        view: Optional[_PolicyAnalyzerServicer.ResourceView] = None
+        serialized: Optional[bytes] = None
+        resource_fingerprint: Optional[bytes] = None
+        for policy in self.__resource_type_index.lookup(request.type):
+            enforcement_level = self._get_enforcement_level(policy)
+            if enforcement_level == EnforcementLevel.DISABLED:
+                continue
+
+            diagnostics: List[Any] = []
+            report_violation = self._create_report_violation(diagnostics, policy.name,
+                                                             policy.description, enforcement_level)
+
+            config = self._get_policy_config(policy.name)
+            cache_key: Optional[Hashable] = None
+            if self.__result_cache is not None and policy.cacheable:
+                if resource_fingerprint is None:
+                    resource_fingerprint = fingerprint(request.type, request.urn, request.name, request.properties,
+                                                       request.options, request.provider)
+                cache_key = (policy.name, self._get_config_fingerprint(policy.name, config),
+                             enforcement_level.value, resource_fingerprint)
+                cached = self._get_cached_result(cache_key)
+                if cached is not None:
+                    diagnostics.extend(cached)
+                    runs.append(_PolicyAnalyzerServicer.ValidationRun(policy, None, report_violation, diagnostics))
+                    continue
+
+            if self.__process_pool is not None and self._get_execution_mode(policy) == ExecutionMode.PROCESS_POOL:
+                # The worker process converts the resource itself, from the serialized request.
+                if serialized is None:
+                    serialized = request.SerializeToString()
+                process_args = _PolicyAnalyzerServicer.ProcessArgs(serialized, config, request.urn)
+                runs.append(_PolicyAnalyzerServicer.ValidationRun(policy, process_args, report_violation, diagnostics,
+                                                                  cache_key))
+                continue
+
+            # The resource's properties, options, and provider are the same for every policy, so
+            # convert them once, on first use, and share the read-only view across all policies.
+            if view is None:
+                started = self._start_timer()
+                view = self._get_resource_view(request)
+                self._record(STAGES, "convert", started, request.urn)
+            started = self._start_timer()
+            args = ResourceValidationArgs(request.type, view.props, request.urn, request.name, view.opts,
+                                          view.provider, config, view.unknown_paths)
+            self._record(STAGES, "args", started, request.urn)
+            runs.append(_PolicyAnalyzerServicer.ValidationRun(policy, args, report_violation, diagnostics, cache_key))
+        return runs
+
+    def _get_analyze_stack_runs(self, request) -> List['ValidationRun']:
+        """
+        Returns a validation run for each enabled stack validation policy.
+        """
+        runs: List[_PolicyAnalyzerServicer.ValidationRun] = []
+        table: Optional[ResourceTable] = None
+        graph: Optional[StackGraph] = None
+        for policy in self.__policies:
+            enforcement_level = self._get_enforcement_level(policy)
+            if enforcement_level == EnforcementLevel.DISABLED or not isinstance(policy, StackValidationPolicy):
+                continue
+
+            diagnostics: List[Any] = []
+            report_violation = self._create_report_violation(diagnostics, policy.name,
+                                                             policy.description, enforcement_level)
+
+            # The stack's resource table and graph are the same for every policy, so build them once,
+            # on first use, and share them across all policies, along with the resources and indexes
+            # created from them. Only the config differs between policies.
+            if table is None:
+                started = self._start_timer()
+                table = self._get_resource_table(request)
+                self._record(STAGES, "table", started)
+                graph = StackGraph(table.resources, table)
+            config = self._get_policy_config(policy.name)
+            started = self._start_timer()
+            args = StackValidationArgs(table.resources, config, graph, table)
+            self._record(STAGES, "args", started)
+            runs.append(_PolicyAnalyzerServicer.ValidationRun(policy, args, report_violation, diagnostics))
+        return runs
+
+    def _run_validations(self, runs: List['ValidationRun']) -> Any:
+        """
+        Calls each run's policy, completing the async validations concurrently on the event loop, and
+        returns the response with every policy's diagnostics in policy order. Like `gather_all`, every
+        async validation runs to completion before the first exception, in policy order, is raised.
+        """
+        pending: List[futures.Future] = []
+        try:
+            for run in runs:
+                awaitable = self._invoke_validation(run)
+                if awaitable is not None:
+                    # Scheduled as soon as it's created, so that if a later synchronous validation
+                    # raises, the async validations that were already started still complete.
+                    pending.append(self.__event_loop.submit(awaitable))
+        finally:
+            if pending:
+                started = self._start_timer()
+                futures.wait(pending)
+                self._record(STAGES, "event_loop_wait", started)
+        for future in pending:
+            future.result()
+        return self._create_response(runs)
+
+    def _invoke_validation(self, run: 'ValidationRun') -> Optional[Awaitable]:
+        """
+        Calls the policy's `validate`. If the validation is async, returns an awaitable that completes
+        the validation. An `UnknownValueError` raised by the validation, synchronously or not, is
+        reported in the run's diagnostics.
+        """
+        if run.args is None:
+            return None
+        started = self._start_timer()
+        if isinstance(run.args, _PolicyAnalyzerServicer.ProcessArgs):
+            assert self.__process_pool is not None
+            awaitable = self.__process_pool.validate(run.policy.name, run.args.request, run.args.config,
+                                                     run.report_violation)
+            return self._complete_validation(run, awaitable, started)
+        try:
+            rpc = "AnalyzeStack" if isinstance(run.policy, StackValidationPolicy) else "Analyze"
+            result = self._profiled(rpc, run.policy.name, self._call_validate, run, started)
+        except UnknownValueError as e:
+            run.diagnostics.append(self._create_unknown_value_diagnostic(run.policy, e))
+            self._record(POLICIES, run.policy.name, started, self._get_run_urn(run))
+            self._cache_result(run)
+            return None
+        if isawaitable(result):
+            if isinstance(run.args, StackValidationArgs):
+                # The validation continues on an event loop, so don't convert resources there as they're read.
+                run.args.table.load_all()
+            return self._complete_validation(run, cast(Awaitable, result), started)
+        self._record(POLICIES, run.policy.name, started, self._get_run_urn(run))
+        self._cache_result(run)
+        return None
+
+    async def _complete_validation(self, run: 'ValidationRun', awaitable: Awaitable,
+                                   started: Optional[float] = None) -> None:
+        try:
+            await awaitable
+        except UnknownValueError as e:
+            run.diagnostics.append(self._create_unknown_value_diagnostic(run.policy, e))
+        self._record(POLICIES, run.policy.name, started, self._get_run_urn(run))
+        self._cache_result(run)
+
+    def _call_validate(self, run: 'ValidationRun', started: Optional[float]) -> Any:
+        if started is not None and self._times_validations(run.policy):
+            # pylint: disable=protected-access
+            return cast(ResourceValidationPolicy, run.policy)._call_validations(
+                cast(ResourceValidationArgs, run.args), run.report_violation,
+                self._create_validation_recorder(run.policy, cast(ResourceValidationArgs, run.args).urn))
+        return run.policy.validate(run.args, run.report_violation)  # type: ignore
+
+    def _profiled(self, rpc: str, label: str, fn: Callable[..., T], *args: Any) -> T:
+        """
+        Calls the function, profiling it under the given RPC and label when profiling is enabled.
+        """
+        if self.__profiler is None:
+            return fn(*args)
+        with self.__profiler.profile(rpc, label):
+            return fn(*args)
+
+    def _start_timer(self) -> Optional[float]:
+        """
+        Returns the start time of a stage to pass to `_record`, or `None` if neither metrics nor
+        tracing are enabled.
+        """
+        return time.perf_counter() if self.__metrics is not None or self.__tracer is not None else None
+
+    def _record(self, category: str, name: str, started: Optional[float], urn: Optional[str] = None) -> None:
+        """
+        Records the time since `started` in the metrics, and as a span in the trace, along with the URN
+        of the resource being validated, if any.
+        """
+        if started is None:
+            return
+        ended = time.perf_counter()
+        if self.__metrics is not None:
+            self.__metrics.record(category, name, ended - started)
+        if self.__tracer is not None:
+            self.__tracer.span(name, category, started, ended, {"urn": urn} if urn else None)
+
+    def _record_analyze(self, request, started: Optional[float]) -> None:
+        if started is None:
+            return
+        ended = time.perf_counter()
+        if self.__metrics is not None:
+            self.__metrics.record(STAGES, "analyze", ended - started)
+            self.__metrics.record(RESOURCE_TYPES, request.type, ended - started)
+        if self.__tracer is not None:
+            self.__tracer.span("Analyze", "rpc", started, ended, {"urn": request.urn, "type": request.type})
+
+    def _record_analyze_stack(self, request, started: Optional[float]) -> None:
+        if started is None:
+            return
+        ended = time.perf_counter()
+        if self.__metrics is not None:
+            self.__metrics.record(STAGES, "analyze_stack", ended - started)
+        if self.__tracer is not None:
+            self.__tracer.span("AnalyzeStack", "rpc", started, ended, {"resources": len(request.resources)})
+
+    def _run_queued(self, submitted: Optional[float], fn: Callable[..., T], *args: Any) -> T:
+        """
+        Records the time since a function was submitted to an executor, then calls it.
+        """
+        self._record(STAGES, "executor_queue", submitted)
+        return fn(*args)
+
+    @staticmethod
+    def _get_run_urn(run: 'ValidationRun') -> Optional[str]:
+        return getattr(run.args, "urn", None)
+
+    @staticmethod
+    def _times_validations(policy: Policy) -> bool:
+        """
+        Returns whether each function in the policy's validate list can be timed, which is only the
+        case when the policy doesn't override `validate`.
+        """
+        return (isinstance(policy, ResourceValidationPolicy)
+                and type(policy).validate is ResourceValidationPolicy.validate)
+
+    def _create_validation_recorder(self, policy: Policy, urn: str) -> Callable[[int, Callable, float], None]:
+        metrics, tracer = self.__metrics, self.__tracer
+
+        def record(index: int, validation: Callable, seconds: float) -> None:
+            name = f"{policy.name}[{index}] {getattr(validation, '__qualname__', type(validation).__name__)}"
+            if metrics is not None:
+                metrics.record(VALIDATIONS, name, seconds)
+            if tracer is not None:
+                ended = time.perf_counter()
+                tracer.span(name, VALIDATIONS, ended - seconds, ended, {"urn": urn})
+        return record
+
+    def _cache_result(self, run: 'ValidationRun') -> None:
+        """
+        Caches the diagnostics of a completed run of a cacheable policy. Validations that fail with
+        anything other than an `UnknownValueError` never get here, so their results aren't cached.
+        """
+        if run.cache_key is None:
+            return
+        assert self.__result_cache is not None
+        diagnostics = tuple(run.diagnostics)
+        self._cache_result_in_memory(run.cache_key, diagnostics)
+        if self.__disk_cache is not None:
+            self.__disk_cache.put(self._get_disk_cache_key(run.cache_key),
+                                  proto.AnalyzeResponse(diagnostics=diagnostics).SerializeToString())
+
+    def _cache_result_in_memory(self, cache_key: Hashable, diagnostics: Tuple[Any, ...]) -> None:
+        assert self.__result_cache is not None
+        size = (estimate_size(cache_key) + sys.getsizeof(diagnostics)
+                + sum(sys.getsizeof(d) + d.ByteSize() for d in diagnostics))
+        self.__result_cache.put(cache_key, diagnostics, size)
+
+    def _get_cached_result(self, cache_key: Hashable) -> Optional[Tuple[Any, ...]]:
+        """
+        Returns the cached diagnostics of a cacheable policy, from memory or else from the disk cache,
+        or `None` if the policy hasn't run on the resource with the same config before.
+        """
+        assert self.__result_cache is not None
+        cached = self.__result_cache.get(cache_key)
+        if cached is not None or self.__disk_cache is None:
+            return cached
+        data = self.__disk_cache.get(self._get_disk_cache_key(cache_key))
+        if data is None:
+            return None
+        response = proto.AnalyzeResponse()
+        response.ParseFromString(data)
+        diagnostics = tuple(response.diagnostics)
+        self._cache_result_in_memory(cache_key, diagnostics)
+        return diagnostics
+
+    def _get_disk_cache_key(self, cache_key: Hashable) -> bytes:
+        """
+        Returns the key of a result in the disk cache. Unlike the in-memory cache, the disk cache
+        outlives the plugin, so its keys also cover the SDK and the policy pack's source.
+        """
+        return fingerprint(self.__disk_cache_namespace, *cast(Tuple[Any, ...], cache_key))
+
+    def _get_config_fingerprint(self, name: str, config: Optional[Dict[str, Any]]) -> bytes:
+        """
+        Returns a digest of a policy's effective config, computed once per policy until the config changes.
+        """
+        result = self.__config_fingerprints.get(name)
+        if result is None:
+            result = fingerprint(json.dumps(config, sort_keys=True, default=str))
+            self.__config_fingerprints[name] = result
+        return result
+
+    def _create_response(self, runs: List['ValidationRun']) -> Any:
+        started = self._start_timer()
+        response = proto.AnalyzeResponse(diagnostics=[d for run in runs for d in run.diagnostics])
+        self._record(STAGES, "response", started)
+        return response
+
+    def _create_unknown_value_diagnostic(self, policy: Policy, e: UnknownValueError) -> Any:
+        return proto.AnalyzeDiagnostic(
+            policyName=policy.name,
+            policyPackName=self.__policy_pack_name,
+            policyPackVersion=self.__policy_pack_version,
+            message=f"can't run policy '{policy.name}' during preview: {e.message}",
+            urn="",
+            description=policy.description,
+            enforcementLevel=self._map_enforcement_level(EnforcementLevel.ADVISORY),
+        )
+
+    def _get_execution_mode(self, policy: Policy) -> ExecutionMode:
+        if isinstance(policy, ResourceValidationPolicy) and policy.execution_mode is not None:
+            return policy.execution_mode
+        if isinstance(policy, ResourceValidationPolicy):
+            return self.__execution_mode
+        return ExecutionMode.IN_PROCESS
+
+    def _get_enforcement_level(self, policy: Policy) -> EnforcementLevel:
+        if policy.name in self.__policy_pack_config_enforcement_level:
+            return self.__policy_pack_config_enforcement_level[policy.name]
+
+        return (policy.enforcement_level if policy.enforcement_level is not None
+                else self.__policy_pack_enforcement_level)
+
+    def _create_report_violation(self,
+                                 diagnostics: List[Any],
+                                 policy_name: str,
+                                 policy_description: str,
+                                 enforcement_level: EnforcementLevel) -> ReportViolation:
+        def report_violation(message: str, urn: Optional[str] = None) -> None:
+            if message and not isinstance(message, str):
+                raise TypeError("Expected message to be a string")
+            if urn is not None and not isinstance(urn, str):
+                raise TypeError("Expected urn to be a string")
+
+            violation_message = policy_description
+            if message:
+                violation_message += f"\n{message}"
+
+            diagnostics.append(proto.AnalyzeDiagnostic(
+                policyName=policy_name,
+                policyPackName=self.__policy_pack_name,
+                policyPackVersion=self.__policy_pack_version,
+                message=violation_message,
+                urn=urn if urn else "",
+                description=policy_description,
+                enforcementLevel=self._map_enforcement_level(enforcement_level),
+            ))
+        return report_violation
+
+    def _map_enforcement_level(self, enforcement_level: EnforcementLevel) -> int:
+        if enforcement_level == EnforcementLevel.ADVISORY:
+            return proto.ADVISORY
+        if enforcement_level == EnforcementLevel.MANDATORY:
+            return proto.MANDATORY
+        if enforcement_level == EnforcementLevel.DISABLED:
+            return proto.DISABLED
+        raise AssertionError(f"unknown enforcement level: {enforcement_level}")
+
+    def _convert_enforcement_level(self, enforcement_level: int) -> EnforcementLevel:
+        if enforcement_level == proto.ADVISORY:
+            return EnforcementLevel.ADVISORY
+        if enforcement_level == proto.MANDATORY:
+            return EnforcementLevel.MANDATORY
+        if enforcement_level == proto.DISABLED:
+            return EnforcementLevel.DISABLED
+        raise AssertionError(f"unknown enforcement level: {enforcement_level}")
+
+    def _get_resource_view(self, request, interner: Optional[Interner] = None) -> 'ResourceView':
+        """
+        Returns the converted properties, options, and provider of an `AnalyzeRequest` or of a
+        resource in an `AnalyzeStackRequest`, reusing an earlier conversion of the same resource if
+        it's in the conversion cache.
+        """
+        cache = self.__conversion_cache
+        if cache is None:
+            return self._convert_resource_view(request, interner)
+        key = ("resource", request.urn, fingerprint(request.properties, request.options, request.provider))
+        view = cache.get(key)
+        if view is None:
+            view = self._convert_resource_view(request, interner)
+            cache.put(key, view, estimate_size(view))
+            return self._copy_resource_view(view)
+        return self._copy_resource_view(view, interner)
+
+    def _convert_resource_view(self, request, interner: Optional[Interner] = None) -> 'ResourceView':
+        started = self._start_timer()
+        props, unknown_paths = self._get_properties(request.properties, interner)
+        self._record(STAGES, "properties", started, request.urn)
+        started = self._start_timer()
+        opts = self._get_resource_options(request)
+        self._record(STAGES, "options", started, request.urn)
+        started = self._start_timer()
+        provider = self._get_provider_resource(request, interner)
+        self._record(STAGES, "provider", started, request.urn)
+        return _PolicyAnalyzerServicer.ResourceView(props, opts, provider, unknown_paths)
+
+    def _copy_resource_view(self, view: 'ResourceView', interner: Optional[Interner] = None) -> 'ResourceView':
+        """
+        Returns a cached view with its own options and provider, so that a policy can't change them for
+        later requests. With an interner, the view's values, interned by the request that converted it
+        if at all, are also shared with the rest of the request's resources.
+        """
+        opts = copy.copy(view.opts)
+        opts.custom_timeouts = copy.copy(opts.custom_timeouts)
+        provider = self._copy_provider_resource(view.provider, interner) if view.provider is not None else None
+        props = intern_properties(view.props, interner) if interner is not None else view.props
+        return _PolicyAnalyzerServicer.ResourceView(props, opts, provider, view.unknown_paths)
+
+    @staticmethod
+    def _copy_provider_resource(provider: PolicyProviderResource,
+                                interner: Optional[Interner] = None) -> PolicyProviderResource:
+        if interner is None:
+            return copy.copy(provider)
+        return PolicyProviderResource(interner.string(provider.resource_type),
+                                      intern_properties(provider.props, interner),
+                                      interner.string(provider.urn), interner.string(provider.name))
+
+    def conversion_cache_stats(self) -> Optional[CacheStats]:
+        """
+        Returns the statistics of the cache of converted resources, or `None` if it's disabled.
+        """
+        return self.__conversion_cache.stats() if self.__conversion_cache is not None else None
+
+    def result_cache_stats(self) -> Optional[CacheStats]:
+        """
+        Returns the statistics of the cache of the violations reported by cacheable policies, or `None`
+        if no policy is cacheable.
+        """
+        return self.__result_cache.stats() if self.__result_cache is not None else None
+
+    def disk_cache_stats(self) -> Optional[CacheStats]:
+        """
+        Returns the statistics of the disk cache of the violations reported by cacheable policies, or
+        `None` if it's disabled.
+        """
+        return self.__disk_cache.stats() if self.__disk_cache is not None else None
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        Returns the timing histograms by stage, policy, validate function, and resource type, along with
+        the statistics of the caches and of interning, as a JSON-serializable dict. The timings are
+        `None` unless metrics are enabled.
+        """
+        def as_dict(stats: Optional[NamedTuple]) -> Optional[Dict[str, Any]]:
+            return stats._asdict() if stats is not None else None  # type: ignore
+
+        return {
+            "policy_pack": {"name": self.__policy_pack_name, "version": self.__policy_pack_version},
+            "timings": self.__metrics.snapshot() if self.__metrics is not None else None,
+            "caches": {
+                "conversion": as_dict(self.conversion_cache_stats()),
+                "result": as_dict(self.result_cache_stats()),
+                "disk": as_dict(self.disk_cache_stats()),
+            },
+            "intern": as_dict(self.intern_stats()),
+        }
+
+    def intern_stats(self) -> InternStats:
+        """
+        Returns the total counts of the strings and property subtrees interned while building the
+        resources of `AnalyzeStack` requests. All zeros unless interning is enabled.
+        """
+        return self.__intern_counters.total()
+
+    def _get_resource_table(self, request) -> ResourceTable:
+        """
+        Returns a table of the stack's resources. Only the types, names, URNs, and relationships are read
+        up front; each resource's properties, options, and provider are converted on first use, or before
+        an async stack validation starts.
+        """
+        # Resources in a stack often repeat the same types, property names, and values, so when interning
+        # is enabled, the equal values are shared across the request's resources. Otherwise, only types are.
+        interner = Interner() if self.__intern_properties else None
+        type_names: Dict[str, str] = {}
+        resources = request.resources
+        builder = ResourceTableBuilder()
+        for r in resources:
+            resource_type = (type_names.setdefault(r.type, r.type) if interner is None
+                             else interner.string(r.type))
+            property_dependencies = [(interner.string(k) if interner is not None else k, v.urns)
+                                     for k, v in r.propertyDependencies.items()]
+            builder.add(resource_type, r.name, r.urn, r.parent, r.dependencies, property_dependencies)
+
+        # The table converts different resources concurrently, but the interner isn't thread-safe.
+        intern_lock = threading.Lock()
+
+        def load(i: int) -> ResourceData:
+            if interner is None:
+                return ResourceData(*self._get_resource_view(resources[i]))
+            with intern_lock:
+                before = interner.stats()
+                view = self._get_resource_view(resources[i], interner)
+                self.__intern_counters.add(interner.stats() - before)
+            return ResourceData(*view)
+
+        return builder.build(load)
+
+    def _get_properties(self, properties: struct_pb2.Struct,
+                        interner: Optional[Interner] = None) -> Tuple[Mapping[str, Any], AbstractSet[Tuple[str, ...]]]:
+        """
+        Returns a read-only view of the properties, along with the paths to their unknown values.
+        """
+        if self.__lazy_properties:
+            return struct_view(properties), unknown_paths_view(properties)
+        props, unknown_paths = frozen_properties(properties)
+        if interner is not None:
+            props = interner.value(props)
+        # Known properties don't need to be checked when they're read, so only proxy the properties
+        # that have unknown values.
+        if unknown_paths:
+            return unknown_checking_proxy(props), unknown_paths
+        return props, unknown_paths
+
+    def _get_resource_options(self, request) -> PolicyResourceOptions:
+        opts = request.options
+        protect = opts.protect
+        # Copied out of the request, so that the options don't keep the request alive when they're cached,
+        # and into tuples, since the options are shared by every policy that validates the resource.
+        ignore_changes = tuple(opts.ignoreChanges)
+        delete_before_replace = None if not opts.deleteBeforeReplaceDefined else opts.deleteBeforeReplace
+        aliases = tuple(opts.aliases)
+        custom_timeouts = (PolicyCustomTimeouts(opts.customTimeouts.create, opts.customTimeouts.update,
+                                                opts.customTimeouts.delete) if opts.HasField("customTimeouts")
+                           else PolicyCustomTimeouts(0, 0, 0))
+        additional_secret_outputs = tuple(opts.additionalSecretOutputs)
+        return PolicyResourceOptions(
+            protect, ignore_changes, delete_before_replace, aliases, custom_timeouts, additional_secret_outputs)
+
+    def _get_provider_resource(self, request, interner: Optional[Interner] = None) -> Optional[PolicyProviderResource]:
+        if not request.HasField("provider"):
+            return None
+        prov = request.provider
+        # Many resources share a provider, so it's worth caching on its own.
+        cache = self.__conversion_cache
+        if cache is None:
+            return self._convert_provider_resource(prov, interner)
+        key = ("provider", prov.urn, fingerprint(prov.type, prov.name, prov.properties))
+        provider = cache.get(key)
+        if provider is None:
+            provider = self._convert_provider_resource(prov, interner)
+            cache.put(key, provider, estimate_size(provider))
+        elif interner is not None:
+            provider = self._copy_provider_resource(provider, interner)
+        return provider
+
+    def _convert_provider_resource(self, prov, interner: Optional[Interner] = None) -> PolicyProviderResource:
+        props, _ = self._get_properties(prov.properties, interner)
+        if interner is not None:
+            return PolicyProviderResource(interner.string(prov.type), props, interner.string(prov.urn),
+                                          interner.string(prov.name))
+        return PolicyProviderResource(prov.type, props, prov.urn, prov.name)
+
+    def _get_policy_config(self, name: str) -> Optional[Dict[str, Any]]:
+        if name in self.__policy_pack_config:
+            config = self.__policy_pack_config[name]
+            if config:
+                return config.copy()
+        return None
+
+
+class _AsyncPolicyAnalyzerServicer(_PolicyAnalyzerServicer):
+    """
+    An analyzer servicer for the asyncio-based `grpc.aio` server. `Analyze` and `AnalyzeStack` are
+    coroutines running on the server's event loop: async validations are awaited directly on that
+    loop, while converting the request and calling synchronous validations is offloaded to a bounded
+    thread pool so they don't block the loop.
+    """
+
+    __executor: futures.Executor
+    __owns_executor: bool
+
+    def __init__(self,
+                 name: str,
+                 version: str,
+                 policies: List[Policy],
+                 enforcement_level: EnforcementLevel,
+                 initial_config: Optional[Dict[str, Union['EnforcementLevel', Dict[str, Any]]]] = None,
+                 execution_mode: ExecutionMode = ExecutionMode.IN_PROCESS,
+                 pack_file: Optional[str] = None,
+                 executor: Optional[futures.Executor] = None) -> None:
+        """
+        :param Optional[futures.Executor] executor: The executor running the synchronous work. The caller
+               owns it and is responsible for shutting it down. When not specified, the servicer creates
+               (and owns) its own worker pool.
+        """
+        super().__init__(name, version, policies, enforcement_level, initial_config, execution_mode, pack_file)
+        self.__owns_executor = executor is None
+        self.__executor = executor if executor is not None else WorkerPool()
+
+    async def Analyze(self, request, context):  # pylint: disable=invalid-overridden-method
+        started = self._start_timer()
+        loop = asyncio.get_running_loop()
+        runs = await loop.run_in_executor(self.__executor, self._run_queued, started, self._profiled, "Analyze",
+                                          "prepare", self._get_analyze_runs, request)
+        response = await self._run_validations_async(runs)
+        self._record_analyze(request, started)
+        return response
+
+    async def AnalyzeStack(self, request, context):  # pylint: disable=invalid-overridden-method
+        started = self._start_timer()
+        loop = asyncio.get_running_loop()
+        runs = await loop.run_in_executor(self.__executor, self._run_queued, started, self._profiled, "AnalyzeStack",
+                                          "prepare", self._get_analyze_stack_runs, request)
+        response = await self._run_validations_async(runs)
+        self._record_analyze_stack(request, started)
+        return response
+
+    def close(self) -> None:
+        super().close()
+        if self.__owns_executor:
+            self.__executor.shutdown(wait=False)
+
+    async def _run_validations_async(self, runs: List[_PolicyAnalyzerServicer.ValidationRun]) -> Any:
+        await gather_all([self._run_validation_async(run) for run in runs])
+        return self._create_response(runs)
+
+    async def _run_validation_async(self, run: _PolicyAnalyzerServicer.ValidationRun) -> None:
+        if run.args is None:
+            return
+        # Process pool validations only need to be submitted, and async resource validations don't block,
+        # but async stack validations go through the executor, which converts the stack's resources.
+        if isinstance(run.args, _PolicyAnalyzerServicer.ProcessArgs) or (
+                isinstance(run.args, ResourceValidationArgs)
+                and run.policy._validate_is_async()):  # pylint: disable=protected-access
+            awaitable = self._invoke_validation(run)
+        else:
+            loop = asyncio.get_running_loop()
+            awaitable = await loop.run_in_executor(self.__executor, self._run_queued, self._start_timer(),
+                                                   self._invoke_validation, run)
+        if awaitable is not None:
+            await awaitable
@@ -0,0 +1,179 @@
+# Copyright 2016-2020, Pulumi Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Runtime settings for the policy analyzer, read from `PULUMI_POLICY_*` environment variables. These
+tune how a policy pack is served and don't change what its policies report.
+"""
+
+import os
+from typing import Optional, cast
+
+_TRUTHY = ("1", "true", "yes", "on")
+
+_DEFAULT_RESULT_CACHE_BYTES = 64 * 1024 * 1024
+_DEFAULT_DISK_CACHE_BYTES = 256 * 1024 * 1024
+
+
+def use_asyncio_server() -> bool:
+    """
+    Whether to serve the analyzer with the asyncio-based `grpc.aio` server instead of the default
+    thread pool server. Set `PULUMI_POLICY_ASYNCIO_SERVER=true` to opt in.
+    """
+    return _get_bool("PULUMI_POLICY_ASYNCIO_SERVER")
+
+
+def max_workers() -> Optional[int]:
+    """
+    The size of the analyzer's worker pool, set with `PULUMI_POLICY_MAX_WORKERS`. When not set, the
+    pool is sized based on the number of CPUs.
+    """
+    return _get_int("PULUMI_POLICY_MAX_WORKERS")
+
+
+def adaptive_workers() -> bool:
+    """
+    Whether the analyzer's worker pool grows and shrinks (up to its maximum size) based on whether more
+    threads complete validations faster. Set `PULUMI_POLICY_ADAPTIVE_WORKERS=true` to opt in.
+    """
+    return _get_bool("PULUMI_POLICY_ADAPTIVE_WORKERS")
+
+
+def max_processes() -> Optional[int]:
+    """
+    The number of worker processes running `ExecutionMode.PROCESS_POOL` policies, set with
+    `PULUMI_POLICY_MAX_PROCESSES`. When not set, there is one worker process per CPU.
+    """
+    return _get_int("PULUMI_POLICY_MAX_PROCESSES")
+
+
+def lazy_properties() -> bool:
+    """
+    Whether resource properties are read directly from the gRPC request, converting each value only
+    when a policy reads it, instead of converting all of the properties up front. Set
+    `PULUMI_POLICY_LAZY_PROPERTIES=true` to opt in.
+    """
+    return _get_bool("PULUMI_POLICY_LAZY_PROPERTIES")
+
+
+def intern_properties() -> bool:
+    """
+    Whether equal strings and read-only property subtrees are shared across the resources of an
+    `AnalyzeStack` request, so that data repeated on many resources is only held once. Has no effect
+    with `lazy_properties`. Set `PULUMI_POLICY_INTERN_PROPERTIES=true` to opt in.
+    """
+    return _get_bool("PULUMI_POLICY_INTERN_PROPERTIES")
+
+
+def conversion_cache_bytes() -> Optional[int]:
+    """
+    The limit, in bytes, on the estimated size of the converted resources the analyzer keeps to reuse
+    across `Analyze` and `AnalyzeStack` calls for resources that haven't changed, set with
+    `PULUMI_POLICY_CONVERSION_CACHE_BYTES`. When not set, converted resources aren't cached. Has no
+    effect with `lazy_properties`.
+    """
+    return _get_int("PULUMI_POLICY_CONVERSION_CACHE_BYTES")
+
+
+def result_cache_bytes() -> int:
+    """
+    The limit, in bytes, on the estimated size of the violations of cacheable policies that the
+    analyzer keeps to replay for resources that haven't changed, set with
+    `PULUMI_POLICY_RESULT_CACHE_BYTES`. Defaults to 64 MiB.
+    """
+    return cast(int, _get_int("PULUMI_POLICY_RESULT_CACHE_BYTES", _DEFAULT_RESULT_CACHE_BYTES))
+
+
+def disk_cache_path() -> Optional[str]:
+    """
+    The path of a SQLite database that keeps the violations of cacheable policies across runs of the
+    policy pack, set with `PULUMI_POLICY_DISK_CACHE_PATH`. Plugin processes using the same path share
+    the cache. When not set, or when `PULUMI_POLICY_DISABLE_DISK_CACHE=true`, results are only cached
+    in memory.
+    """
+    if _get_bool("PULUMI_POLICY_DISABLE_DISK_CACHE"):
+        return None
+    return os.environ.get("PULUMI_POLICY_DISK_CACHE_PATH") or None
+
+
+def disk_cache_bytes() -> int:
+    """
+    The limit, in bytes, on the size of the violations kept in the disk cache, set with
+    `PULUMI_POLICY_DISK_CACHE_BYTES`. Defaults to 256 MiB.
+    """
+    return cast(int, _get_int("PULUMI_POLICY_DISK_CACHE_BYTES", _DEFAULT_DISK_CACHE_BYTES))
+
+
+def metrics_path() -> Optional[str]:
+    """
+    The path of a JSON file that the analyzer writes timing histograms for each stage, policy, and
+    resource type to, along with cache and worker pool statistics, set with
+    `PULUMI_POLICY_METRICS_PATH`. The file is written at shutdown, and whenever the plugin receives
+    `SIGUSR1`. When not set, nothing is timed.
+    """
+    return os.environ.get("PULUMI_POLICY_METRICS_PATH") or None
+
+
+def trace_path() -> Optional[str]:
+    """
+    The path of a file that the analyzer writes spans for each RPC, policy, and stage to, in the Chrome
+    trace event format, set with `PULUMI_POLICY_TRACE_PATH`. The trace can be opened in a trace viewer
+    such as Perfetto. When not set, nothing is traced.
+    """
+    return os.environ.get("PULUMI_POLICY_TRACE_PATH") or None
+
+
+def profile_dir() -> Optional[str]:
+    """
+    The directory that the analyzer writes profiles of its RPCs to, each attributed to the policy or
+    stage that was running, set with `PULUMI_POLICY_PROFILE_DIR`. When not set, nothing is profiled.
+    """
+    return os.environ.get("PULUMI_POLICY_PROFILE_DIR") or None
+
+
+def profile_mode() -> str:
+    """
+    How RPCs are profiled, set with `PULUMI_POLICY_PROFILE_MODE`: `cprofile`, the default, to write a
+    `cProfile` file per policy call, or `sample`, to sample stacks and write them as collapsed stacks
+    for flame graphs.
+    """
+    return (os.environ.get("PULUMI_POLICY_PROFILE_MODE") or "cprofile").strip().lower()
+
+
+def profile_every() -> int:
+    """
+    Profiles one in every `PULUMI_POLICY_PROFILE_EVERY` policy calls and RPCs, to reduce the overhead
+    of profiling large stacks. Defaults to 1, profiling everything.
+    """
+    return cast(int, _get_int("PULUMI_POLICY_PROFILE_EVERY", 1))
+
+
+def _get_bool(name: str, default: bool = False) -> bool:
+    value = os.environ.get(name)
+    if not value:
+        return default
+    return value.strip().lower() in _TRUTHY
+
+
+def _get_int(name: str, default: Optional[int] = None) -> Optional[int]:
+    value = os.environ.get(name)
+    if not value:
+        return default
+    try:
+        result = int(value)
+    except ValueError as e:
+        raise ValueError(f"Expected {name} to be an integer, got '{value}'") from e
+    if result <= 0:
+        raise ValueError(f"Expected {name} to be greater than 0, got '{value}'")
+    return result
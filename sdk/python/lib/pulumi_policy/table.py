@@ -0,0 +1,399 @@
+# Copyright 2016-2020, Pulumi Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from array import array
+from collections.abc import Sequence as SequenceABC
+import threading
+from typing import (AbstractSet, Any, Callable, Dict, Iterable, Iterator, List, Mapping, NamedTuple, Optional, Sequence,
+                    Tuple, Union, overload)
+
+from .policy import PolicyProviderResource, PolicyResource, PolicyResourceOptions
+
+# The typecode of the arrays of resource ids: signed, so that -1 can stand for "no resource".
+_ID_TYPECODE = "q"
+
+
+class ResourceData(NamedTuple):
+    """
+    The parts of a resource that are only converted when a `PolicyResource` is materialized.
+    """
+
+    props: Mapping[str, Any]
+    opts: PolicyResourceOptions
+    provider: Optional[PolicyProviderResource]
+    unknown_paths: AbstractSet[Tuple[str, ...]]
+
+
+class ResourceTable:
+    """
+    ResourceTable is a compact, column-oriented representation of the resources in a stack. Each
+    resource has an integer id, its position in the stack. Types, names, and URNs are kept in
+    columns, parents in an array of ids (-1 for no parent), and dependencies and property
+    dependencies in CSR form: the dependencies of resource `i` are `dependency_ids[dependency_offsets[i]:
+    dependency_offsets[i + 1]]`. Walking the stack through the table doesn't create any objects per
+    resource.
+
+    `PolicyResource`s are only created, along with their converted properties, when they're asked for
+    with `resource` or `resources`, and each is created at most once. A resource's parent and
+    dependencies are in turn only created when they're read.
+    """
+
+    __slots__ = ("types", "names", "urns", "parents", "dependency_offsets", "dependency_ids",
+                 "property_dependency_offsets", "property_dependency_names", "property_dependency_ids",
+                 "__ids", "__load", "__resources", "__sequence", "__lock", "__loading")
+
+    types: Sequence[str]
+    """
+    The type of each resource.
+    """
+
+    names: Sequence[str]
+    """
+    The name of each resource.
+    """
+
+    urns: Sequence[str]
+    """
+    The URN of each resource.
+    """
+
+    parents: array
+    """
+    The id of each resource's parent, or -1 if it has none.
+    """
+
+    dependency_offsets: array
+    """
+    The start of each resource's dependencies in `dependency_ids`, with one more entry for the end of
+    the last resource's dependencies.
+    """
+
+    dependency_ids: array
+    """
+    The ids of every resource's dependencies, one resource after the other.
+    """
+
+    property_dependency_offsets: array
+    """
+    The start of each resource's property dependencies in `property_dependency_names` and
+    `property_dependency_ids`, with one more entry for the end of the last resource's.
+    """
+
+    property_dependency_names: Sequence[str]
+    """
+    The name of the property for each property dependency.
+    """
+
+    property_dependency_ids: array
+    """
+    The id of the resource for each property dependency.
+    """
+
+    def __init__(self,
+                 types: Sequence[str],
+                 names: Sequence[str],
+                 urns: Sequence[str],
+                 parents: array,
+                 dependency_offsets: array,
+                 dependency_ids: array,
+                 property_dependency_offsets: array,
+                 property_dependency_names: Sequence[str],
+                 property_dependency_ids: array,
+                 load: Callable[[int], ResourceData],
+                 resources: Optional[Sequence[PolicyResource]] = None) -> None:
+        """
+        :param Callable[[int], ResourceData] load: Converts the properties, options, and provider of the
+               resource with the given id. Called at most once per resource, and possibly for
+               different resources at the same time.
+        :param Optional[Sequence[PolicyResource]] resources: The resources, if they've already been
+               created. `load` is never called when they're given.
+        """
+        self.types = types
+        self.names = names
+        self.urns = urns
+        self.parents = parents
+        self.dependency_offsets = dependency_offsets
+        self.dependency_ids = dependency_ids
+        self.property_dependency_offsets = property_dependency_offsets
+        self.property_dependency_names = property_dependency_names
+        self.property_dependency_ids = property_dependency_ids
+        self.__ids: Optional[Dict[str, int]] = None
+        self.__load = load
+        self.__resources: List[Optional[PolicyResource]] = (list(resources) if resources is not None
+                                                              else [None] * len(urns))
+        self.__sequence = _ResourceSequence(self)
+        # Validations may run concurrently, and each resource must only be materialized once. Each
+        # resource being materialized has its own lock, so that materializing one resource doesn't
+        # hold up validations that need a different one; the table's lock only guards those locks.
+        self.__lock = threading.Lock()
+        self.__loading: Dict[int, threading.Lock] = {}
+
+    def __len__(self) -> int:
+        return len(self.urns)
+
+    def id(self, urn: str) -> Optional[int]:
+        """
+        Returns the id of the resource with the given URN, or `None` if there is no such resource.
+        """
+        if self.__ids is None:
+            self.__ids = {urn: i for i, urn in enumerate(self.urns)}
+        return self.__ids.get(urn)
+
+    def parent(self, i: int) -> Optional[int]:
+        """
+        Returns the id of the parent of resource `i`, or `None` if it has no parent in the stack.
+        """
+        parent = self.parents[i]
+        return parent if parent >= 0 else None
+
+    def dependencies(self, i: int) -> Sequence[int]:
+        """
+        Returns the ids of the dependencies of resource `i`, without copying them.
+        """
+        return memoryview(self.dependency_ids)[self.dependency_offsets[i]:self.dependency_offsets[i + 1]]
+
+    def property_dependencies(self, i: int) -> Dict[str, List[int]]:
+        """
+        Returns the ids of the resources each property of resource `i` depends on.
+        """
+        result: Dict[str, List[int]] = {}
+        for j in range(self.property_dependency_offsets[i], self.property_dependency_offsets[i + 1]):
+            deps = result.setdefault(self.property_dependency_names[j], [])
+            if self.property_dependency_ids[j] >= 0:
+                deps.append(self.property_dependency_ids[j])
+        return result
+
+    def resource(self, i: int) -> PolicyResource:
+        """
+        Returns the `PolicyResource` for resource `i`, creating it on first use.
+        """
+        resource = self.__resources[i]
+        if resource is not None:
+            return resource
+        with self.__lock:
+            loading = self.__loading.get(i)
+            if loading is None:
+                loading = self.__loading[i] = threading.Lock()
+        try:
+            with loading:
+                resource = self.__resources[i]
+                if resource is None:
+                    resource = _TableResource(self, i, self.__load(i))
+                    self.__resources[i] = resource
+        finally:
+            with self.__lock:
+                if self.__loading.get(i) is loading:
+                    del self.__loading[i]
+        return resource
+
+    def load_all(self) -> None:
+        """
+        Creates the `PolicyResource` of every resource that hasn't been created yet, e.g. so that an
+        async validation reading the resources on an event loop doesn't convert them there.
+        """
+        for i in range(len(self.urns)):
+            self.resource(i)
+
+    @property
+    def resources(self) -> Sequence[PolicyResource]:
+        """
+        The `PolicyResource`s in the stack, in stack order, each created when it's first read.
+        """
+        return self.__sequence
+
+
+class _ResourceSequence(SequenceABC):
+    __slots__ = ("__table",)
+
+    def __init__(self, table: ResourceTable) -> None:
+        self.__table = table
+
+    def __len__(self) -> int:
+        return len(self.__table)
+
+    @overload
+    def __getitem__(self, index: int) -> PolicyResource:
+        ...
+
+    @overload
+    def __getitem__(self, index: slice) -> Sequence[PolicyResource]:
+        ...
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[PolicyResource, Sequence[PolicyResource]]:
+        if isinstance(index, slice):
+            return tuple(self.__table.resource(i) for i in range(*index.indices(len(self.__table))))
+        if index < 0:
+            index += len(self.__table)
+        if not 0 <= index < len(self.__table):
+            raise IndexError("resource index out of range")
+        return self.__table.resource(index)
+
+    def __iter__(self) -> Iterator[PolicyResource]:
+        table = self.__table
+        for i in range(len(table)):
+            yield table.resource(i)
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({len(self.__table)} resources)"
+
+
+# The slots PolicyResource keeps the relationships in. _TableResource hides them behind properties,
+# and uses them to cache the resources once they're read, calling the slot descriptors directly.
+# pylint: disable=unnecessary-dunder-call
+_PARENT = PolicyResource.__dict__["parent"]
+_DEPENDENCIES = PolicyResource.__dict__["dependencies"]
+_PROPERTY_DEPENDENCIES = PolicyResource.__dict__["property_dependencies"]
+
+
+class _TableResource(PolicyResource):
+    """
+    A `PolicyResource` backed by a `ResourceTable`, whose parent and dependencies are looked up in the
+    table the first time they're read.
+    """
+
+    __slots__ = ("__table", "__id")
+
+    def __init__(self, table: ResourceTable, i: int, data: ResourceData) -> None:  # pylint: disable=super-init-not-called
+        self.__table = table
+        self.__id = i
+        self.resource_type = table.types[i]
+        self.props = data.props
+        self.urn = table.urns[i]
+        self.name = table.names[i]
+        self.opts = data.opts
+        self.provider = data.provider
+        self.unknown_paths = data.unknown_paths
+
+    @property  # type: ignore[override]
+    def parent(self) -> Optional[PolicyResource]:
+        try:
+            return _PARENT.__get__(self)
+        except AttributeError:
+            parent = self.__table.parent(self.__id)
+            resource = self.__table.resource(parent) if parent is not None else None
+            _PARENT.__set__(self, resource)
+            return resource
+
+    @parent.setter
+    def parent(self, value: Optional[PolicyResource]) -> None:
+        _PARENT.__set__(self, value)
+
+    @property  # type: ignore[override]
+    def dependencies(self) -> List[PolicyResource]:
+        try:
+            return _DEPENDENCIES.__get__(self)
+        except AttributeError:
+            resources = [self.__table.resource(d) for d in self.__table.dependencies(self.__id)]
+            _DEPENDENCIES.__set__(self, resources)
+            return resources
+
+    @dependencies.setter
+    def dependencies(self, value: List[PolicyResource]) -> None:
+        _DEPENDENCIES.__set__(self, value)
+
+    @property  # type: ignore[override]
+    def property_dependencies(self) -> Dict[str, List[PolicyResource]]:
+        try:
+            return _PROPERTY_DEPENDENCIES.__get__(self)
+        except AttributeError:
+            resources = {k: [self.__table.resource(d) for d in v]
+                         for k, v in self.__table.property_dependencies(self.__id).items()}
+            _PROPERTY_DEPENDENCIES.__set__(self, resources)
+            return resources
+
+    @property_dependencies.setter
+    def property_dependencies(self, value: Dict[str, List[PolicyResource]]) -> None:
+        _PROPERTY_DEPENDENCIES.__set__(self, value)
+
+# pylint: enable=unnecessary-dunder-call
+
+
+def new_id_array() -> array:
+    """
+    Returns an empty array of resource ids.
+    """
+    return array(_ID_TYPECODE)
+
+
+class ResourceTableBuilder:
+    """
+    Builds the columns of a `ResourceTable` from the stack's resources, one resource at a time, in
+    stack order. Parents and dependencies are given by URN; those that aren't in the stack are left
+    out. When URNs repeat, the last resource with the URN wins.
+    """
+
+    def __init__(self) -> None:
+        self.__types: List[str] = []
+        self.__names: List[str] = []
+        self.__urns: List[str] = []
+        self.__relationships: List[Tuple[Optional[str], Iterable[str], Iterable[Tuple[str, Iterable[str]]]]] = []
+
+    def add(self,
+            resource_type: str,
+            name: str,
+            urn: str,
+            parent: Optional[str],
+            dependencies: Iterable[str],
+            property_dependencies: Iterable[Tuple[str, Iterable[str]]]) -> None:
+        """
+        Adds a resource, with the URNs of its parent, dependencies, and property dependencies.
+        """
+        self.__types.append(resource_type)
+        self.__names.append(name)
+        self.__urns.append(urn)
+        self.__relationships.append((parent, dependencies, property_dependencies))
+
+    def build(self,
+              load: Callable[[int], ResourceData],
+              resources: Optional[Sequence[PolicyResource]] = None) -> ResourceTable:
+        """
+        Returns the table of the resources added so far. See `ResourceTable` for `load` and `resources`.
+        """
+        ids = {urn: i for i, urn in enumerate(self.__urns)}
+        parents = new_id_array()
+        dependency_offsets, dependency_ids = new_id_array(), new_id_array()
+        property_dependency_offsets, property_dependency_ids = new_id_array(), new_id_array()
+        property_dependency_names: List[str] = []
+        for parent, dependencies, property_dependencies in self.__relationships:
+            parents.append(ids.get(parent, -1) if parent is not None else -1)
+            dependency_offsets.append(len(dependency_ids))
+            dependency_ids.extend(ids[d] for d in dependencies if d in ids)
+            property_dependency_offsets.append(len(property_dependency_ids))
+            for prop, deps in property_dependencies:
+                prop_ids = [ids[d] for d in deps if d in ids]
+                # A property with no dependencies in the stack is kept, with a placeholder id.
+                for d in prop_ids or [-1]:
+                    property_dependency_names.append(prop)
+                    property_dependency_ids.append(d)
+        dependency_offsets.append(len(dependency_ids))
+        property_dependency_offsets.append(len(property_dependency_ids))
+        return ResourceTable(self.__types, self.__names, self.__urns, parents, dependency_offsets, dependency_ids,
+                             property_dependency_offsets, property_dependency_names, property_dependency_ids,
+                             load, resources)
+
+
+def table_from_resources(resources: Sequence[PolicyResource]) -> ResourceTable:
+    """
+    Returns a table of the given resources, which it hands out as is rather than creating new ones.
+    """
+    builder = ResourceTableBuilder()
+    for r in resources:
+        builder.add(r.resource_type, r.name, r.urn, r.parent.urn if r.parent is not None else None,
+                    [d.urn for d in r.dependencies],
+                    [(k, [d.urn for d in v]) for k, v in r.property_dependencies.items()])
+
+    def load(i: int) -> ResourceData:
+        raise AssertionError(f"resource {i} should already exist")
+
+    return builder.build(load, resources)
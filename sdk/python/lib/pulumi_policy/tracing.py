@@ -0,0 +1,127 @@
+# Copyright 2016-2020, Pulumi Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Tracing for the analyzer, written to a local file in the Chrome trace event format, which trace
+viewers such as Perfetto and `chrome://tracing` can open directly.
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+from typing import Any, Dict, List, Optional, Set
+
+# The number of spans buffered for the writer thread. Once the buffer is full, spans are dropped
+# rather than blocking the analyzer.
+_MAX_BUFFERED_EVENTS = 100_000
+
+
+class Tracer:
+    """
+    Writes spans to a file as a JSON array of Chrome trace events. Recording a span only adds it to a
+    buffer; a background thread serializes the buffered spans and writes them to the file in batches.
+    The file is a complete JSON array once the tracer is closed, and trace viewers also accept the
+    unterminated array of a process that didn't shut down cleanly.
+    """
+
+    def __init__(self, path: str, max_buffered_events: int = _MAX_BUFFERED_EVENTS) -> None:
+        """
+        :param str path: The path of the trace file, which is overwritten.
+        :param int max_buffered_events: The number of spans buffered for the writer thread, beyond
+               which spans are dropped.
+        """
+        if not path or not isinstance(path, str):
+            raise TypeError("Expected path to be a non-empty string")
+        self.__file = open(path, "w", encoding="utf-8")  # pylint: disable=consider-using-with
+        self.__pid = os.getpid()
+        self.__queue: 'queue.Queue[Optional[Dict[str, Any]]]' = queue.Queue(max_buffered_events)
+        self.__threads: Set[int] = set()
+        self.__closed = False
+        self.__dropped = 0
+        self.__lock = threading.Lock()
+        self.__writer = threading.Thread(target=self.__write, name="pulumi-policy-tracer", daemon=True)
+        self.__writer.start()
+
+    def span(self, name: str, category: str, started: float, ended: float,
+             args: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Records a span on the current thread. The times are in seconds, from `time.perf_counter`.
+        """
+        if self.__closed:
+            return
+        tid = threading.get_ident()
+        if tid not in self.__threads:
+            self.__threads.add(tid)
+            self.__put({"name": "thread_name", "ph": "M", "pid": self.__pid, "tid": tid,
+                        "args": {"name": threading.current_thread().name}})
+        event = {"name": name, "cat": category, "ph": "X", "pid": self.__pid, "tid": tid,
+                 "ts": started * 1_000_000, "dur": (ended - started) * 1_000_000}
+        if args:
+            event["args"] = args
+        self.__put(event)
+
+    def dropped(self) -> int:
+        """
+        Returns the number of spans dropped because the buffer was full.
+        """
+        with self.__lock:
+            return self.__dropped
+
+    def close(self) -> None:
+        """
+        Writes the buffered spans and closes the file. Spans recorded after the tracer is closed are
+        ignored.
+        """
+        if self.__closed:
+            return
+        self.__closed = True
+        self.__queue.put(None)
+        self.__writer.join()
+
+    def __put(self, event: Dict[str, Any]) -> None:
+        try:
+            self.__queue.put_nowait(event)
+        except queue.Full:
+            with self.__lock:
+                self.__dropped += 1
+
+    def __write(self) -> None:
+        self.__file.write("[")
+        separator = "\n"
+        done = False
+        while not done:
+            batch: List[Optional[Dict[str, Any]]] = [self.__queue.get()]
+            while True:
+                try:
+                    batch.append(self.__queue.get_nowait())
+                except queue.Empty:
+                    break
+            for event in batch:
+                if event is None:
+                    done = True
+                    continue
+                self.__file.write(separator)
+                self.__file.write(json.dumps(event, separators=(",", ":")))
+                separator = ",\n"
+            self.__file.flush()
+        dropped = self.dropped()
+        if dropped:
+            self.__file.write(separator)
+            self.__file.write(json.dumps({"name": "dropped_spans", "ph": "i", "s": "g", "pid": self.__pid,
+                                          "tid": 0, "ts": time.perf_counter() * 1_000_000,
+                                          "args": {"count": dropped}}))
+        self.__file.write("\n]\n")
+        self.__file.close()
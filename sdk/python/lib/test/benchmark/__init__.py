@@ -0,0 +1,20 @@
+# Copyright 2016-2020, Pulumi Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Benchmarks for the Pulumi Policy SDK. These are not run as part of the unit tests; run an individual
+benchmark from the `lib` directory, e.g. `python -m test.benchmark.bench_analyze`, or the micro-benchmark
+suite, with JSON output and comparison against a baseline, with `python -m test.benchmark` (or
+`make bench` from `sdk/python`).
+"""
@@ -0,0 +1,133 @@
+# Copyright 2016-2020, Pulumi Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Runs the micro-benchmark suite and optionally compares it against a baseline, exiting with a non-zero
+status if any case is significantly slower than in the baseline. A baseline measured with a different
+Python or on a different machine isn't comparable, so it's skipped with a warning.
+
+Run from the `lib` directory:
+
+    python -m test.benchmark --output baseline.json
+    python -m test.benchmark --baseline baseline.json --threshold 0.25
+"""
+
+import argparse
+import json
+import platform
+import sys
+from typing import Any, Dict, List, Optional
+
+from .suite import cases
+from .util import measure
+
+# The version of the results format, so that incompatible baselines are rejected rather than misread.
+_SCHEMA_VERSION = 1
+
+# The environment the results were measured in. Timings from different environments aren't comparable.
+_ENVIRONMENT_KEYS = ("python", "implementation", "machine")
+
+
+def run(name_filter: Optional[str], repeat: int, min_time: float) -> Dict[str, Any]:
+    """
+    Runs every case whose name contains `name_filter`, printing each result as it completes, and
+    returns the results in the JSON output format.
+    """
+    results: Dict[str, Dict[str, Any]] = {}
+    for case in cases():
+        if name_filter and name_filter not in case.name:
+            continue
+        seconds, number = measure(case.setup(), repeat, min_time)
+        results[case.name] = {"seconds": seconds, "number": number, "repeat": repeat}
+        print(f"{case.name:<40} {seconds * 1e6:>14.2f} us", flush=True)
+    return {
+        "schema": _SCHEMA_VERSION,
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "results": results,
+    }
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float,
+            ignore_environment: bool = False) -> List[str]:
+    """
+    Prints how each case compares to the baseline, and returns the names of the cases that are slower
+    than the baseline by more than `threshold`, as a fraction of the baseline's time. If the baseline
+    was measured with a different Python or on a different machine, the comparison is skipped with a
+    warning, unless `ignore_environment` is set, in which case no case is reported as a regression.
+    """
+    if baseline.get("schema") != _SCHEMA_VERSION:
+        raise ValueError(f"Expected a baseline with schema {_SCHEMA_VERSION}, got {baseline.get('schema')}")
+    differences = [f"{key} {baseline.get(key)} != {results.get(key)}" for key in _ENVIRONMENT_KEYS
+                   if baseline.get(key) != results.get(key)]
+    if differences:
+        print(f"\nwarning: the baseline was measured in a different environment ({', '.join(differences)})",
+              file=sys.stderr)
+        if not ignore_environment:
+            print("warning: skipping the comparison; pass --ignore-environment to compare anyway",
+                  file=sys.stderr)
+            return []
+    regressions: List[str] = []
+    print()
+    print(f"{'case':<40} {'baseline us':>14} {'current us':>14} {'change':>8}")
+    for name, result in results["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            print(f"{name:<40} {'-':>14} {result['seconds'] * 1e6:>14.2f} {'new':>8}")
+            continue
+        change = result["seconds"] / base["seconds"] - 1
+        marker = ""
+        if change > threshold and not differences:
+            regressions.append(name)
+            marker = "  REGRESSION"
+        print(f"{name:<40} {base['seconds'] * 1e6:>14.2f} {result['seconds'] * 1e6:>14.2f} "
+              f"{change:>+7.0%}{marker}")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m test.benchmark", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filter", help="only run the cases whose names contain this string")
+    parser.add_argument("--repeat", type=int, default=5, help="the number of timed runs of each case (default: 5)")
+    parser.add_argument("--min-time", type=float, default=0.05,
+                        help="the minimum duration of a timed run, in seconds (default: 0.05)")
+    parser.add_argument("--output", help="write the results to this file as JSON")
+    parser.add_argument("--baseline", help="compare the results to those in this JSON file")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="fail if a case is slower than the baseline by more than this fraction (default: 0.25)")
+    parser.add_argument("--ignore-environment", action="store_true",
+                        help="show the comparison even if the baseline is from a different Python or machine, "
+                             "without failing on regressions")
+    args = parser.parse_args(argv)
+
+    results = run(args.filter, args.repeat, args.min_time)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+            f.write("\n")
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold, args.ignore_environment)
+        if regressions:
+            print(f"\n{len(regressions)} case(s) regressed by more than {args.threshold:.0%}: "
+                  f"{', '.join(regressions)}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,47 @@
+# Copyright 2016-2020, Pulumi Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Measures `Analyze` latency as the number of resource policies in the pack grows. Since the resource
+view is built once per request, latency should stay close to flat: each extra policy only costs
+the policy call itself, not another conversion of the resource's properties.
+
+Run from the `lib` directory: `python -m test.benchmark.bench_analyze`.
+"""
+
+from pulumi_policy import ResourceValidationPolicy
+
+from .util import best_of, make_analyze_request, make_properties, make_servicer
+
+
+POLICY_COUNTS = [1, 10, 40, 80]
+
+
+def _validate(args, report_violation):
+    if args.props["name"] != "value-1":
+        report_violation("unexpected name")
+
+
+def main() -> None:
+    request = make_analyze_request(make_properties(width=4, depth=4))
+    print(f"{'policies':>10} {'ms/Analyze':>12} {'us/policy':>12}")
+    for count in POLICY_COUNTS:
+        policies = [ResourceValidationPolicy(f"policy-{i}", "benchmark policy", _validate) for i in range(count)]
+        servicer = make_servicer(policies)
+        seconds = best_of(lambda: servicer.Analyze(request, None))  # pylint: disable=cell-var-from-loop
+        print(f"{count:>10} {seconds * 1e3:>12.3f} {seconds * 1e6 / count:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
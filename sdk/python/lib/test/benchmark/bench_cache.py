@@ -0,0 +1,71 @@
+# Copyright 2016-2020, Pulumi Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Measures a preview followed by an update, as the engine runs them against one plugin: each calls
+`Analyze` for every resource and then `AnalyzeStack` with all of them. With
+`PULUMI_POLICY_CONVERSION_CACHE_BYTES`, every resource is converted once rather than four times.
+
+Run from the `lib` directory: `python -m test.benchmark.bench_cache`.
+"""
+
+import os
+import time
+from unittest import mock
+
+from pulumi.runtime import proto
+
+from pulumi_policy import ResourceValidationPolicy, StackValidationPolicy
+
+from .util import make_properties, make_servicer, make_struct
+
+
+def _touch_props(args, report_violation):
+    _ = args.props["name"]
+
+
+def _touch_stack(args, report_violation):
+    for r in args.resources:
+        _ = r.props["name"]
+
+
+def main() -> None:
+    props = make_struct(make_properties(3, 3))
+    print(f"{'resources':>10} {'cache':>6} {'ms/run':>8} {'hits':>7} {'misses':>7} {'MB':>6}")
+    for count in (100, 1000):
+        resources = [proto.AnalyzerResource(type="bench:index:Resource", properties=props, name=f"res-{i}",
+                                            urn=f"urn:pulumi:stack::project::bench:index:Resource::res-{i}",
+                                            options=proto.AnalyzerResourceOptions())
+                     for i in range(count)]
+        requests = [proto.AnalyzeRequest(type=r.type, properties=r.properties, urn=r.urn, name=r.name,
+                                         options=r.options) for r in resources]
+        stack_request = proto.AnalyzeStackRequest(resources=resources)
+        for cache in ("", "1000000000"):
+            with mock.patch.dict(os.environ, {"PULUMI_POLICY_CONVERSION_CACHE_BYTES": cache}):
+                servicer = make_servicer([ResourceValidationPolicy("props", "props", _touch_props),
+                                          StackValidationPolicy("stack", "stack", _touch_stack)])
+            start = time.perf_counter()
+            for _ in range(2):
+                for request in requests:
+                    servicer.Analyze(request, None)
+                servicer.AnalyzeStack(stack_request, None)
+            elapsed = time.perf_counter() - start
+            stats = servicer.conversion_cache_stats()
+            hits, misses, size = (stats.hits, stats.misses, stats.size_bytes / 1e6) if stats else (0, 0, 0.0)
+            servicer.close()
+            print(f"{count:>10} {'on' if cache else 'off':>6} {elapsed * 1e3:>8.1f} {hits:>7} {misses:>7} {size:>6.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+# Copyright 2016-2020, Pulumi Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Compares converting a resource's properties with `json_format.MessageToDict` followed by
+`deserialize_properties` (two walks) against `deserialize_struct` (one walk of the `Struct`), and
+reading two values through the unknown-checking proxy over the converted properties against reading
+them through a lazy `struct_view` of the `Struct`.
+
+Run from the `lib` directory: `python -m test.benchmark.bench_deserialize`.
+"""
+
+from google.protobuf import json_format
+
+from pulumi_policy.deserialize import deserialize_properties, deserialize_struct
+from pulumi_policy.proxy import struct_view, unknown_checking_proxy
+
+from .util import best_of, make_properties, make_struct
+
+
+SHAPES = [(2, 2), (4, 4), (8, 4), (4, 7)]
+
+
+def main() -> None:
+    print(f"{'shape':>8} {'two-pass ms':>12} {'one-pass ms':>12} {'speedup':>8}")
+    for width, depth in SHAPES:
+        struct = make_struct(make_properties(width, depth))
+        # pylint: disable=cell-var-from-loop
+        two_pass = best_of(lambda: deserialize_properties(json_format.MessageToDict(struct)))
+        one_pass = best_of(lambda: deserialize_struct(struct))
+        shape = f"{width}x{depth}"
+        print(f"{shape:>8} {two_pass * 1e3:>12.3f} {one_pass * 1e3:>12.3f} {two_pass / one_pass:>7.1f}x")
+
+    print()
+    print(f"{'shape':>8} {'eager ms':>12} {'view ms':>12} {'speedup':>8}")
+    for width, depth in SHAPES:
+        struct = make_struct(make_properties(width, depth))
+        # pylint: disable=cell-var-from-loop
+        eager = best_of(lambda: _read_two(unknown_checking_proxy(deserialize_struct(struct))))
+        view = best_of(lambda: _read_two(struct_view(struct)))
+        shape = f"{width}x{depth}"
+        print(f"{shape:>8} {eager * 1e3:>12.3f} {view * 1e3:>12.3f} {eager / view:>7.1f}x")
+
+
+def _read_two(props) -> None:
+    _ = props["name"], props["child0"]["tags"][0]
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+# Copyright 2016-2020, Pulumi Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Compares the cost of running an async validation under three event loop models, from several
+gRPC-like worker threads at once:
+
+- `new-loop-per-call`: a new event loop is created and closed for every awaitable (the old behavior).
+- `loop-per-thread`: each worker thread keeps its own persistent event loop.
+- `dedicated-loop-thread`: workers submit to one long-lived loop thread (`EventLoopThread`).
+
+Run from the `lib` directory: `python -m test.benchmark.bench_event_loop`.
+"""
+
+import asyncio
+from concurrent import futures
+import threading
+import time
+from typing import Callable, Dict
+
+from pulumi_policy.loop import EventLoopThread
+
+
+CALLS = 2000
+WORKERS = 4
+
+
+async def _validation() -> None:
+    await asyncio.sleep(0)
+
+
+def _new_loop_per_call() -> None:
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(_validation())
+    loop.close()
+
+
+_local = threading.local()
+
+
+def _loop_per_thread() -> None:
+    loop = getattr(_local, "loop", None)
+    if loop is None:
+        loop = _local.loop = asyncio.new_event_loop()
+    loop.run_until_complete(_validation())
+
+
+def _measure(call: Callable[[], None]) -> float:
+    with futures.ThreadPoolExecutor(max_workers=WORKERS) as executor:
+        start = time.perf_counter()
+        list(executor.map(lambda _: call(), range(CALLS)))
+        return time.perf_counter() - start
+
+
+def main() -> None:
+    loop_thread = EventLoopThread()
+    models: Dict[str, Callable[[], None]] = {
+        "new-loop-per-call": _new_loop_per_call,
+        "loop-per-thread": _loop_per_thread,
+        "dedicated-loop-thread": lambda: loop_thread.run(_validation()),
+    }
+    print(f"{'model':>24} {'us/call':>10}")
+    try:
+        for name, call in models.items():
+            seconds = _measure(call)
+            print(f"{name:>24} {seconds * 1e6 / CALLS:>10.1f}")
+    finally:
+        loop_thread.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+# Copyright 2016-2020, Pulumi Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Measures the memory held per resource by `AnalyzeStack`'s resources with and without
+`PULUMI_POLICY_INTERN_PROPERTIES`, on a stack of near-identical resources that share the same tags
+and policy document, and the time it takes to build them.
+
+Run from the `lib` directory: `python -m test.benchmark.bench_intern`.
+"""
+
+import gc
+import os
+import tracemalloc
+from typing import Any, Callable, Tuple
+from unittest import mock
+
+from pulumi.runtime import proto
+
+from pulumi_policy import StackValidationPolicy
+
+from .util import best_of, make_servicer, make_stack_request, materialize
+
+
+def _allocated(fn: Callable[[], Any]) -> Tuple[int, int]:
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = fn()
+        size, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del result
+    return size, peak
+
+
+def main() -> None:
+    print(f"{'resources':>10} {'interned':>9} {'B/res':>8} {'peak B/res':>11} {'ms/build':>9} "
+          f"{'strings shared':>15} {'subtrees shared':>16}")
+    for count in (1000, 10000):
+        request: proto.AnalyzeStackRequest = make_stack_request(count)
+        for intern in ("false", "true"):
+            with mock.patch.dict(os.environ, {"PULUMI_POLICY_INTERN_PROPERTIES": intern}):
+                servicer = make_servicer([StackValidationPolicy("nop", "nop", lambda args, report: None)])
+
+            def get_resources() -> Any:
+                return materialize(servicer._get_resource_table(request))  # pylint: disable=protected-access,cell-var-from-loop
+
+            size, peak = _allocated(get_resources)
+            build = best_of(get_resources, repeat=3, number=1)
+            stats = servicer.intern_stats()
+            print(f"{count:>10} {intern:>9} {size / count:>8.0f} {peak / count:>11.0f} {build * 1e3:>9.1f} "
+                  f"{stats.strings_shared:>15} {stats.subtrees_shared:>16}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# Copyright 2016-2020, Pulumi Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Measures the memory held per resource by the objects `AnalyzeStack` hands to stack policies. The
+`slots` column uses the argument types as they are; the `dict` column swaps in copies of the same
+types that keep their attributes in a per-instance `__dict__`, as they did before the types
+declared `__slots__`. Both build the same resources from the same request.
+
+Run from the `lib` directory: `python -m test.benchmark.bench_memory`.
+"""
+
+import gc
+import tracemalloc
+from typing import Any, Callable
+from unittest import mock
+
+from pulumi_policy import (
+    PolicyCustomTimeouts,
+    PolicyProviderResource,
+    PolicyResource,
+    PolicyResourceOptions,
+    StackValidationPolicy,
+)
+from pulumi_policy import server as server_module
+
+from .util import build_resources, make_servicer, make_stack_request
+
+_ARGUMENT_TYPES = (PolicyCustomTimeouts, PolicyProviderResource, PolicyResourceOptions)
+
+
+def _without_slots(cls: type) -> type:
+    return type(cls.__name__, (), {"__init__": cls.__init__})
+
+
+def _allocated(fn: Callable[[], Any]) -> int:
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = fn()
+        size, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del result
+    return size
+
+
+def main() -> None:
+    servicer = make_servicer([StackValidationPolicy("nop", "nop", lambda args, report: None)])
+    print(f"{'resources':>10} {'slots B/res':>12} {'dict B/res':>12} {'saved':>8}")
+    for count in (1000, 10000):
+        request = make_stack_request(count)
+        slots = _allocated(lambda: build_resources(servicer, request))  # pylint: disable=cell-var-from-loop
+        with mock.patch.multiple(server_module, **{cls.__name__: _without_slots(cls) for cls in _ARGUMENT_TYPES}):
+            resource_cls = _without_slots(PolicyResource)
+            dicts = _allocated(lambda: build_resources(servicer, request, resource_cls))  # pylint: disable=cell-var-from-loop
+        print(f"{count:>10} {slots / count:>12.0f} {dicts / count:>12.0f} {1 - slots / dicts:>8.1%}")
+
+if __name__ == "__main__":
+    main()
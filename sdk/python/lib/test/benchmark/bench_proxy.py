@@ -0,0 +1,88 @@
+# Copyright 2016-2020, Pulumi Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Measures the unknown-checking proxy on deeply nested and very wide properties: reading a single
+leaf, walking every value, and raising an `UnknownValueError` from the deepest level. Proxies point
+to their parents, so no path is built until an error is raised, and walking a tree costs time
+linear in its size rather than in size times depth.
+
+Run from the `lib` directory: `python -m test.benchmark.bench_proxy`.
+"""
+
+from collections.abc import Mapping, Sequence
+from typing import Any, Dict
+
+from pulumi_policy.proxy import UNKNOWN_STRING_VALUE, UnknownValueError, unknown_checking_proxy
+
+from .util import best_of
+
+
+def _deep(depth: int) -> Dict[str, Any]:
+    props: Dict[str, Any] = {"leaf": UNKNOWN_STRING_VALUE, "name": "leaf"}
+    for i in range(depth):
+        props = {"name": f"level-{i}", "items": [props]}
+    return props
+
+
+def _wide(width: int) -> Dict[str, Any]:
+    return {"items": [{"name": f"item-{i}", "tags": [f"tag-{i}"], "leaf": UNKNOWN_STRING_VALUE}
+                      for i in range(width)]}
+
+
+def _walk(value: Any) -> int:
+    count = 0
+    stack = [value]
+    while stack:
+        v = stack.pop()
+        count += 1
+        if isinstance(v, Mapping):
+            stack.extend(v[k] for k in v if k != "leaf")
+        elif isinstance(v, Sequence) and not isinstance(v, str):
+            stack.extend(v)
+    return count
+
+
+def _leaf(value: Any) -> Any:
+    while "items" in value:
+        value = value["items"][0]
+    return value["name"]
+
+
+def _raise(value: Any) -> int:
+    while "items" in value:
+        value = value["items"][0]
+    try:
+        return value["leaf"]
+    except UnknownValueError as e:
+        return len(e.props)
+
+
+def main() -> None:
+    cases = {
+        "deep-100": _deep(100),
+        "deep-1000": _deep(1000),
+        "wide-1000": _wide(1000),
+        "wide-10000": _wide(10000),
+    }
+    print(f"{'properties':>12} {'us/leaf':>10} {'us/walk':>10} {'us/error':>10}")
+    for name, props in cases.items():
+        leaf = best_of(lambda: _leaf(unknown_checking_proxy(props)))  # pylint: disable=cell-var-from-loop
+        walk = best_of(lambda: _walk(unknown_checking_proxy(props)))  # pylint: disable=cell-var-from-loop
+        error = best_of(lambda: _raise(unknown_checking_proxy(props)))  # pylint: disable=cell-var-from-loop
+        print(f"{name:>12} {leaf * 1e6:>10.1f} {walk * 1e6:>10.1f} {error * 1e6:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+# Copyright 2016-2020, Pulumi Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Compares a stack policy that only looks at types and relationships (the depth of every resource in
+the resource tree, and the number of dependencies of each type) run over a graph of `PolicyResource`
+objects, built up front as `AnalyzeStack` used to, and over the `ResourceTable`, which doesn't create
+any resources. Reports the time and memory to build each and to run the policy over it.
+
+Run from the `lib` directory: `python -m test.benchmark.bench_table`.
+"""
+
+import gc
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, Sequence, Tuple
+
+from pulumi_policy import StackValidationPolicy
+from pulumi_policy.table import ResourceTable
+
+from .util import build_resources, make_servicer, make_stack_request
+
+
+def _allocated(fn: Callable[[], Any]) -> Tuple[Any, int]:
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = fn()
+        size, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, size
+
+
+def _timed(fn: Callable[[], Any]) -> float:
+    gc.collect()
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def _walk_objects(resources: Sequence[Any]) -> Dict[str, int]:
+    depths: Dict[int, int] = {}
+    deps_by_type: Dict[str, int] = {}
+    for r in resources:
+        depth, parent = 0, r.parent
+        while parent is not None:
+            depth, parent = depth + 1, parent.parent
+        depths[id(r)] = depth
+        deps_by_type[r.resource_type] = deps_by_type.get(r.resource_type, 0) + len(r.dependencies)
+    return deps_by_type
+
+
+def _walk_table(table: ResourceTable) -> Dict[str, int]:
+    depths = [0] * len(table)
+    deps_by_type: Dict[str, int] = {}
+    parents, offsets, types = table.parents, table.dependency_offsets, table.types
+    for i in range(len(table)):
+        depth, parent = 0, parents[i]
+        while parent >= 0:
+            depth, parent = depth + 1, parents[parent]
+        depths[i] = depth
+        deps_by_type[types[i]] = deps_by_type.get(types[i], 0) + offsets[i + 1] - offsets[i]
+    return deps_by_type
+
+
+def main() -> None:
+    servicer = make_servicer([StackValidationPolicy("nop", "nop", lambda args, report: None)])
+    print(f"{'resources':>10} {'build':>7} {'ms/build':>9} {'B/res':>8} {'ms/walk':>8}")
+    for count in (10000, 100000):
+        request = make_stack_request(count)
+        build = _timed(lambda: build_resources(servicer, request))  # pylint: disable=cell-var-from-loop
+        resources, size = _allocated(lambda: build_resources(servicer, request))  # pylint: disable=cell-var-from-loop
+        walk = _timed(lambda: _walk_objects(resources))  # pylint: disable=cell-var-from-loop
+        print(f"{count:>10} {'objects':>7} {build * 1e3:>9.1f} {size / count:>8.0f} {walk * 1e3:>8.1f}")
+        del resources
+
+        get_table = servicer._get_resource_table  # pylint: disable=protected-access
+        build = _timed(lambda: get_table(request))  # pylint: disable=cell-var-from-loop
+        table, size = _allocated(lambda: get_table(request))  # pylint: disable=cell-var-from-loop
+        walk = _timed(lambda: _walk_table(table))  # pylint: disable=cell-var-from-loop
+        print(f"{count:>10} {'table':>7} {build * 1e3:>9.1f} {size / count:>8.0f} {walk * 1e3:>8.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+# Copyright 2016-2020, Pulumi Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+The micro-benchmark suite run by `python -m test.benchmark`: converting properties, the unknown-checking
+proxy, resource options and providers, and whole `Analyze` and `AnalyzeStack` calls, on synthetic
+properties that are wide, deep, full of assets, or full of unknown values, each at two sizes.
+
+Each case's setup runs once, outside of the timing, and returns the function to time.
+"""
+
+from collections.abc import Mapping, Sequence
+from typing import Any, Callable, Dict, List, NamedTuple
+
+from google.protobuf import json_format
+from pulumi.runtime import proto
+
+from pulumi_policy import ResourceValidationPolicy, StackValidationPolicy
+from pulumi_policy.deserialize import SPECIAL_ASSET_SIG, SPECIAL_SIG_KEY, deserialize_properties, deserialize_struct
+from pulumi_policy.proxy import UNKNOWN_STRING_VALUE, UnknownValueError, unknown_checking_proxy
+
+from .util import make_analyze_request, make_properties, make_servicer, make_stack_request, make_struct
+
+
+class Case(NamedTuple):
+    name: str
+    setup: Callable[[], Callable[[], Any]]
+
+
+def _deep(depth: int) -> Dict[str, Any]:
+    props: Dict[str, Any] = {"name": "leaf", "count": 0}
+    for i in range(depth):
+        props = {"name": f"level-{i}", "count": i, "child": props}
+    return props
+
+
+def _assets(count: int) -> Dict[str, Any]:
+    return {"files": {f"file-{i}": {SPECIAL_SIG_KEY: SPECIAL_ASSET_SIG, "text": f"contents of file {i}"}
+                      for i in range(count)}}
+
+
+def _unknowns(count: int) -> Dict[str, Any]:
+    return {"items": [{"id": UNKNOWN_STRING_VALUE, "name": f"item-{i}", "arn": UNKNOWN_STRING_VALUE}
+                      for i in range(count)]}
+
+
+SHAPES: Dict[str, Callable[[], Dict[str, Any]]] = {
+    "wide-16": lambda: make_properties(16, 2),
+    "wide-256": lambda: make_properties(256, 2),
+    "deep-10": lambda: _deep(10),
+    "deep-60": lambda: _deep(60),
+    "assets-10": lambda: _assets(10),
+    "assets-1000": lambda: _assets(1000),
+    "unknowns-10": lambda: _unknowns(10),
+    "unknowns-1000": lambda: _unknowns(1000),
+}
+"""
+Synthetic resource properties, by name. Protobuf limits the nesting of a `Struct` to 100 levels, so the
+deep shapes stay well under that.
+"""
+
+
+def _walk(value: Any) -> int:
+    """
+    Reads every value reachable from `value`, skipping unknowns, and returns how many were read.
+    """
+    count = 0
+    stack = [value]
+    while stack:
+        v = stack.pop()
+        count += 1
+        if isinstance(v, Mapping):
+            for k in v:
+                try:
+                    stack.append(v[k])
+                except UnknownValueError:
+                    pass
+        elif isinstance(v, Sequence) and not isinstance(v, str):
+            stack.extend(v)
+    return count
+
+
+def _read_name(args, report_violation) -> None:
+    if args.props.get("name") == "invalid":
+        report_violation("invalid name")
+
+
+def _read_stack(args, report_violation) -> None:
+    for r in args.resources:
+        if r.props.get("name") == "invalid":
+            report_violation("invalid name", r.urn)
+
+
+def _deserialize_properties(shape: str) -> Callable[[], Any]:
+    # Times the `MessageToDict` walk too, so the case is comparable with `deserialize_struct`.
+    struct = make_struct(SHAPES[shape]())
+    return lambda: deserialize_properties(json_format.MessageToDict(struct))
+
+
+def _deserialize_struct(shape: str) -> Callable[[], Any]:
+    struct = make_struct(SHAPES[shape]())
+    return lambda: deserialize_struct(struct)
+
+
+def _proxy(shape: str) -> Callable[[], Any]:
+    props = deserialize_struct(make_struct(SHAPES[shape]()))
+    return lambda: unknown_checking_proxy(props)
+
+
+def _proxy_traversal(shape: str) -> Callable[[], Any]:
+    props = deserialize_struct(make_struct(SHAPES[shape]()))
+    return lambda: _walk(unknown_checking_proxy(props))
+
+
+def _analyze(shape: str) -> Callable[[], Any]:
+    servicer = make_servicer([ResourceValidationPolicy(f"policy-{i}", "benchmark policy", _read_name)
+                              for i in range(5)])
+    request = make_analyze_request(SHAPES[shape]())
+    return lambda: servicer.Analyze(request, None)
+
+
+def _resource_options() -> Callable[[], Any]:
+    servicer = make_servicer([ResourceValidationPolicy("policy", "benchmark policy", _read_name)])
+    request = make_analyze_request({})
+    request.options.CopyFrom(proto.AnalyzerResourceOptions(
+        protect=True,
+        ignoreChanges=[f"prop{i}" for i in range(50)],
+        aliases=[f"urn:pulumi:stack::project::bench:index:Resource::alias-{i}" for i in range(50)],
+        additionalSecretOutputs=[f"secret{i}" for i in range(50)],
+        customTimeouts=proto.AnalyzerResourceOptions.CustomTimeouts(create=1, update=2, delete=3),
+    ))
+    return lambda: servicer._get_resource_options(request)  # pylint: disable=protected-access
+
+
+def _provider_resource() -> Callable[[], Any]:
+    servicer = make_servicer([ResourceValidationPolicy("policy", "benchmark policy", _read_name)])
+    request = make_analyze_request({})
+    request.provider.CopyFrom(proto.AnalyzerProviderResource(
+        type="pulumi:providers:bench",
+        properties=make_struct(make_properties(16, 2)),
+        urn="urn:pulumi:stack::project::pulumi:providers:bench::default",
+        name="default",
+    ))
+    return lambda: servicer._get_provider_resource(request)  # pylint: disable=protected-access
+
+
+def _analyze_stack(count: int) -> Callable[[], Any]:
+    servicer = make_servicer([StackValidationPolicy("stack-policy", "benchmark policy", _read_stack)])
+    request = make_stack_request(count)
+    return lambda: servicer.AnalyzeStack(request, None)
+
+
+def cases() -> List[Case]:
+    """
+    Returns every case in the suite, in a stable order.
+    """
+    result: List[Case] = []
+    for shape in SHAPES:
+        result.append(Case(f"deserialize_properties/{shape}", lambda s=shape: _deserialize_properties(s)))
+        result.append(Case(f"deserialize_struct/{shape}", lambda s=shape: _deserialize_struct(s)))
+        result.append(Case(f"unknown_checking_proxy/{shape}", lambda s=shape: _proxy(s)))
+        result.append(Case(f"proxy_traversal/{shape}", lambda s=shape: _proxy_traversal(s)))
+        result.append(Case(f"analyze/{shape}", lambda s=shape: _analyze(s)))
+    result.append(Case("get_resource_options", _resource_options))
+    result.append(Case("get_provider_resource", _provider_resource))
+    for count in (100, 1000):
+        result.append(Case(f"analyze_stack/{count}", lambda c=count: _analyze_stack(c)))
+    return result
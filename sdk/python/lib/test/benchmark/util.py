@@ -0,0 +1,167 @@
+# Copyright 2016-2020, Pulumi Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Helpers shared by the benchmarks: synthetic resource properties, requests, and a small timer.
+"""
+
+import gc
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from google.protobuf import struct_pb2
+from pulumi.runtime import proto
+
+from pulumi_policy import EnforcementLevel, Policy, PolicyResource
+from pulumi_policy.server import _PolicyAnalyzerServicer
+from pulumi_policy.table import ResourceTable
+
+
+def make_properties(width: int, depth: int) -> Dict[str, Any]:
+    """
+    Returns a property tree with `width` keys at every level, nested `depth` levels deep. Each level
+    also contains a string, a number, a boolean, and a short list.
+    """
+    def level(d: int) -> Dict[str, Any]:
+        props: Dict[str, Any] = {
+            "name": f"value-{d}",
+            "count": d,
+            "enabled": d % 2 == 0,
+            "tags": [f"tag-{i}" for i in range(3)],
+        }
+        if d < depth:
+            for i in range(width):
+                props[f"child{i}"] = level(d + 1)
+        return props
+    return level(1)
+
+
+def make_struct(props: Optional[Dict[str, Any]]) -> struct_pb2.Struct:
+    s = struct_pb2.Struct()
+    if props:
+        s.update(props)
+    return s
+
+
+def make_analyze_request(props: Dict[str, Any],
+                         resource_type: str = "bench:index:Resource",
+                         name: str = "res") -> proto.AnalyzeRequest:
+    return proto.AnalyzeRequest(
+        type=resource_type,
+        properties=make_struct(props),
+        urn=f"urn:pulumi:stack::project::{resource_type}::{name}",
+        name=name,
+        options=proto.AnalyzerResourceOptions(),
+    )
+
+
+def make_stack_request(count: int) -> proto.AnalyzeStackRequest:
+    """
+    Returns a request for a stack of `count` resources with the same properties, each the child of
+    and dependent on earlier resources.
+    """
+    props = make_struct(make_properties(2, 2))
+    resource_type = "bench:index:Resource"
+    resources = []
+    for i in range(count):
+        resources.append(proto.AnalyzerResource(
+            type=resource_type,
+            properties=props,
+            urn=f"urn:pulumi:stack::project::{resource_type}::res-{i}",
+            name=f"res-{i}",
+            options=proto.AnalyzerResourceOptions(),
+            parent=f"urn:pulumi:stack::project::{resource_type}::res-{i // 2}" if i else "",
+            dependencies=[f"urn:pulumi:stack::project::{resource_type}::res-{i - 1}"] if i else [],
+        ))
+    return proto.AnalyzeStackRequest(resources=resources)
+
+
+def build_resources(servicer: _PolicyAnalyzerServicer,
+                    request: proto.AnalyzeStackRequest,
+                    resource_cls: Callable[..., Any] = PolicyResource) -> List[Any]:
+    """
+    Builds every resource of the stack, with its parent and dependencies, the way `AnalyzeStack`
+    does once every resource has been read.
+    """
+    table = servicer._get_resource_table(request)  # pylint: disable=protected-access
+    resources: List[Any] = []
+    for i in range(len(table)):
+        data = servicer._get_resource_view(request.resources[i])  # pylint: disable=protected-access
+        resources.append(resource_cls(table.types[i], data.props, table.urns[i], table.names[i], data.opts,
+                                      data.provider, None, [], {}, data.unknown_paths))
+    for i, r in enumerate(resources):
+        parent = table.parent(i)
+        r.parent = resources[parent] if parent is not None else None
+        r.dependencies = [resources[d] for d in table.dependencies(i)]
+        r.property_dependencies = {k: [resources[d] for d in v]
+                                   for k, v in table.property_dependencies(i).items()}
+    return resources
+
+
+def materialize(table: ResourceTable) -> Sequence[PolicyResource]:
+    """
+    Creates every resource in the table, along with its relationships.
+    """
+    for r in table.resources:
+        _ = r.parent, r.dependencies, r.property_dependencies
+    return table.resources
+
+
+def make_servicer(policies: List[Policy]) -> _PolicyAnalyzerServicer:
+    return _PolicyAnalyzerServicer("bench-pack", "0.0.1", policies, EnforcementLevel.ADVISORY)
+
+
+def best_of(fn: Callable[[], Any], repeat: int = 5, number: int = 10) -> float:
+    """
+    Returns the best (lowest) average time in seconds of `number` calls to `fn`, over `repeat` runs.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+def measure(fn: Callable[[], Any], repeat: int = 5, min_time: float = 0.05) -> Tuple[float, int]:
+    """
+    Returns the best (lowest) average time in seconds of a call to `fn` over `repeat` runs, along
+    with the number of calls per run. The number of calls is doubled until a run takes at least
+    `min_time`, so fast functions aren't dominated by timer resolution. The garbage collector is
+    disabled while timing, as `timeit` does, to reduce noise.
+    """
+    number = 1
+    while True:
+        seconds = _time_calls(fn, number)
+        if seconds >= min_time:
+            break
+        number *= 2
+    best = seconds / number
+    for _ in range(repeat - 1):
+        best = min(best, _time_calls(fn, number) / number)
+    return best, number
+
+
+def _time_calls(fn: Callable[[], Any], number: int) -> float:
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        return time.perf_counter() - start
+    finally:
+        if gc_enabled:
+            gc.enable()
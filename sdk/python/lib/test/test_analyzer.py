@@ -0,0 +1,834 @@
+# Copyright 2016-2020, Pulumi Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# pylint: disable=protected-access
+
+import asyncio
+from collections.abc import MutableSequence, Sequence
+import json
+import os
+import tempfile
+import threading
+from typing import Any, Dict, List, Optional
+import unittest
+from unittest import mock
+
+from google.protobuf import struct_pb2
+from pulumi.runtime import proto
+
+import pulumi_policy.server as server_module
+from pulumi_policy import (
+    EnforcementLevel,
+    Policy,
+    ResourceValidationPolicy,
+    StackValidationPolicy,
+)
+from pulumi_policy.server import _AsyncPolicyAnalyzerServicer, _PolicyAnalyzerServicer
+from pulumi_policy.proxy import UNKNOWN_STRING_VALUE, FrozenDict, UnknownValueError, unwrap_proxy
+
+
+def make_struct(props: Optional[Dict[str, Any]]) -> struct_pb2.Struct:
+    s = struct_pb2.Struct()
+    if props:
+        s.update(props)
+    return s
+
+
+def make_analyze_request(resource_type: str = "test:index:Resource",
+                         props: Optional[Dict[str, Any]] = None,
+                         name: str = "res") -> proto.AnalyzeRequest:
+    return proto.AnalyzeRequest(
+        type=resource_type,
+        properties=make_struct(props),
+        urn=f"urn:pulumi:stack::project::{resource_type}::{name}",
+        name=name,
+        options=proto.AnalyzerResourceOptions(),
+    )
+
+
+def make_analyzer_resource(name: str,
+                           resource_type: str = "test:index:Resource",
+                           props: Optional[Dict[str, Any]] = None,
+                           parent: str = "",
+                           dependencies: Optional[List[str]] = None) -> proto.AnalyzerResource:
+    return proto.AnalyzerResource(
+        type=resource_type,
+        properties=make_struct(props),
+        urn=f"urn:pulumi:stack::project::{resource_type}::{name}",
+        name=name,
+        options=proto.AnalyzerResourceOptions(),
+        parent=parent,
+        dependencies=dependencies or [],
+    )
+
+
+def make_servicer(policies: List[Policy]) -> _PolicyAnalyzerServicer:
+    return _PolicyAnalyzerServicer("test-pack", "0.0.1", policies, EnforcementLevel.ADVISORY)
+
+
+class AnalyzeTests(unittest.TestCase):
+    def test_reports_violations_in_policy_order(self):
+        def validate_one(args, report_violation):
+            report_violation("one")
+
+        def validate_two(args, report_violation):
+            report_violation("two")
+
+        servicer = make_servicer([
+            ResourceValidationPolicy("one", "first policy", validate_one),
+            ResourceValidationPolicy("two", "second policy", validate_two),
+        ])
+        response = servicer.Analyze(make_analyze_request(props={"foo": "bar"}), None)
+        self.assertEqual(["one", "two"], [d.policyName for d in response.diagnostics])
+        self.assertEqual("first policy\none", response.diagnostics[0].message)
+
+    def test_properties_converted_once_per_request(self):
+        seen = []
+
+        def validate(args, report_violation):
+            seen.append(args.props)
+            self.assertEqual("bar", args.props["foo"])
+
+        policies = [ResourceValidationPolicy(f"policy-{i}", "desc", validate) for i in range(10)]
+        servicer = make_servicer(policies)
+
+        with mock.patch.object(server_module, "frozen_properties",
+                               wraps=server_module.frozen_properties) as deserialize:
+            servicer.Analyze(make_analyze_request(props={"foo": "bar"}), None)
+            self.assertEqual(1, deserialize.call_count)
+
+        self.assertEqual(10, len(seen))
+        self.assertTrue(all(props is seen[0] for props in seen))
+
+    def test_known_properties_not_proxied(self):
+        seen = []
+
+        def validate(args, report_violation):
+            seen.append(args)
+
+        servicer = make_servicer([ResourceValidationPolicy("policy", "desc", validate)])
+        servicer.Analyze(make_analyze_request(props={"foo": {"bar": ["baz"]}}), None)
+        servicer.Analyze(make_analyze_request(props={"foo": {"bar": [UNKNOWN_STRING_VALUE]}}), None)
+
+        known, unknown = seen
+        self.assertIsInstance(known.props, FrozenDict)
+        self.assertEqual(("baz",), known.props["foo"]["bar"])
+        self.assertEqual(frozenset(), known.unknown_paths)
+        self.assertNotIsInstance(unknown.props, FrozenDict)
+        self.assertEqual({("foo", "bar", "0")}, unknown.unknown_paths)
+        with self.assertRaises(UnknownValueError):
+            unknown.props["foo"]["bar"][0]  # pylint: disable=pointless-statement
+
+    def test_shared_options_are_immutable(self):
+        seen = []
+
+        def validate(args, report_violation):
+            seen.append(args.opts)
+            with self.assertRaises(AttributeError):
+                args.opts.ignore_changes.append("foo")
+
+        servicer = make_servicer([ResourceValidationPolicy(f"policy-{i}", "desc", validate) for i in range(2)])
+        request = make_analyze_request()
+        request.options.ignoreChanges.append("bar")
+        request.options.aliases.append("urn:pulumi:stack::project::test:index:Resource::old")
+        servicer.Analyze(request, None)
+
+        self.assertIs(seen[0], seen[1])
+        self.assertEqual(("bar",), seen[0].ignore_changes)
+        self.assertEqual(("urn:pulumi:stack::project::test:index:Resource::old",), seen[0].aliases)
+        self.assertEqual((), seen[0].additional_secret_outputs)
+
+    def test_lazy_properties(self):
+        def validate(args, report_violation):
+            report_violation(f"foo is {args.props['foo']}, unknown {sorted(args.unknown_paths)}")
+            report_violation(f"bar is {args.props['bar']}")
+
+        with mock.patch.dict(os.environ, {"PULUMI_POLICY_LAZY_PROPERTIES": "true"}):
+            servicer = make_servicer([ResourceValidationPolicy("policy", "desc", validate)])
+
+        with mock.patch.object(server_module, "frozen_properties",
+                               wraps=server_module.frozen_properties) as deserialize:
+            response = servicer.Analyze(
+                make_analyze_request(props={"foo": "bar", "bar": UNKNOWN_STRING_VALUE}), None)
+            self.assertEqual(0, deserialize.call_count)
+        self.assertEqual([
+            "desc\nfoo is bar, unknown [('bar',)]",
+            "can't run policy 'policy' during preview: string value at .bar can't be known during preview",
+        ], [d.message for d in response.diagnostics])
+
+    def test_conversion_cache(self):
+        props = {"foo": "bar", "unknown": UNKNOWN_STRING_VALUE}
+        seen = []
+
+        def validate(args, report_violation):
+            seen.append(args.props)
+
+        def validate_stack(args, report_violation):
+            seen.append(args.resources[0].props)
+
+        with mock.patch.dict(os.environ, {"PULUMI_POLICY_CONVERSION_CACHE_BYTES": "1000000"}):
+            servicer = make_servicer([
+                ResourceValidationPolicy("policy", "desc", validate),
+                StackValidationPolicy("stack-policy", "desc", validate_stack),
+            ])
+
+        resource = make_analyzer_resource("res", props=props)
+        with mock.patch.object(server_module, "frozen_properties",
+                               wraps=server_module.frozen_properties) as deserialize:
+            servicer.Analyze(make_analyze_request(props=props), None)
+            servicer.Analyze(make_analyze_request(props=props), None)
+            servicer.AnalyzeStack(proto.AnalyzeStackRequest(resources=[resource]), None)
+            self.assertEqual(1, deserialize.call_count)
+
+            # A changed resource is converted again.
+            servicer.Analyze(make_analyze_request(props={"foo": "baz"}), None)
+            self.assertEqual(2, deserialize.call_count)
+
+        self.assertIs(seen[0], seen[1])
+        self.assertIs(seen[0], seen[2])
+        self.assertEqual("baz", seen[3]["foo"])
+        stats = servicer.conversion_cache_stats()
+        self.assertEqual(2, stats.hits)
+        self.assertEqual(2, stats.misses)
+        self.assertEqual(2, stats.entries)
+        self.assertIsNone(make_servicer([ResourceValidationPolicy("policy", "desc", validate)]).conversion_cache_stats())
+
+    def test_conversion_cache_isolates_requests(self):
+        seen = []
+
+        def validate(args, report_violation):
+            seen.append((args.opts.protect, args.opts.custom_timeouts.create_seconds, args.opts.ignore_changes,
+                         args.provider.name))
+            args.opts.protect = True
+            args.opts.custom_timeouts.create_seconds = 60
+            args.provider.name = "changed"
+
+        with mock.patch.dict(os.environ, {"PULUMI_POLICY_CONVERSION_CACHE_BYTES": "1000000"}):
+            servicer = make_servicer([ResourceValidationPolicy("policy", "desc", validate)])
+
+        request = make_analyze_request()
+        request.options.ignoreChanges.append("foo")
+        request.provider.type = "pulumi:providers:test"
+        request.provider.name = "provider"
+        request.provider.urn = "urn:pulumi:stack::project::pulumi:providers:test::provider"
+        servicer.Analyze(request, None)
+        servicer.Analyze(request, None)
+
+        self.assertEqual([(False, 0, ("foo",), "provider")] * 2, seen)
+        self.assertEqual(1, servicer.conversion_cache_stats().hits)
+
+    def test_result_cache(self):
+        calls = []
+
+        def validate(args, report_violation):
+            calls.append(args.props["foo"])
+            report_violation(f"foo is {args.props['foo']}")
+
+        def validate_unknown(args, report_violation):
+            calls.append("unknown")
+            return args.props["unknown"]
+
+        servicer = make_servicer([
+            ResourceValidationPolicy("cached", "desc", validate, cacheable=True),
+            ResourceValidationPolicy("unknown", "desc", validate_unknown, cacheable=True),
+            ResourceValidationPolicy("uncached", "desc", validate),
+        ])
+
+        first = servicer.Analyze(make_analyze_request(props={"foo": "bar", "unknown": UNKNOWN_STRING_VALUE}), None)
+        second = servicer.Analyze(make_analyze_request(props={"foo": "bar", "unknown": UNKNOWN_STRING_VALUE}), None)
+        self.assertEqual(["bar", "unknown", "bar", "bar"], calls)
+        self.assertEqual(list(first.diagnostics), list(second.diagnostics))
+        self.assertEqual(["cached", "unknown", "uncached"], [d.policyName for d in second.diagnostics])
+
+        # A changed resource is validated again.
+        servicer.Analyze(make_analyze_request(props={"foo": "baz", "unknown": UNKNOWN_STRING_VALUE}), None)
+        self.assertEqual(["bar", "unknown", "bar", "bar", "baz", "unknown", "baz"], calls)
+        stats = servicer.result_cache_stats()
+        self.assertEqual(2, stats.hits)
+        self.assertEqual(4, stats.misses)
+        self.assertEqual(4, stats.entries)
+
+        # Changing the config invalidates the cached results.
+        del calls[:]
+        servicer.Configure(proto.ConfigureAnalyzerRequest(policyConfig={
+            "cached": proto.PolicyConfig(enforcementLevel=proto.MANDATORY, properties=make_struct({"value": 1})),
+        }), None)
+        self.assertEqual(0, servicer.result_cache_stats().entries)
+        response = servicer.Analyze(make_analyze_request(props={"foo": "bar", "unknown": UNKNOWN_STRING_VALUE}), None)
+        self.assertEqual(["bar", "unknown", "bar"], calls)
+        self.assertEqual(proto.MANDATORY, response.diagnostics[0].enforcementLevel)
+
+        self.assertIsNone(make_servicer([ResourceValidationPolicy("uncached", "desc", validate)]).result_cache_stats())
+
+    def test_result_cache_skips_failed_validations(self):
+        calls = []
+
+        def validate(args, report_violation):
+            calls.append(args.urn)
+            raise ValueError("failed")
+
+        servicer = make_servicer([ResourceValidationPolicy("policy", "desc", validate, cacheable=True)])
+        for _ in range(2):
+            self.assertRaises(ValueError, lambda: servicer.Analyze(make_analyze_request(), None))
+        self.assertEqual(2, len(calls))
+        self.assertEqual(0, servicer.result_cache_stats().entries)
+
+    def test_disk_cache(self):
+        calls = []
+
+        def validate(args, report_violation):
+            calls.append(args.props["foo"])
+            report_violation(f"foo is {args.props['foo']}")
+
+        with tempfile.TemporaryDirectory() as directory:
+            pack_file = os.path.join(directory, "__main__.py")
+            with open(pack_file, "w", encoding="utf-8") as f:
+                f.write("# policies")
+
+            def analyze(env):
+                env = {"PULUMI_POLICY_DISK_CACHE_PATH": os.path.join(directory, "cache.db"), **env}
+                with mock.patch.dict(os.environ, env):
+                    servicer = _PolicyAnalyzerServicer("test-pack", "0.0.1", [
+                        ResourceValidationPolicy("policy", "desc", validate, cacheable=True),
+                    ], EnforcementLevel.ADVISORY, pack_file=pack_file)
+                try:
+                    response = servicer.Analyze(make_analyze_request(props={"foo": "bar"}), None)
+                    return [d.message for d in response.diagnostics], servicer.disk_cache_stats()
+                finally:
+                    servicer.close()
+
+            # A new plugin replays the results stored by the previous one.
+            self.assertEqual(["desc\nfoo is bar"], analyze({})[0])
+            messages, stats = analyze({})
+            self.assertEqual(["desc\nfoo is bar"], messages)
+            self.assertEqual(["bar"], calls)
+            self.assertEqual((1, 0, 1), (stats.hits, stats.misses, stats.entries))
+
+            # The disk cache can be switched off.
+            messages, stats = analyze({"PULUMI_POLICY_DISABLE_DISK_CACHE": "true"})
+            self.assertEqual(["desc\nfoo is bar"], messages)
+            self.assertIsNone(stats)
+            self.assertEqual(["bar", "bar"], calls)
+
+            # Changing the policy pack's source invalidates the results.
+            with open(pack_file, "w", encoding="utf-8") as f:
+                f.write("# changed policies")
+            analyze({})
+            self.assertEqual(["bar", "bar", "bar"], calls)
+
+    def test_metrics(self):
+        async def validate_async(args, report_violation):
+            await asyncio.sleep(0)
+
+        def validate(args, report_violation):
+            pass
+
+        class SubclassPolicy(ResourceValidationPolicy):
+            def validate(self, args, report_violation):
+                pass
+
+        with mock.patch.dict(os.environ, {"PULUMI_POLICY_METRICS_PATH": "metrics.json"}):
+            servicer = make_servicer([
+                ResourceValidationPolicy("list", "desc", [validate, validate_async]),
+                SubclassPolicy("subclass", "desc"),
+                StackValidationPolicy("stack", "desc", lambda args, report_violation: None),
+            ])
+        servicer.Analyze(make_analyze_request(props={"foo": "bar"}), None)
+        servicer.Analyze(make_analyze_request(props={"foo": "bar"}), None)
+        servicer.AnalyzeStack(proto.AnalyzeStackRequest(resources=[make_analyzer_resource("res")]), None)
+
+        timings = servicer.metrics()["timings"]
+        self.assertEqual(2, timings["stages"]["analyze"]["count"])
+        self.assertEqual(1, timings["stages"]["analyze_stack"]["count"])
+        for stage in ["convert", "properties", "options", "provider", "args", "table", "response"]:
+            self.assertIn(stage, timings["stages"])
+        self.assertEqual({"list": 2, "subclass": 2, "stack": 1},
+                         {name: h["count"] for name, h in timings["policies"].items()})
+        self.assertEqual({
+            "list[0] AnalyzeTests.test_metrics.<locals>.validate": 2,
+            "list[1] AnalyzeTests.test_metrics.<locals>.validate_async": 2,
+        }, {name: h["count"] for name, h in timings["validations"].items()})
+        self.assertEqual({"test:index:Resource": 2},
+                         {name: h["count"] for name, h in timings["resource_types"].items()})
+        self.assertEqual(0, servicer.metrics()["intern"]["strings"])
+
+        self.assertIsNone(make_servicer([ResourceValidationPolicy("policy", "desc", validate)]).metrics()["timings"])
+
+    def test_trace(self):
+        async def validate_async(args, report_violation):
+            await asyncio.sleep(0)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "trace.json")
+            with mock.patch.dict(os.environ, {"PULUMI_POLICY_TRACE_PATH": path}):
+                servicer = make_servicer([
+                    ResourceValidationPolicy("policy", "desc", [lambda args, report_violation: None, validate_async]),
+                    StackValidationPolicy("stack", "desc", lambda args, report_violation: None),
+                ])
+            request = make_analyze_request(props={"foo": "bar"})
+            servicer.Analyze(request, None)
+            servicer.AnalyzeStack(proto.AnalyzeStackRequest(resources=[make_analyzer_resource("res")]), None)
+            servicer.close()
+            with open(path, encoding="utf-8") as f:
+                spans = [e for e in json.load(f) if e["ph"] == "X"]
+
+        names = [s["name"] for s in spans]
+        for name in ["Analyze", "AnalyzeStack", "convert", "args", "event_loop_wait", "response", "policy", "stack",
+                     "policy[1] AnalyzeTests.test_trace.<locals>.validate_async"]:
+            self.assertIn(name, names)
+        by_name = {s["name"]: s for s in spans}
+        self.assertEqual({"urn": request.urn, "type": request.type}, by_name["Analyze"]["args"])
+        self.assertEqual({"urn": request.urn}, by_name["policy"]["args"])
+        self.assertEqual({"resources": 1}, by_name["AnalyzeStack"]["args"])
+        # Spans nest within the RPC that they're part of.
+        analyze = by_name["Analyze"]
+        policy = by_name["policy"]
+        self.assertLessEqual(analyze["ts"], policy["ts"])
+        self.assertLessEqual(policy["ts"] + policy["dur"], analyze["ts"] + analyze["dur"])
+
+    def test_profile(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with mock.patch.dict(os.environ, {"PULUMI_POLICY_PROFILE_DIR": directory}):
+                servicer = make_servicer([
+                    ResourceValidationPolicy("policy", "desc", lambda args, report_violation: None),
+                    StackValidationPolicy("stack-policy", "desc", lambda args, report_violation: None),
+                ])
+            servicer.Analyze(make_analyze_request(), None)
+            servicer.AnalyzeStack(proto.AnalyzeStackRequest(resources=[make_analyzer_resource("res")]), None)
+            servicer.close()
+            self.assertEqual([
+                "000000-Analyze-prepare.prof",
+                "000001-Analyze-policy.prof",
+                "000002-AnalyzeStack-prepare.prof",
+                "000003-AnalyzeStack-stack-policy.prof",
+            ], sorted(os.listdir(directory)))
+
+    def test_no_conversion_when_no_policy_applies(self):
+        servicer = make_servicer([
+            ResourceValidationPolicy("disabled", "desc", lambda args, report: None, EnforcementLevel.DISABLED),
+        ])
+
+        with mock.patch.object(server_module, "frozen_properties",
+                               wraps=server_module.frozen_properties) as deserialize:
+            response = servicer.Analyze(make_analyze_request(props={"foo": "bar"}), None)
+            self.assertEqual(0, deserialize.call_count)
+        self.assertEqual(0, len(response.diagnostics))
+
+    def test_policies_only_run_on_declared_resource_types(self):
+        called = []
+
+        def make_policy(name, resource_types):
+            def validate(args, report_violation):
+                called.append(name)
+            return ResourceValidationPolicy(name, "desc", validate, resource_types=resource_types)
+
+        servicer = make_servicer([
+            make_policy("any", None),
+            make_policy("bucket", ["aws:s3/bucket:Bucket"]),
+            make_policy("kubernetes", ["kubernetes:*"]),
+            make_policy("bucket-or-kubernetes", ["kubernetes:*", "aws:s3/bucket:Bucket"]),
+        ])
+
+        servicer.Analyze(make_analyze_request("aws:s3/bucket:Bucket"), None)
+        self.assertEqual(["any", "bucket", "bucket-or-kubernetes"], called)
+
+        called.clear()
+        servicer.Analyze(make_analyze_request("kubernetes:core/v1:Pod"), None)
+        self.assertEqual(["any", "kubernetes", "bucket-or-kubernetes"], called)
+
+        called.clear()
+        servicer.Analyze(make_analyze_request("aws:s3/bucketPolicy:BucketPolicy"), None)
+        self.assertEqual(["any"], called)
+
+    def test_no_conversion_when_no_policy_matches_resource_type(self):
+        servicer = make_servicer([
+            ResourceValidationPolicy("bucket", "desc", lambda args, report: None,
+                                     resource_types=["aws:s3/bucket:Bucket"]),
+        ])
+
+        with mock.patch.object(server_module, "frozen_properties",
+                               wraps=server_module.frozen_properties) as deserialize:
+            servicer.Analyze(make_analyze_request("aws:ec2/instance:Instance", {"foo": "bar"}), None)
+            self.assertEqual(0, deserialize.call_count)
+
+    def test_async_validations_share_event_loop_across_calls(self):
+        loops = []
+
+        class AsyncPolicy(ResourceValidationPolicy):
+            async def validate(self, args, report_violation):
+                loops.append(asyncio.get_running_loop())
+                report_violation("async")
+
+        servicer = make_servicer([AsyncPolicy("async", "desc")])
+        try:
+            for _ in range(3):
+                response = servicer.Analyze(make_analyze_request(), None)
+                self.assertEqual(1, len(response.diagnostics))
+        finally:
+            servicer.close()
+
+        self.assertEqual(3, len(loops))
+        self.assertTrue(all(loop is loops[0] for loop in loops))
+
+    def test_async_validations_run_concurrently(self):
+        running = 0
+        all_running: List[asyncio.Event] = []
+
+        async def rendezvous():
+            # Only returns once all four validations are running at the same time.
+            nonlocal running
+            if not all_running:
+                all_running.append(asyncio.Event())
+            running += 1
+            if running == 4:
+                all_running[0].set()
+            await asyncio.wait_for(all_running[0].wait(), 10)
+
+        async def slow(args, report_violation):
+            await rendezvous()
+            report_violation("slow")
+
+        async def unknown(args, report_violation):
+            await rendezvous()
+            raise UnknownValueError(UNKNOWN_STRING_VALUE, ["foo"])
+
+        servicer = make_servicer([
+            ResourceValidationPolicy("first", "desc", [slow, slow]),
+            ResourceValidationPolicy("second", "desc", unknown),
+            ResourceValidationPolicy("third", "desc", slow),
+        ])
+        try:
+            response = servicer.Analyze(make_analyze_request(), None)
+        finally:
+            servicer.close()
+
+        self.assertEqual(["first", "first", "second", "third"], [d.policyName for d in response.diagnostics])
+        self.assertEqual("can't run policy 'second' during preview: string value at .foo can't be known during preview",
+                         response.diagnostics[2].message)
+        self.assertEqual(proto.ADVISORY, response.diagnostics[2].enforcementLevel)
+
+    def test_async_validations_complete_when_later_validation_raises(self):
+        completed = threading.Event()
+
+        async def slow(args, report_violation):
+            await asyncio.sleep(0.1)
+            completed.set()
+
+        def fail(args, report_violation):
+            raise ValueError("boom")
+
+        servicer = make_servicer([
+            ResourceValidationPolicy("first", "desc", slow),
+            ResourceValidationPolicy("second", "desc", fail),
+        ])
+        try:
+            with self.assertRaises(ValueError):
+                servicer.Analyze(make_analyze_request(), None)
+        finally:
+            servicer.close()
+
+        self.assertTrue(completed.is_set())
+
+
+class AnalyzeStackTests(unittest.TestCase):
+    def test_resource_graph_built_once_and_shared(self):
+        parent = make_analyzer_resource("parent", props={"foo": "bar"})
+        child = make_analyzer_resource("child", parent=parent.urn, dependencies=[parent.urn])
+        request = proto.AnalyzeStackRequest(resources=[parent, child])
+
+        seen = []
+
+        def validate(args, report_violation):
+            seen.append((args.resources, args.get_config(), args.graph))
+            self.assertIs(args.resources[1], args.graph.children(args.resources[0])[0])
+            self.assertEqual(2, len(args.resources))
+            self.assertIs(args.resources[0], args.resources[1].parent)
+            self.assertEqual([args.resources[0]], args.resources[1].dependencies)
+
+        servicer = make_servicer([
+            StackValidationPolicy("one", "desc", validate),
+            StackValidationPolicy("two", "desc", validate),
+        ])
+        servicer.Configure(proto.ConfigureAnalyzerRequest(policyConfig={
+            "one": proto.PolicyConfig(enforcementLevel=proto.ADVISORY, properties=make_struct({"value": 1})),
+            "two": proto.PolicyConfig(enforcementLevel=proto.ADVISORY, properties=make_struct({"value": 2})),
+        }), None)
+
+        with mock.patch.object(server_module, "frozen_properties",
+                               wraps=server_module.frozen_properties) as deserialize:
+            servicer.AnalyzeStack(request, None)
+            self.assertEqual(2, deserialize.call_count)
+
+        self.assertEqual(2, len(seen))
+        self.assertIs(seen[0][0], seen[1][0])
+        self.assertIs(seen[0][2], seen[1][2])
+        self.assertIsInstance(seen[0][0], Sequence)
+        self.assertNotIsInstance(seen[0][0], MutableSequence)
+        self.assertEqual({"value": 1}, seen[0][1])
+        self.assertEqual({"value": 2}, seen[1][1])
+
+    def test_resource_table(self):
+        parent = make_analyzer_resource("parent", props={"foo": "bar"})
+        child = make_analyzer_resource("child", parent=parent.urn, dependencies=[parent.urn, "urn:missing"])
+        other = make_analyzer_resource("other", resource_type="test:index:Other", props={"baz": 1})
+        request = proto.AnalyzeStackRequest(resources=[parent, child, other])
+
+        tables = []
+
+        def by_table(args, report_violation):
+            table = args.table
+            tables.append(table)
+            for i in range(len(table)):
+                parent_id = table.parent(i)
+                if parent_id is not None:
+                    report_violation(f"{table.names[i]} is a child of {table.names[parent_id]}, "
+                                     f"depends on {[table.names[d] for d in table.dependencies(i)]}")
+
+        def by_resource(args, report_violation):
+            tables.append(args.table)
+            report_violation(f"{args.resources[2].props['baz']}")
+
+        servicer = make_servicer([
+            StackValidationPolicy("table", "desc", by_table),
+            StackValidationPolicy("resource", "desc", by_resource),
+        ])
+        with mock.patch.object(server_module, "frozen_properties",
+                               wraps=server_module.frozen_properties) as deserialize:
+            response = servicer.AnalyzeStack(request, None)
+            # Only the resource that was read was converted.
+            self.assertEqual(1, deserialize.call_count)
+
+        self.assertEqual([
+            "desc\nchild is a child of parent, depends on ['parent']",
+            "desc\n1.0",
+        ], [d.message for d in response.diagnostics])
+        self.assertIs(tables[0], tables[1])
+        self.assertEqual(1, tables[0].id(child.urn))
+        self.assertIs(tables[0].resource(0), tables[0].resources[1].parent)
+
+    def test_graph_lookups_only_convert_returned_resources(self):
+        parent = make_analyzer_resource("parent", props={"foo": "bar"})
+        child = make_analyzer_resource("child", parent=parent.urn, dependencies=[parent.urn])
+        other = make_analyzer_resource("other", resource_type="test:index:Other", props={"baz": 1})
+        request = proto.AnalyzeStackRequest(resources=[parent, child, other])
+
+        def validate(args, report_violation):
+            for r in args.graph.of_type("test:index:Other"):
+                report_violation(f"{r.name} {r.props['baz']}")
+            self.assertIsNotNone(args.graph.get(parent.urn))
+            self.assertIsNone(args.graph.get("urn:missing"))
+
+        servicer = make_servicer([StackValidationPolicy("graph", "desc", validate)])
+        with mock.patch.object(server_module, "frozen_properties",
+                               wraps=server_module.frozen_properties) as deserialize:
+            response = servicer.AnalyzeStack(request, None)
+            # Only `other` and `parent` were returned, so `child` was never converted.
+            self.assertEqual(2, deserialize.call_count)
+        self.assertEqual(["desc\nother 1.0"], [d.message for d in response.diagnostics])
+
+    def test_intern_properties(self):
+        tags = {"env": "prod", "team": "infra"}
+        request = proto.AnalyzeStackRequest(resources=[
+            make_analyzer_resource("a", props={"tags": tags, "size": 1}),
+            make_analyzer_resource("b", props={"tags": tags, "size": 2}),
+            make_analyzer_resource("c", props={"tags": tags, "unknown": UNKNOWN_STRING_VALUE}),
+        ])
+
+        seen = []
+
+        def validate(args, report_violation):
+            seen.extend(args.resources)
+
+        with mock.patch.dict(os.environ, {"PULUMI_POLICY_INTERN_PROPERTIES": "true"}):
+            servicer = make_servicer([StackValidationPolicy("policy", "desc", validate)])
+        servicer.AnalyzeStack(request, None)
+
+        a, b, c = seen
+        self.assertEqual(tags, dict(a.props["tags"]))
+        self.assertIs(a.props["tags"], b.props["tags"])
+        self.assertIs(a.resource_type, b.resource_type)
+        self.assertEqual(1.0, a.props["size"])
+        self.assertEqual(2.0, b.props["size"])
+        self.assertEqual(tags, dict(c.props["tags"]))
+        with self.assertRaises(UnknownValueError):
+            c.props["unknown"]  # pylint: disable=pointless-statement
+
+        stats = servicer.intern_stats()
+        self.assertGreater(stats.strings_shared, 0)
+        self.assertGreater(stats.subtrees_shared, 0)
+        self.assertEqual(0, make_servicer([StackValidationPolicy("policy", "desc", validate)]).intern_stats().strings)
+
+    def test_intern_properties_from_conversion_cache(self):
+        tags = {"env": "prod", "team": "infra"}
+        props = [{"tags": tags, "size": 1}, {"tags": tags, "unknown": UNKNOWN_STRING_VALUE}]
+        seen = []
+
+        def validate_stack(args, report_violation):
+            seen.extend(args.resources)
+
+        with mock.patch.dict(os.environ, {"PULUMI_POLICY_INTERN_PROPERTIES": "true",
+                                          "PULUMI_POLICY_CONVERSION_CACHE_BYTES": "1000000"}):
+            servicer = make_servicer([
+                ResourceValidationPolicy("policy", "desc", lambda args, report_violation: None),
+                StackValidationPolicy("stack-policy", "desc", validate_stack),
+            ])
+        # Each resource is converted and cached by `Analyze`, without interning.
+        for i, p in enumerate(props):
+            servicer.Analyze(make_analyze_request(props=p, name=f"r{i}"), None)
+        with mock.patch.object(server_module, "frozen_properties",
+                               wraps=server_module.frozen_properties) as deserialize:
+            servicer.AnalyzeStack(proto.AnalyzeStackRequest(resources=[
+                make_analyzer_resource(f"r{i}", props=p) for i, p in enumerate(props)]), None)
+            self.assertEqual(0, deserialize.call_count)
+
+        a, b = seen
+        self.assertIs(a.props["tags"], unwrap_proxy(b.props)["tags"])
+        with self.assertRaises(UnknownValueError):
+            b.props["unknown"]  # pylint: disable=pointless-statement
+        self.assertGreater(servicer.intern_stats().subtrees_shared, 0)
+
+    def test_async_stack_validation_converts_resources_off_event_loop(self):
+        threads = set()
+        convert = server_module._PolicyAnalyzerServicer._convert_resource_view  # pylint: disable=protected-access
+
+        def record_thread(servicer, request, interner=None):
+            threads.add(threading.current_thread().name)
+            return convert(servicer, request, interner)
+
+        async def validate(args, report_violation):
+            await asyncio.sleep(0)
+            report_violation(",".join(r.props["foo"] for r in args.resources))
+
+        servicer = make_servicer([StackValidationPolicy("stack", "desc", validate)])
+        try:
+            with mock.patch.object(_PolicyAnalyzerServicer, "_convert_resource_view", record_thread):
+                response = servicer.AnalyzeStack(proto.AnalyzeStackRequest(resources=[
+                    make_analyzer_resource(f"r{i}", props={"foo": str(i)}) for i in range(3)]), None)
+        finally:
+            servicer.close()
+
+        self.assertEqual("desc\n0,1,2", response.diagnostics[0].message)
+        self.assertEqual({threading.current_thread().name}, threads)
+
+
+class AsyncAnalyzeTests(unittest.TestCase):
+    def test_async_validations_awaited_on_server_loop(self):
+        threads = {}
+
+        async def validate_async(args, report_violation):
+            threads["async"] = threading.current_thread()
+            await asyncio.sleep(0)
+            report_violation("async")
+
+        def validate_sync(args, report_violation):
+            threads["sync"] = threading.current_thread()
+            report_violation(f"sync {args.props['foo']}")
+
+        servicer = _AsyncPolicyAnalyzerServicer("test-pack", "0.0.1", [
+            ResourceValidationPolicy("async", "desc", validate_async),
+            ResourceValidationPolicy("sync", "desc", validate_sync),
+        ], EnforcementLevel.ADVISORY)
+        try:
+            response = asyncio.run(servicer.Analyze(make_analyze_request(props={"foo": "bar"}), None))
+        finally:
+            servicer.close()
+
+        self.assertEqual(["desc\nasync", "desc\nsync bar"], [d.message for d in response.diagnostics])
+        self.assertIs(threading.current_thread(), threads["async"])
+        self.assertIsNot(threading.current_thread(), threads["sync"])
+
+    def test_async_stack_validation_converts_resources_off_server_loop(self):
+        threads = set()
+        convert = server_module._PolicyAnalyzerServicer._convert_resource_view  # pylint: disable=protected-access
+
+        def record_thread(servicer, request, interner=None):
+            threads.add(threading.current_thread())
+            return convert(servicer, request, interner)
+
+        async def validate(args, report_violation):
+            await asyncio.sleep(0)
+            report_violation(",".join(r.props["foo"] for r in args.resources))
+
+        servicer = _AsyncPolicyAnalyzerServicer("test-pack", "0.0.1", [
+            StackValidationPolicy("stack", "desc", validate),
+        ], EnforcementLevel.ADVISORY)
+        try:
+            with mock.patch.object(_PolicyAnalyzerServicer, "_convert_resource_view", record_thread):
+                response = asyncio.run(servicer.AnalyzeStack(proto.AnalyzeStackRequest(resources=[
+                    make_analyzer_resource(f"r{i}", props={"foo": str(i)}) for i in range(3)]), None))
+        finally:
+            servicer.close()
+
+        self.assertEqual("desc\n0,1,2", response.diagnostics[0].message)
+        self.assertTrue(threads)
+        self.assertNotIn(threading.current_thread(), threads)
+
+    def test_result_cache(self):
+        calls = []
+
+        async def validate(args, report_violation):
+            calls.append(args.props["foo"])
+            await asyncio.sleep(0)
+            report_violation("async")
+
+        servicer = _AsyncPolicyAnalyzerServicer("test-pack", "0.0.1", [
+            ResourceValidationPolicy("async", "desc", validate, cacheable=True),
+        ], EnforcementLevel.ADVISORY)
+        try:
+            responses = [asyncio.run(servicer.Analyze(make_analyze_request(props={"foo": "bar"}), None))
+                         for _ in range(2)]
+        finally:
+            servicer.close()
+
+        self.assertEqual(["bar"], calls)
+        self.assertEqual([["desc\nasync"]] * 2, [[d.message for d in r.diagnostics] for r in responses])
+        self.assertEqual(1, servicer.result_cache_stats().hits)
+
+    def test_trace(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "trace.json")
+            with mock.patch.dict(os.environ, {"PULUMI_POLICY_TRACE_PATH": path}):
+                servicer = _AsyncPolicyAnalyzerServicer("test-pack", "0.0.1", [
+                    ResourceValidationPolicy("sync", "desc", lambda args, report_violation: None),
+                ], EnforcementLevel.ADVISORY)
+            try:
+                asyncio.run(servicer.Analyze(make_analyze_request(), None))
+            finally:
+                servicer.close()
+            with open(path, encoding="utf-8") as f:
+                spans = [e for e in json.load(f) if e["ph"] == "X"]
+
+        self.assertEqual(2, [s["name"] for s in spans].count("executor_queue"))
+        self.assertIn("sync", [s["name"] for s in spans])
+
+    def test_analyze_stack(self):
+        async def validate(args, report_violation):
+            await asyncio.sleep(0)
+            for r in args.resources:
+                if r.parent is not None:
+                    report_violation(f"{r.name} has parent {r.parent.name}", r.urn)
+
+        parent = make_analyzer_resource("parent")
+        child = make_analyzer_resource("child", parent=parent.urn)
+        servicer = _AsyncPolicyAnalyzerServicer("test-pack", "0.0.1", [
+            StackValidationPolicy("stack", "desc", validate),
+        ], EnforcementLevel.ADVISORY)
+        try:
+            response = asyncio.run(servicer.AnalyzeStack(proto.AnalyzeStackRequest(resources=[parent, child]), None))
+        finally:
+            servicer.close()
+
+        self.assertEqual(1, len(response.diagnostics))
+        self.assertEqual("desc\nchild has parent parent", response.diagnostics[0].message)
+        self.assertEqual(child.urn, response.diagnostics[0].urn)
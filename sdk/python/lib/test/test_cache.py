@@ -0,0 +1,219 @@
+# Copyright 2016-2020, Pulumi Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from google.protobuf import struct_pb2
+
+from pulumi_policy.cache import (CacheStats, DiskCache, LRUCache, environment_digest, estimate_size, fingerprint,
+                                 source_digest)
+from pulumi_policy.proxy import FrozenDict
+
+
+def make_struct(props) -> struct_pb2.Struct:
+    s = struct_pb2.Struct()
+    s.update(props)
+    return s
+
+
+class LRUCacheTests(unittest.TestCase):
+    def test_get_put(self):
+        cache = LRUCache(100)
+        self.assertIsNone(cache.get("a"))
+        cache.put("a", 1, 10)
+        self.assertEqual(1, cache.get("a"))
+        cache.put("a", 2, 20)
+        self.assertEqual(2, cache.get("a"))
+        self.assertEqual(CacheStats(hits=2, misses=1, evictions=0, entries=1, size_bytes=20, max_size_bytes=100),
+                         cache.stats())
+
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(100)
+        cache.put("a", "a", 40)
+        cache.put("b", "b", 40)
+        cache.get("a")
+        cache.put("c", "c", 40)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual("a", cache.get("a"))
+        self.assertEqual("c", cache.get("c"))
+        stats = cache.stats()
+        self.assertEqual(1, stats.evictions)
+        self.assertEqual(80, stats.size_bytes)
+
+    def test_too_large(self):
+        cache = LRUCache(100)
+        cache.put("a", "a", 101)
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(0, cache.stats().entries)
+
+    def test_clear(self):
+        cache = LRUCache(100)
+        cache.put("a", "a", 10)
+        cache.clear()
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(0, cache.stats().size_bytes)
+
+    def test_invalid_size(self):
+        self.assertRaises(TypeError, lambda: LRUCache(0))
+        self.assertRaises(TypeError, lambda: LRUCache("100"))
+
+
+class DiskCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.path = os.path.join(self.directory.name, "cache", "results.db")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def open(self, max_size_bytes: int = 1000) -> DiskCache:
+        cache = DiskCache(self.path, max_size_bytes)
+        self.addCleanup(cache.close)
+        return cache
+
+    def test_get_put(self):
+        cache = self.open()
+        self.assertIsNone(cache.get(b"a"))
+        cache.put(b"a", b"one")
+        self.assertEqual(b"one", cache.get(b"a"))
+        cache.put(b"a", b"three")
+        self.assertEqual(b"three", cache.get(b"a"))
+        self.assertEqual(CacheStats(hits=2, misses=1, evictions=0, entries=1, size_bytes=6, max_size_bytes=1000),
+                         cache.stats())
+
+    def test_shared_across_instances(self):
+        first = self.open()
+        second = self.open()
+        first.put(b"a", b"one")
+        self.assertEqual(b"one", second.get(b"a"))
+        first.close()
+        self.assertEqual(b"one", self.open().get(b"a"))
+
+    def test_evicts_least_recently_used(self):
+        cache = self.open(100)
+        for key in (b"a", b"b", b"c"):
+            cache.put(key, b"x" * 29)
+            time.sleep(0.01)
+        self.assertIsNotNone(cache.get(b"a"))
+        # Going over the limit evicts down to 80 bytes, so both of the least recently used values go.
+        cache.put(b"d", b"x" * 29)
+        self.assertIsNone(cache.get(b"b"))
+        self.assertIsNone(cache.get(b"c"))
+        self.assertIsNotNone(cache.get(b"a"))
+        self.assertIsNotNone(cache.get(b"d"))
+        stats = cache.stats()
+        self.assertEqual(2, stats.evictions)
+        self.assertEqual(60, stats.size_bytes)
+
+    def test_too_large(self):
+        cache = self.open(10)
+        cache.put(b"a", b"x" * 10)
+        self.assertIsNone(cache.get(b"a"))
+
+    def test_clear(self):
+        cache = self.open()
+        cache.put(b"a", b"one")
+        cache.clear()
+        self.assertIsNone(cache.get(b"a"))
+        self.assertEqual(0, cache.stats().entries)
+
+    def test_closed(self):
+        cache = self.open()
+        cache.put(b"a", b"one")
+        cache.close()
+        cache.put(b"b", b"two")
+        self.assertIsNone(cache.get(b"a"))
+        self.assertEqual(0, cache.errors())
+
+    def test_unopenable_database(self):
+        os.makedirs(os.path.dirname(self.path))
+        with open(self.path, "wb") as f:
+            f.write(b"not a database" * 100)
+        with self.assertLogs("pulumi_policy.cache", level="WARNING"):
+            cache = self.open()
+        self.assertIsNone(cache.get(b"a"))
+        cache.put(b"a", b"one")
+        self.assertIsNone(cache.get(b"a"))
+        self.assertEqual(1, cache.stats().errors)
+
+    def test_invalid_args(self):
+        self.assertRaises(TypeError, lambda: DiskCache("", 100))
+        self.assertRaises(TypeError, lambda: DiskCache(None, 100))
+        self.assertRaises(TypeError, lambda: DiskCache(self.path, 0))
+
+
+class SourceDigestTests(unittest.TestCase):
+    def test_source_digest(self):
+        with tempfile.TemporaryDirectory() as directory:
+            def write(path, content):
+                path = os.path.join(directory, path)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write(content)
+
+            write("__main__.py", "import policies")
+            write("policies/__init__.py", "")
+            digest = source_digest(directory)
+            self.assertEqual(digest, source_digest(directory))
+
+            # Virtual environments, caches, and non-Python files are ignored.
+            write("venv/pyvenv.cfg", "")
+            write("venv/lib/module.py", "x = 1")
+            write("__pycache__/module.py", "x = 1")
+            write("PulumiPolicy.yaml", "runtime: python")
+            self.assertEqual(digest, source_digest(directory))
+
+            write("policies/__init__.py", "x = 1")
+            self.assertNotEqual(digest, source_digest(directory))
+
+
+class EnvironmentDigestTests(unittest.TestCase):
+    def test_environment_digest(self):
+        class Distribution:
+            def __init__(self, name, version):
+                self.metadata = {"Name": name}
+                self.version = version
+
+        def digest(*dists):
+            with mock.patch("pulumi_policy.cache._metadata") as metadata:
+                metadata.distributions.return_value = list(dists)
+                return environment_digest()
+
+        a, b = Distribution("a", "1.0"), Distribution("b", "2.0")
+        self.assertEqual(digest(a, b), digest(b, a))
+        self.assertNotEqual(digest(a, b), digest(a, Distribution("b", "2.1")))
+        self.assertNotEqual(digest(a, b), digest(a))
+
+
+class FingerprintTests(unittest.TestCase):
+    def test_fingerprint(self):
+        a = make_struct({"a": 1, "b": {"c": [1, 2]}, "d": "e"})
+        b = make_struct({"d": "e", "b": {"c": [1, 2]}, "a": 1})
+        self.assertEqual(fingerprint("urn", a), fingerprint("urn", b))
+        self.assertNotEqual(fingerprint("urn", a), fingerprint("other", a))
+        self.assertNotEqual(fingerprint("urn", a), fingerprint("urn", make_struct({"a": 2})))
+        self.assertNotEqual(fingerprint("ab", "c"), fingerprint("a", "bc"))
+
+
+class EstimateSizeTests(unittest.TestCase):
+    def test_estimate_size(self):
+        shared = ("x" * 100,)
+        value = FrozenDict({"a": shared, "b": shared})
+        self.assertGreater(estimate_size(value), sys.getsizeof("x" * 100))
+        self.assertLess(estimate_size(value), estimate_size(FrozenDict({"a": shared, "b": ("y" * 100,)})))
@@ -17,8 +17,15 @@ import unittest
 from typing import Any, Callable
 
 import pulumi
+from google.protobuf import json_format, struct_pb2
+
 import pulumi_policy.deserialize as deserialize
 
+def make_struct(props: Any) -> struct_pb2.Struct:
+    s = struct_pb2.Struct()
+    s.update(props)
+    return s
+
 class PolicyPackTests(unittest.TestCase):
     def test_deserialize_properties_raises_on_unknown_signature_keys(self):
         with self.assertRaises(AssertionError):
@@ -27,6 +34,48 @@ class PolicyPackTests(unittest.TestCase):
                     deserialize.SPECIAL_SIG_KEY: "foobar",
                 },
             })
+        with self.assertRaises(AssertionError):
+            deserialize.deserialize_struct(make_struct({
+                "foo": {
+                    deserialize.SPECIAL_SIG_KEY: "foobar",
+                },
+            }))
+
+    def test_deserialize_struct_matches_message_to_dict(self):
+        props = {
+            "string": "a",
+            "number": 1,
+            "float": 1.5,
+            "bool": False,
+            "null": None,
+            "empty": {},
+            "emptyList": [],
+            "nested": {"list": [1, "two", [3, {"four": 4}], None], "map": {"a": {"b": {"c": True}}}},
+            deserialize.SPECIAL_SIG_KEY: "top-level signatures aren't decoded",
+        }
+        struct = make_struct(props)
+        expected = deserialize.deserialize_properties(json_format.MessageToDict(struct))
+        actual = deserialize.deserialize_struct(struct)
+        self.assertEqual(expected, actual)
+        self.assertEqual(list(expected), list(actual))
+        self.assertIsInstance(actual["number"], float)
+
+    def test_deserialize_struct_raises_on_non_finite_numbers(self):
+        for number in [float("inf"), float("-inf"), float("nan")]:
+            with self.assertRaises(ValueError):
+                deserialize.deserialize_struct(make_struct({"foo": [number]}))
+
+    def test_deserialize_struct_deeply_nested(self):
+        struct = struct_pb2.Struct()
+        level = struct
+        for _ in range(5000):
+            level = level.fields["child"].struct_value
+        level.fields["leaf"].string_value = "value"
+
+        result = deserialize.deserialize_struct(struct)
+        for _ in range(5000):
+            result = result["child"]
+        self.assertEqual({"leaf": "value"}, result)
 
     def test_deserialize_properties_raises_on_unsupported_asset_values(self):
         with self.assertRaises(AssertionError):
@@ -187,8 +236,10 @@ class PolicyPackTests(unittest.TestCase):
             ],
         }
 
-        result = deserialize.deserialize_properties(props)
+        self.assert_unmarshalled_fully(deserialize.deserialize_properties(props), assertObj)
+        self.assert_unmarshalled_fully(deserialize.deserialize_struct(make_struct(props)), assertObj)
 
+    def assert_unmarshalled_fully(self, result: Any, assertObj: Callable[[Any], None]):
         # Regular is returned as is.
         self.assertEqual(result["regular"], "a normal value")
 
@@ -0,0 +1,164 @@
+# Copyright 2016-2020, Pulumi Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from typing import Dict, List, Optional
+import unittest
+
+from pulumi_policy import (
+    PolicyCustomTimeouts,
+    PolicyResource,
+    PolicyResourceOptions,
+    StackGraph,
+    StackValidationArgs,
+)
+
+
+def make_resource(name: str,
+                  resource_type: str = "test:index:Resource",
+                  parent: Optional[PolicyResource] = None,
+                  dependencies: Optional[List[PolicyResource]] = None,
+                  property_dependencies: Optional[Dict[str, List[PolicyResource]]] = None) -> PolicyResource:
+    opts = PolicyResourceOptions(False, [], None, [], PolicyCustomTimeouts(0, 0, 0), [])
+    return PolicyResource(resource_type, {}, f"urn:pulumi:stack::project::{resource_type}::{name}", name, opts,
+                          None, parent, dependencies or [], property_dependencies or {})
+
+
+class StackGraphTests(unittest.TestCase):
+    def setUp(self):
+        self.vpc = make_resource("vpc", "aws:ec2/vpc:Vpc")
+        self.subnet = make_resource("subnet", "aws:ec2/subnet:Subnet", parent=self.vpc, dependencies=[self.vpc],
+                                    property_dependencies={"vpcId": [self.vpc]})
+        self.other = make_resource("other", "aws:ec2/subnet:Subnet", parent=self.vpc,
+                                   property_dependencies={"vpcId": [self.vpc], "cidr": [self.subnet]})
+        self.bucket = make_resource("bucket", "aws:s3/bucket:Bucket", dependencies=[self.subnet])
+        self.graph = StackGraph((self.vpc, self.subnet, self.other, self.bucket))
+
+    def test_of_type(self):
+        self.assertEqual((self.subnet, self.other), self.graph.of_type("aws:ec2/subnet:Subnet"))
+        self.assertEqual((self.bucket,), self.graph.of_type("aws:s3/bucket:Bucket"))
+        self.assertEqual((), self.graph.of_type("aws:s3/bucketPolicy:BucketPolicy"))
+
+    def test_get(self):
+        self.assertIs(self.subnet, self.graph.get(self.subnet.urn))
+        self.assertIsNone(self.graph.get("urn:pulumi:stack::project::aws:s3/bucket:Bucket::missing"))
+
+    def test_children(self):
+        self.assertEqual((self.subnet, self.other), self.graph.children(self.vpc))
+        self.assertEqual((), self.graph.children(self.bucket))
+
+    def test_dependents(self):
+        self.assertEqual((self.subnet,), self.graph.dependents(self.vpc))
+        self.assertEqual((self.bucket,), self.graph.dependents(self.subnet))
+        self.assertEqual((), self.graph.dependents(self.bucket))
+
+    def test_property_dependents(self):
+        self.assertEqual(((self.subnet, "vpcId"), (self.other, "vpcId")), self.graph.property_dependents(self.vpc))
+        self.assertEqual(((self.other, "cidr"),), self.graph.property_dependents(self.subnet))
+        self.assertEqual((), self.graph.property_dependents(self.bucket))
+
+    def test_indexes_built_once(self):
+        self.assertIs(self.graph.of_type("aws:ec2/subnet:Subnet"), self.graph.of_type("aws:ec2/subnet:Subnet"))
+        self.assertIs(self.graph.children(self.vpc), self.graph.children(self.vpc))
+
+    def test_stack_validation_args_graph(self):
+        args = StackValidationArgs(self.graph.resources)
+        self.assertIs(args.graph, args.graph)
+        self.assertEqual(self.graph.resources, args.graph.resources)
+
+        args = StackValidationArgs(self.graph.resources, None, self.graph)
+        self.assertIs(self.graph, args.graph)
+
+
+class StackGraphAlgorithmTests(unittest.TestCase):
+    def setUp(self):
+        # vpc <- subnet <- instance <- bucket, with the instance and bucket both children of the
+        # subnet, and an unrelated resource on its own.
+        self.vpc = make_resource("vpc")
+        self.subnet = make_resource("subnet", parent=self.vpc, property_dependencies={"vpcId": [self.vpc]})
+        self.instance = make_resource("instance", parent=self.subnet, dependencies=[self.subnet])
+        self.bucket = make_resource("bucket", parent=self.subnet, dependencies=[self.instance])
+        self.lonely = make_resource("lonely")
+        self.graph = StackGraph((self.bucket, self.lonely, self.instance, self.subnet, self.vpc))
+
+    def test_ancestors(self):
+        self.assertEqual((self.subnet, self.vpc), self.graph.ancestors(self.instance))
+        self.assertEqual((self.subnet, self.vpc), self.graph.ancestors(self.bucket))
+        self.assertEqual((self.vpc,), self.graph.ancestors(self.subnet))
+        self.assertEqual((), self.graph.ancestors(self.vpc))
+
+    def test_descendants(self):
+        self.assertEqual((self.bucket, self.instance, self.subnet), self.graph.descendants(self.vpc))
+        self.assertEqual((self.bucket, self.instance), self.graph.descendants(self.subnet))
+        self.assertEqual((), self.graph.descendants(self.lonely))
+
+    def test_transitive_dependencies(self):
+        self.assertEqual((self.instance, self.subnet, self.vpc), self.graph.transitive_dependencies(self.bucket))
+        self.assertEqual((self.subnet, self.vpc), self.graph.transitive_dependencies(self.instance))
+        self.assertEqual((), self.graph.transitive_dependencies(self.vpc))
+
+    def test_transitive_dependents(self):
+        self.assertEqual((self.bucket, self.instance, self.subnet), self.graph.transitive_dependents(self.vpc))
+        self.assertEqual((self.bucket,), self.graph.transitive_dependents(self.instance))
+        self.assertEqual((), self.graph.transitive_dependents(self.lonely))
+
+    def test_topological_order(self):
+        self.assertEqual((self.lonely, self.vpc, self.subnet, self.instance, self.bucket),
+                         self.graph.topological_order())
+        self.assertEqual((), self.graph.cycles())
+
+    def test_components(self):
+        self.assertEqual(((self.bucket, self.instance, self.subnet, self.vpc), (self.lonely,)),
+                         self.graph.components())
+
+    def test_cycles(self):
+        a = make_resource("a")
+        b = make_resource("b", dependencies=[a])
+        c = make_resource("c", dependencies=[b])
+        d = make_resource("d")
+        a.dependencies.append(c)
+        d.dependencies.append(d)
+        graph = StackGraph((a, b, c, d, make_resource("e", dependencies=[c])))
+
+        self.assertEqual(((a, b, c), (d,)), graph.cycles())
+        self.assertEqual((a, b, c), graph.transitive_dependencies(a))
+        with self.assertRaises(ValueError):
+            graph.topological_order()
+
+    def test_parent_cycle(self):
+        a = make_resource("a")
+        b = make_resource("b", parent=a)
+        c = make_resource("c", parent=b)
+        a.parent = c
+        graph = StackGraph((a, b, c, make_resource("d", parent=c)))
+
+        self.assertEqual((b, a, c), graph.ancestors(c))
+        self.assertEqual((a, c, b), graph.ancestors(b))
+        self.assertEqual((c, b, a), graph.ancestors(a))
+        self.assertEqual((a, b, c, graph.get("urn:pulumi:stack::project::test:index:Resource::d")),
+                         graph.descendants(a))
+
+    def test_deep_graph(self):
+        resources = [make_resource("r0")]
+        for i in range(1, 10000):
+            resources.append(make_resource(f"r{i}", parent=resources[-1], dependencies=[resources[-1]]))
+        graph = StackGraph(resources)
+
+        self.assertEqual(9999, len(graph.ancestors(resources[-1])))
+        self.assertEqual(9998, len(graph.ancestors(resources[-2])))
+        self.assertEqual(9999, len(graph.descendants(resources[0])))
+        self.assertEqual(9999, len(graph.transitive_dependencies(resources[-1])))
+        self.assertEqual(9999, len(graph.transitive_dependents(resources[0])))
+        self.assertEqual(tuple(resources), graph.topological_order())
+        self.assertEqual((), graph.cycles())
+        self.assertEqual((tuple(resources),), graph.components())
@@ -0,0 +1,88 @@
+# Copyright 2016-2020, Pulumi Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+import signal
+import tempfile
+import threading
+import unittest
+
+from pulumi_policy.instrumentation import (POLICIES, RESOURCE_TYPES, STAGES, VALIDATIONS, Histogram, Metrics,
+                                           install_dump_signal, write_metrics)
+
+
+class HistogramTests(unittest.TestCase):
+    def test_empty(self):
+        self.assertEqual({"count": 0, "total_seconds": 0.0, "buckets": []}, Histogram().snapshot())
+
+    def test_snapshot(self):
+        histogram = Histogram()
+        for seconds in [0.0000005, 0.001, 0.001, 0.003, 1000.0]:
+            histogram.record(seconds)
+        snapshot = histogram.snapshot()
+        self.assertEqual(5, snapshot["count"])
+        self.assertAlmostEqual(1000.0050005, snapshot["total_seconds"])
+        self.assertEqual(0.0000005, snapshot["min_seconds"])
+        self.assertEqual(1000.0, snapshot["max_seconds"])
+        # Percentiles are the upper bounds of their buckets.
+        self.assertEqual(0.001024, snapshot["p50_seconds"])
+        self.assertEqual(1000.0, snapshot["p99_seconds"])
+        self.assertEqual([[0.000001, 1], [0.001024, 2], [0.004096, 1], [None, 1]], snapshot["buckets"])
+
+
+class MetricsTests(unittest.TestCase):
+    def test_snapshot(self):
+        metrics = Metrics()
+        self.assertEqual({STAGES: {}, POLICIES: {}, VALIDATIONS: {}, RESOURCE_TYPES: {}}, metrics.snapshot())
+        metrics.record(POLICIES, "policy", 0.5)
+        metrics.record(POLICIES, "policy", 1.5)
+        metrics.record(STAGES, "convert", 0.25)
+        snapshot = metrics.snapshot()
+        self.assertEqual(["policy"], list(snapshot[POLICIES]))
+        self.assertEqual(2, snapshot[POLICIES]["policy"]["count"])
+        self.assertEqual(2.0, snapshot[POLICIES]["policy"]["total_seconds"])
+        self.assertEqual(1, snapshot[STAGES]["convert"]["count"])
+
+    def test_write_metrics(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "metrics.json")
+            write_metrics(path, {"a": 1})
+            write_metrics(path, {"b": 2})
+            with open(path, encoding="utf-8") as f:
+                self.assertEqual({"b": 2}, json.load(f))
+            self.assertEqual(["metrics.json"], os.listdir(directory))
+
+    @unittest.skipUnless(hasattr(signal, "SIGUSR1"), "SIGUSR1 isn't available")
+    def test_dump_signal(self):
+        dumped = threading.Event()
+        threads = []
+
+        def dump():
+            threads.append(threading.current_thread())
+            dumped.set()
+
+        previous = signal.getsignal(signal.SIGUSR1)
+        self.addCleanup(signal.signal, signal.SIGUSR1, previous)
+        self.assertTrue(install_dump_signal(dump))
+        os.kill(os.getpid(), signal.SIGUSR1)
+        self.assertTrue(dumped.wait(5))
+        self.assertIsNot(threading.main_thread(), threads[0])
+
+    def test_dump_signal_off_main_thread(self):
+        installed = []
+        thread = threading.Thread(target=lambda: installed.append(install_dump_signal(lambda: None)))
+        thread.start()
+        thread.join()
+        self.assertEqual([False], installed)
@@ -0,0 +1,88 @@
+# Copyright 2016-2020, Pulumi Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+
+from google.protobuf import struct_pb2
+
+from pulumi_policy.intern import InternCounters, Interner, InternStats
+from pulumi_policy.proxy import FrozenDict, frozen_properties
+
+
+def frozen(props):
+    s = struct_pb2.Struct()
+    s.update(props)
+    return frozen_properties(s)[0]
+
+
+class InternerTests(unittest.TestCase):
+    def test_strings(self):
+        interner = Interner()
+        a = "".join(["aws:s3/bucket", ":Bucket"])
+        b = "".join(["aws:s3/bucket:", "Bucket"])
+        self.assertIsNot(a, b)
+        self.assertIs(a, interner.string(a))
+        self.assertIs(a, interner.string(b))
+        self.assertEqual(InternStats(2, 1, 0, 0), interner.stats())
+
+    def test_equal_subtrees_shared(self):
+        interner = Interner()
+        policy = {"Version": "2012-10-17", "Statement": [{"Effect": "Allow", "Action": ["s3:GetObject"]}]}
+        a = interner.value(frozen({"name": "a", "policy": policy}))
+        b = interner.value(frozen({"name": "b", "policy": policy}))
+
+        self.assertIsNot(a, b)
+        self.assertIs(a["policy"], b["policy"])
+        self.assertIs(a["policy"]["Statement"], b["policy"]["Statement"])
+        self.assertIs(a["policy"]["Version"], b["policy"]["Version"])
+        self.assertIsInstance(a, FrozenDict)
+        self.assertIsInstance(a["policy"]["Statement"], tuple)
+        self.assertEqual(policy["Statement"][0]["Action"], list(b["policy"]["Statement"][0]["Action"]))
+
+        # The second policy, its statements, the statement, and its actions are all shared.
+        self.assertEqual(4, interner.stats().subtrees_shared)
+        self.assertIs(a, interner.value(frozen({"name": "a", "policy": policy})))
+
+    def test_values_not_confused(self):
+        interner = Interner()
+        values = [True, 1.0, 0.0, -0.0, None, "1", (1.0,), (True,), FrozenDict({"a": 1.0})]
+        interned = [interner.value(v) for v in values]
+        for value, result in zip(values, interned):
+            self.assertEqual(value, result)
+            self.assertIs(value.__class__, result.__class__)
+        self.assertEqual("-0.0", str(interned[3]))
+        self.assertIsNot(interned[6], interned[7])
+
+    def test_unshareable_values(self):
+        interner = Interner()
+        asset = object()
+        a = interner.value(FrozenDict({"asset": asset, "tags": ("x",)}))
+        b = interner.value(FrozenDict({"asset": asset, "tags": ("x",)}))
+        self.assertIsNot(a, b)
+        self.assertIs(asset, b["asset"])
+        self.assertIs(a["tags"], b["tags"])
+
+    def test_deeply_nested(self):
+        value = "leaf"
+        for _ in range(5000):
+            value = (value,)
+        interner = Interner()
+        first = interner.value(value)
+        self.assertIs(first, interner.value(tuple(value)))
+
+    def test_counters(self):
+        counters = InternCounters()
+        counters.add(InternStats(1, 2, 3, 4))
+        counters.add(InternStats(1, 1, 1, 1))
+        self.assertEqual(InternStats(2, 3, 4, 5), counters.total())
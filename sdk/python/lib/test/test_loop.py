@@ -0,0 +1,94 @@
+# Copyright 2016-2020, Pulumi Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+from concurrent import futures
+import threading
+import unittest
+
+from pulumi_policy.loop import EventLoopThread
+
+
+class EventLoopThreadTests(unittest.TestCase):
+    def setUp(self):
+        self.loop_thread = EventLoopThread()
+
+    def tearDown(self):
+        self.loop_thread.close()
+
+    def test_run_returns_result(self):
+        async def compute():
+            await asyncio.sleep(0)
+            return 42
+
+        self.assertEqual(42, self.loop_thread.run(compute()))
+
+    def test_run_raises_exception(self):
+        async def fail():
+            raise ValueError("boom")
+
+        with self.assertRaises(ValueError):
+            self.loop_thread.run(fail())
+
+    def test_loop_reused_across_calls_and_threads(self):
+        async def current_loop():
+            return asyncio.get_running_loop(), threading.current_thread()
+
+        first_loop, first_thread = self.loop_thread.run(current_loop())
+        with futures.ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(lambda _: self.loop_thread.run(current_loop()), range(8)))
+
+        for loop, thread in results:
+            self.assertIs(first_loop, loop)
+            self.assertIs(first_thread, thread)
+        self.assertIsNot(threading.current_thread(), first_thread)
+
+    def test_close_cancels_pending_tasks(self):
+        cancelled = threading.Event()
+
+        async def background():
+            try:
+                await asyncio.sleep(3600)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        async def start_background():
+            return asyncio.get_running_loop().create_task(background())
+
+        self.loop_thread.run(start_background())
+        self.loop_thread.close()
+        self.assertTrue(cancelled.is_set())
+
+    def test_run_after_close_starts_new_loop(self):
+        async def current_loop():
+            return asyncio.get_running_loop()
+
+        first = self.loop_thread.run(current_loop())
+        self.loop_thread.close()
+        self.assertTrue(first.is_closed())
+        second = self.loop_thread.run(current_loop())
+        self.assertIsNot(first, second)
+
+    def test_submit_does_not_block(self):
+        release = threading.Event()
+
+        async def wait_for_release():
+            await asyncio.get_running_loop().run_in_executor(None, release.wait)
+            return 42
+
+        future = self.loop_thread.submit(wait_for_release())
+        self.assertFalse(future.done())
+        release.set()
+        self.assertEqual(42, future.result(timeout=5))
@@ -20,9 +20,15 @@ import unittest
 from pulumi_policy import (
     EnforcementLevel,
     PolicyConfigSchema,
+    PolicyCustomTimeouts,
     PolicyPack,
+    PolicyProviderResource,
+    PolicyResource,
+    PolicyResourceOptions,
     ReportViolation,
+    ResourceValidationArgs,
     ResourceValidationPolicy,
+    StackValidationArgs,
     StackValidationPolicy,
 )
 
@@ -97,12 +103,25 @@ class ResourceValidationPolicyTests(unittest.TestCase):
         self.assertRaises(TypeError, lambda: ResourceValidationPolicy("name", "desc", NOP, ""))
         self.assertRaises(TypeError, lambda: ResourceValidationPolicy("name", "desc", NOP, 1))
 
+        self.assertRaises(TypeError, lambda: ResourceValidationPolicy("name", "desc", NOP, resource_types=""))
+        self.assertRaises(TypeError, lambda: ResourceValidationPolicy("name", "desc", NOP, resource_types="a:b:C"))
+        self.assertRaises(TypeError, lambda: ResourceValidationPolicy("name", "desc", NOP, resource_types=[None]))
+        self.assertRaises(TypeError, lambda: ResourceValidationPolicy("name", "desc", NOP, resource_types=[""]))
+        self.assertRaises(TypeError, lambda: ResourceValidationPolicy("name", "desc", NOP, resource_types=[1]))
+
+        self.assertRaises(TypeError, lambda: ResourceValidationPolicy("name", "desc", NOP, cacheable=None))
+        self.assertRaises(TypeError, lambda: ResourceValidationPolicy("name", "desc", NOP, cacheable=1))
+
     def test_init(self):
         ResourceValidationPolicy("name", "desc", NOP)
         ResourceValidationPolicy("name", "desc", [NOP])
         ResourceValidationPolicy("name", "desc", NOP, EnforcementLevel.ADVISORY)
         ResourceValidationPolicy("name", "desc", NOP, EnforcementLevel.MANDATORY)
         ResourceValidationPolicy("name", "desc", NOP, EnforcementLevel.DISABLED)
+        ResourceValidationPolicy("name", "desc", NOP, resource_types=[])
+        ResourceValidationPolicy("name", "desc", NOP, resource_types=["aws:s3/bucket:Bucket", "kubernetes:*"])
+        self.assertTrue(ResourceValidationPolicy("name", "desc", NOP, cacheable=True).cacheable)
+        self.assertFalse(ResourceValidationPolicy("name", "desc", NOP).cacheable)
 
     def test_async_validate(self):
         async def validate(args, report_violation: ReportViolation):
@@ -147,6 +166,23 @@ class ResourceValidationPolicyTests(unittest.TestCase):
         violations = run_policy(policy)
         self.assertCountEqual(["first", "second", "third", "fourth", "fifth"], violations)
 
+    def test_async_validate_completes_when_later_validate_raises(self):
+        async def validate_one(args, report_violation: ReportViolation):
+            await asyncio.sleep(0.1)
+            report_violation("first")
+
+        def validate_two(args, report_violation: ReportViolation):
+            report_violation("second")
+            raise ValueError("failed")
+
+        policy = ResourceValidationPolicy("name", "desc", [validate_one, validate_two])
+        violations = []
+        result = policy.validate(None, lambda message, urn=None: violations.append(message))
+        self.assertTrue(isawaitable(result))
+        with self.assertRaisesRegex(ValueError, "failed"):
+            asyncio.run(result)
+        self.assertEqual(["second", "first"], violations)
+
 
 class ResourceValidationPolicySubclassNoValidateOverrideTests(unittest.TestCase):
     class Subclass(ResourceValidationPolicy):
@@ -289,3 +325,25 @@ class PolicyConfigSchemaTests(unittest.TestCase):
 
         PolicyConfigSchema({}, [])
         PolicyConfigSchema({}, ["foo"])
+
+
+class ArgumentSlotsTests(unittest.TestCase):
+    def test_no_instance_dict(self):
+        timeouts = PolicyCustomTimeouts(1, 2, 3)
+        opts = PolicyResourceOptions(False, [], False, [], timeouts, None)
+        provider = PolicyProviderResource("pulumi:providers:aws", {}, "urn", "default")
+        resource = PolicyResource("aws:s3/bucket:Bucket", {}, "urn", "bucket", opts, provider, None, [], {})
+        args = ResourceValidationArgs("aws:s3/bucket:Bucket", {}, "urn", "bucket", opts, provider, {"foo": 1})
+        stack_args = StackValidationArgs([resource], {"foo": 1})
+
+        for obj in (timeouts, opts, provider, resource, args, stack_args):
+            self.assertFalse(hasattr(obj, "__dict__"), type(obj).__name__)
+
+        self.assertEqual({"foo": 1}, args.get_config())
+        self.assertEqual({"foo": 1}, stack_args.get_config())
+
+        # Public attributes can still be reassigned, but new ones can't be added.
+        resource.parent = resource
+        self.assertIs(resource, resource.parent)
+        with self.assertRaises(AttributeError):
+            resource.extra = 1  # pylint: disable=assigning-non-slot
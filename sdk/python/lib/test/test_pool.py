@@ -0,0 +1,165 @@
+# Copyright 2016-2020, Pulumi Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import threading
+import time
+import unittest
+from unittest import mock
+
+from pulumi_policy import settings
+from pulumi_policy.pool import WorkerPool, default_max_workers
+
+
+def busy(seconds: float) -> None:
+    end = time.thread_time() + seconds
+    while time.thread_time() < end:
+        pass
+
+
+class WorkerPoolTests(unittest.TestCase):
+    def test_runs_tasks(self):
+        pool = WorkerPool(2)
+        try:
+            self.assertEqual(3, pool.submit(lambda a, b: a + b, 1, b=2).result())
+            with self.assertRaises(ValueError):
+                pool.submit(int, "not a number").result()
+        finally:
+            pool.shutdown()
+
+    def test_invalid_max_workers(self):
+        with self.assertRaises(ValueError):
+            WorkerPool(0)
+
+    def test_default_max_workers(self):
+        pool = WorkerPool()
+        try:
+            self.assertEqual(default_max_workers(), pool.stats().max_workers)
+        finally:
+            pool.shutdown()
+
+    def test_threads_started_on_demand(self):
+        pool = WorkerPool(4)
+        try:
+            for _ in range(10):
+                pool.submit(lambda: None).result()
+            self.assertEqual(1, pool.stats().workers)
+        finally:
+            pool.shutdown()
+
+    def test_measures_queue_depth_and_wait(self):
+        pool = WorkerPool(1)
+        release = threading.Event()
+        try:
+            blocker = pool.submit(release.wait)
+            queued = [pool.submit(lambda: None) for _ in range(3)]
+            time.sleep(0.05)
+            self.assertEqual(3, pool.stats().queue_depth)
+            release.set()
+            for f in [blocker] + queued:
+                f.result()
+        finally:
+            pool.shutdown()
+
+        stats = pool.stats()
+        self.assertEqual(4, stats.submitted)
+        self.assertEqual(4, stats.completed)
+        self.assertEqual(0, stats.queue_depth)
+        self.assertGreaterEqual(stats.max_queue_depth, 3)
+        self.assertGreaterEqual(stats.max_wait_seconds, 0.05)
+        self.assertGreaterEqual(stats.total_wait_seconds, stats.max_wait_seconds)
+
+    def test_blocked_ratio(self):
+        pool = WorkerPool(1)
+        try:
+            pool.submit(time.sleep, 0.1).result()
+        finally:
+            pool.shutdown()
+        self.assertGreater(pool.stats().blocked_ratio, 0.5)
+
+    def test_shutdown(self):
+        pool = WorkerPool(2)
+        pool.submit(lambda: None).result()
+        pool.shutdown()
+        self.assertEqual(0, pool.stats().workers)
+        with self.assertRaises(RuntimeError):
+            pool.submit(lambda: None)
+
+    def test_shutdown_cancel_futures(self):
+        pool = WorkerPool(1)
+        release = threading.Event()
+        blocker = pool.submit(release.wait)
+        time.sleep(0.05)
+        queued = pool.submit(lambda: None)
+        pool.shutdown(wait=False, cancel_futures=True)
+        release.set()
+        self.assertTrue(blocker.result())
+        self.assertTrue(queued.cancelled())
+
+    def test_adaptive_grows_when_blocked(self):
+        pool = WorkerPool(256, adaptive=True)
+        try:
+            initial = pool.stats().max_workers
+            fs = [pool.submit(time.sleep, 0.01) for _ in range(200)]
+            for f in fs:
+                f.result()
+            stats = pool.stats()
+        finally:
+            pool.shutdown()
+        self.assertGreater(stats.max_workers, initial)
+        self.assertLessEqual(stats.max_workers, 256)
+
+    def test_adaptive_does_not_grow_when_cpu_bound(self):
+        pool = WorkerPool(64, adaptive=True)
+        try:
+            initial = pool.stats().max_workers
+            fs = [pool.submit(busy, 0.01) for _ in range(6 * 32)]
+            for f in fs:
+                f.result()
+            stats = pool.stats()
+        finally:
+            pool.shutdown()
+        # Tasks contending for the GIL look blocked, but adding threads doesn't complete them any
+        # faster, so the pool at most tries one larger size before going back.
+        self.assertLessEqual(stats.max_workers, 2 * initial)
+
+    def test_adaptive_shrinks_without_backlog(self):
+        pool = WorkerPool(16, adaptive=True)
+        try:
+            initial = pool.stats().max_workers
+            for _ in range(4 * 32):
+                pool.submit(busy, 0.001).result()
+            stats = pool.stats()
+        finally:
+            pool.shutdown()
+        # The pool shrinks by one worker per window without a backlog, down to its minimum.
+        self.assertEqual(max(initial - 4, 2), stats.max_workers)
+
+
+class WorkerSettingsTests(unittest.TestCase):
+    def test_max_workers(self):
+        with mock.patch.dict(os.environ, {"PULUMI_POLICY_MAX_WORKERS": "12"}):
+            self.assertEqual(12, settings.max_workers())
+        with mock.patch.dict(os.environ, {"PULUMI_POLICY_MAX_WORKERS": ""}):
+            self.assertIsNone(settings.max_workers())
+        for value in ["0", "-1", "four"]:
+            with mock.patch.dict(os.environ, {"PULUMI_POLICY_MAX_WORKERS": value}):
+                with self.assertRaises(ValueError):
+                    settings.max_workers()
+
+    def test_adaptive_workers(self):
+        with mock.patch.dict(os.environ, {"PULUMI_POLICY_ADAPTIVE_WORKERS": "true"}):
+            self.assertTrue(settings.adaptive_workers())
+        with mock.patch.dict(os.environ, {"PULUMI_POLICY_ADAPTIVE_WORKERS": "0"}):
+            self.assertFalse(settings.adaptive_workers())
@@ -0,0 +1,244 @@
+# Copyright 2016-2020, Pulumi Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import json
+import os
+import runpy
+import subprocess
+import sys
+import tempfile
+import textwrap
+import unittest
+from unittest import mock
+
+from google.protobuf import struct_pb2
+from pulumi.runtime import proto
+
+import pulumi_policy
+from pulumi_policy import EnforcementLevel, ExecutionMode, PolicyPack, ResourceValidationPolicy
+from pulumi_policy import process
+from pulumi_policy.loop import EventLoopThread
+from pulumi_policy.proxy import UNKNOWN_STRING_VALUE
+from pulumi_policy.server import _AsyncPolicyAnalyzerServicer, _PolicyAnalyzerServicer
+
+# A policy pack whose policies report what they see, including the process they run in.
+PACK = textwrap.dedent("""
+    import asyncio
+    import os
+
+    from pulumi_policy import EnforcementLevel, PolicyPack, ResourceValidationPolicy
+
+    def check_name(args, report_violation):
+        report_violation(f"{args.name} has size {args.props['size']}")
+        report_violation("with a urn", "urn:pulumi:stack::project::test:index:Other::other")
+
+    async def check_async(args, report_violation):
+        await asyncio.sleep(0)
+        report_violation(f"async config {args.get_config()}")
+
+    def check_unknown(args, report_violation):
+        report_violation("before unknown")
+        report_violation(args.props["unknown"])
+
+    def check_pid(args, report_violation):
+        report_violation(str(os.getpid()))
+
+    POLICIES = [
+        ResourceValidationPolicy("check-name", "Checks the name.", check_name),
+        ResourceValidationPolicy("check-async", "Checks async.", check_async,
+                                 enforcement_level=EnforcementLevel.MANDATORY),
+        ResourceValidationPolicy("check-unknown", "Checks unknowns.", check_unknown),
+        ResourceValidationPolicy("check-pid", "Reports the process id.", check_pid),
+    ]
+
+    if __name__ == "__main__":
+        PolicyPack("process-pack", POLICIES)
+""")
+
+# A policy pack that, like most, creates its `PolicyPack` without checking `__name__`. Worker processes
+# re-import it as the main module when they start. Serving is replaced with analyzing one resource.
+UNGUARDED_PACK = textwrap.dedent("""
+    import os
+    import sys
+
+    from pulumi.runtime import proto
+
+    import pulumi_policy.server
+    from pulumi_policy import ExecutionMode, PolicyPack, ResourceValidationPolicy
+
+    def check_pid(args, report_violation):
+        report_violation(str(os.getpid()))
+
+    def serve(name, version, policies, enforcement_level, initial_config, execution_mode, pack_file):
+        if os.environ.setdefault("SERVING_PID", str(os.getpid())) != str(os.getpid()):
+            sys.exit("served in a worker process")
+        servicer = pulumi_policy.server._PolicyAnalyzerServicer(
+            name, version, policies, enforcement_level, initial_config, execution_mode, pack_file)
+        request = proto.AnalyzeRequest(type="test:index:Resource", urn="urn", name="res",
+                                       options=proto.AnalyzerResourceOptions())
+        print(servicer.Analyze(request, None).diagnostics[0].message)
+        servicer.close()
+
+    pulumi_policy.server.serve = serve
+
+    PolicyPack("unguarded-pack", [ResourceValidationPolicy("check-pid", "Reports the process id.", check_pid)],
+               execution_mode=ExecutionMode.PROCESS_POOL)
+""")
+
+
+def make_request() -> proto.AnalyzeRequest:
+    props = struct_pb2.Struct()
+    props.update({"size": 3, "unknown": UNKNOWN_STRING_VALUE})
+    return proto.AnalyzeRequest(
+        type="test:index:Resource",
+        properties=props,
+        urn="urn:pulumi:stack::project::test:index:Resource::res",
+        name="res",
+        options=proto.AnalyzerResourceOptions(),
+    )
+
+
+def configure(servicer: _PolicyAnalyzerServicer) -> None:
+    servicer.Configure(proto.ConfigureAnalyzerRequest(policyConfig={
+        "check-async": proto.PolicyConfig(properties={"limit": 5}, enforcementLevel=proto.MANDATORY),
+    }), None)
+
+
+class ProcessPoolTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.pack_file = os.path.join(self.tmp.name, "__main__.py")
+        with open(self.pack_file, "w", encoding="utf-8") as f:
+            f.write(PACK)
+        self.policies = runpy.run_path(self.pack_file, run_name="process_pack")["POLICIES"]
+        self.env = mock.patch.dict(os.environ, {"PULUMI_POLICY_MAX_PROCESSES": "1"})
+        self.env.start()
+
+    def tearDown(self):
+        self.env.stop()
+        self.tmp.cleanup()
+
+    def make_servicer(self, pack_file, cls=_PolicyAnalyzerServicer):
+        servicer = cls("process-pack", "0.0.1", self.policies, EnforcementLevel.ADVISORY, None,
+                       ExecutionMode.PROCESS_POOL, pack_file)
+        self.addCleanup(servicer.close)
+        configure(servicer)
+        return servicer
+
+    def test_diagnostics_match_in_process(self):
+        in_process = self.make_servicer(None).Analyze(make_request(), None)
+        in_pool = self.make_servicer(self.pack_file).Analyze(make_request(), None)
+
+        # Everything matches except the process the policies ran in.
+        self.assertEqual(in_process.diagnostics[:-1], in_pool.diagnostics[:-1])
+        self.assertEqual(str(os.getpid()), in_process.diagnostics[-1].message.split("\n")[1])
+        self.assertNotEqual(str(os.getpid()), in_pool.diagnostics[-1].message.split("\n")[1])
+
+        messages = [d.message for d in in_pool.diagnostics]
+        self.assertEqual([
+            "Checks the name.\nres has size 3.0",
+            "Checks the name.\nwith a urn",
+            "Checks async.\nasync config {'limit': 5.0}",
+            "Checks unknowns.\nbefore unknown",
+            "can't run policy 'check-unknown' during preview: string value at .unknown can't be known during preview",
+        ], messages[:-1])
+        self.assertEqual(proto.MANDATORY, in_pool.diagnostics[2].enforcementLevel)
+
+    def test_policy_execution_mode_overrides_pack(self):
+        self.policies[-1].execution_mode = ExecutionMode.IN_PROCESS
+        response = self.make_servicer(self.pack_file).Analyze(make_request(), None)
+        self.assertEqual(str(os.getpid()), response.diagnostics[-1].message.split("\n")[1])
+
+    def test_async_servicer(self):
+        servicer = self.make_servicer(self.pack_file, _AsyncPolicyAnalyzerServicer)
+        response = asyncio.run(servicer.Analyze(make_request(), None))
+        self.assertEqual(6, len(response.diagnostics))
+        self.assertNotEqual(str(os.getpid()), response.diagnostics[-1].message.split("\n")[1])
+
+    def test_workers_dont_trace(self):
+        trace_path = os.path.join(self.tmp.name, "trace.json")
+        with mock.patch.dict(os.environ, {"PULUMI_POLICY_TRACE_PATH": trace_path}):
+            servicer = self.make_servicer(self.pack_file)
+            servicer.Analyze(make_request(), None)
+            servicer.Analyze(make_request(), None)
+            servicer.close()
+
+        # Only the plugin process writes the trace, so the workers neither truncate it nor interleave
+        # their spans with the plugin's.
+        with open(trace_path, encoding="utf-8") as f:
+            events = json.load(f)
+        self.assertIn("Analyze", {event["name"] for event in events})
+        self.assertEqual({os.getpid()}, {event["pid"] for event in events})
+
+    def test_worker_servicer_has_no_trace(self):
+        trace_path = os.path.join(self.tmp.name, "trace.json")
+        with mock.patch.dict(os.environ, {"PULUMI_POLICY_TRACE_PATH": trace_path}):
+            servicer = _PolicyAnalyzerServicer("process-pack", "0.0.1", self.policies, EnforcementLevel.ADVISORY,
+                                               worker=True)
+            servicer.close()
+        self.assertFalse(os.path.exists(trace_path))
+
+    def test_worker_servicer_has_no_profiler(self):
+        profile_dir = os.path.join(self.tmp.name, "profiles")
+        with mock.patch.dict(os.environ, {"PULUMI_POLICY_PROFILE_DIR": profile_dir,
+                                          "PULUMI_POLICY_PROFILE_MODE": "sample"}):
+            servicer = _PolicyAnalyzerServicer("process-pack", "0.0.1", self.policies, EnforcementLevel.ADVISORY,
+                                               worker=True)
+            servicer.close()
+        # The worker would never close a profiler, so its samples would be lost, and its cProfile
+        # sequence numbers would collide with the plugin's.
+        self.assertFalse(os.path.exists(profile_dir))
+
+    def test_unguarded_pack(self):
+        pack_file = os.path.join(self.tmp.name, "unguarded.py")
+        with open(pack_file, "w", encoding="utf-8") as f:
+            f.write(UNGUARDED_PACK)
+        env = dict(os.environ)
+        env.pop("PULUMI_POLICY_PROCESS_POOL_PARENT", None)
+        env["PYTHONPATH"] = os.path.dirname(os.path.dirname(os.path.abspath(pulumi_policy.__file__)))
+        result = subprocess.run([sys.executable, pack_file], env=env, capture_output=True, text=True,
+                                timeout=60, check=False)
+        self.assertEqual(0, result.returncode, result.stderr)
+        description, pid = result.stdout.splitlines()
+        self.assertEqual("Reports the process id.", description)
+        self.assertTrue(pid.isdigit())
+
+    def test_worker_reuses_last_request(self):
+        with mock.patch.multiple(process, _worker_servicer=None, _worker_policies={},
+                                 _worker_event_loop=EventLoopThread(), _last_view=None):
+            process.register_worker_policies("process-pack", "0.0.1", self.policies, EnforcementLevel.ADVISORY, None)
+            request = make_request().SerializeToString()
+            with mock.patch.object(proto.AnalyzeRequest, "FromString",
+                                   wraps=proto.AnalyzeRequest.FromString) as parse:
+                # pylint: disable=protected-access
+                name = process._validate("check-name", request, None)
+                pid = process._validate("check-pid", request, None)
+                self.assertEqual(1, parse.call_count)
+                other = make_request()
+                other.name = "other"
+                process._validate("check-pid", other.SerializeToString(), None)
+                self.assertEqual(2, parse.call_count)
+        self.assertEqual(("res has size 3.0", None), name.violations[0])
+        self.assertEqual([(str(os.getpid()), None)], pid.violations)
+
+
+class ExecutionModeTests(unittest.TestCase):
+    def test_invalid_execution_mode(self):
+        with self.assertRaises(TypeError):
+            ResourceValidationPolicy("name", "description", lambda args, report: None,
+                                     execution_mode="process-pool")
+        with self.assertRaises(TypeError):
+            PolicyPack("pack", [ResourceValidationPolicy("name", "description", lambda args, report: None)],
+                       execution_mode="process-pool")
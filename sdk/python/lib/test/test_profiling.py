@@ -0,0 +1,81 @@
+# Copyright 2016-2020, Pulumi Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import pstats
+import tempfile
+import unittest
+
+from pulumi_policy.profiling import CProfileProfiler, Profiler, SamplingProfiler, create_profiler
+
+
+def busy_policy():
+    return sum(range(1000))
+
+
+class ProfilerTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.addCleanup(self.directory.cleanup)
+        self.path = os.path.join(self.directory.name, "profiles")
+
+    def test_cprofile(self):
+        profiler = CProfileProfiler(self.path)
+        with profiler.profile("Analyze", "my policy"):
+            busy_policy()
+        profiler.close()
+
+        self.assertEqual(["000000-Analyze-my_policy.prof"], os.listdir(self.path))
+        stats = pstats.Stats(os.path.join(self.path, "000000-Analyze-my_policy.prof"))
+        self.assertIn("busy_policy", [func for _, _, func in stats.stats])  # type: ignore
+
+    def test_every(self):
+        profiler = CProfileProfiler(self.path, every=2)
+        for label in ["a", "b", "c"]:
+            with profiler.profile("Analyze", label):
+                pass
+        self.assertEqual(["000000-Analyze-a.prof", "000002-Analyze-c.prof"], sorted(os.listdir(self.path)))
+
+    def test_sample(self):
+        # Sample by hand rather than waiting for the background sampler.
+        profiler = SamplingProfiler(self.path, interval=3600)
+        with profiler.profile("Analyze", "policy"):
+            profiler.sample()
+            profiler.sample()
+        profiler.sample()
+        profiler.close()
+
+        with open(os.path.join(self.path, f"pulumi-policy-{os.getpid()}.folded"), encoding="utf-8") as f:
+            lines = f.read().splitlines()
+        self.assertEqual(1, len(lines))
+        stack, count = lines[0].rsplit(" ", 1)
+        self.assertEqual("2", count)
+        frames = stack.split(";")
+        self.assertEqual("Analyze:policy", frames[0])
+        self.assertTrue(frames[-1].startswith("sample (profiling.py:"))
+        self.assertTrue(frames[-2].startswith("test_sample (test_profiling.py:"))
+
+    def test_create_profiler(self):
+        self.assertIsInstance(create_profiler(self.path, "cprofile"), CProfileProfiler)
+        profiler = create_profiler(self.path, "sample")
+        profiler.close()
+        self.assertIsInstance(profiler, SamplingProfiler)
+        self.assertRaises(ValueError, lambda: create_profiler(self.path, "perf"))
+
+    def test_invalid_args(self):
+        self.assertRaises(TypeError, lambda: CProfileProfiler(""))
+        self.assertRaises(TypeError, lambda: CProfileProfiler(self.path, every=0))
+
+    def test_abstract(self):
+        self.assertRaises(TypeError, lambda: Profiler(self.path))  # pylint: disable=abstract-class-instantiated
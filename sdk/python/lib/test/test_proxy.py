@@ -12,10 +12,16 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from collections.abc import Mapping, Sequence
+import copy
+import pickle
 import unittest
 
 from typing import Callable, List
 
+from google.protobuf import struct_pb2
+
+import pulumi_policy.deserialize as deserialize
 import pulumi_policy.proxy as proxy
 
 class ProxyTests(unittest.TestCase):
@@ -121,3 +127,183 @@ class ProxyTests(unittest.TestCase):
                 count += 1
 
         self.assert_raises_unknown_value(dict_values, proxy.UNKNOWN_BOOLEAN_VALUE, ["foo", "b"])
+
+
+    def test_nested_values_wrapped_once(self):
+        props = proxy.unknown_checking_proxy({"foo": {"bar": [{"baz": 1}]}})
+        self.assertIs(props["foo"], props["foo"])
+        self.assertIs(props["foo"]["bar"][0], props["foo"]["bar"][-1])
+        self.assertEqual({"bar": [{"baz": 1}]}, {"bar": [dict(props["foo"]["bar"][0])]})
+
+
+    def test_list_slices_and_negative_indexes(self):
+        props = proxy.unknown_checking_proxy({"foo": [{"a": 1}, {"b": proxy.UNKNOWN_STRING_VALUE}, True]})
+        sliced = props["foo"][1:]
+        self.assertEqual(2, len(sliced))
+        self.assertIs(props["foo"][1], sliced[0])
+        self.assertEqual(True, sliced[1])
+
+        self.assert_raises_unknown_value(lambda: sliced[0]["b"], proxy.UNKNOWN_STRING_VALUE, ["foo", "1", "b"])
+        self.assert_raises_unknown_value(lambda: props["foo"][-2]["b"], proxy.UNKNOWN_STRING_VALUE,
+                                         ["foo", "1", "b"])
+
+
+class StructViewTests(unittest.TestCase):
+    PROPS = {
+        "string": "a",
+        "number": 1,
+        "bool": True,
+        "null": None,
+        "unknown": proxy.UNKNOWN_STRING_VALUE,
+        "map": {"list": [1, {"b": proxy.UNKNOWN_NUMBER_VALUE}, [proxy.UNKNOWN_BOOLEAN_VALUE]], "c": "d"},
+        "secret": {deserialize.SPECIAL_SIG_KEY: deserialize.SPECIAL_SECRET_SIG, "value": {"e": "f"}},
+        "unknownSecret": {deserialize.SPECIAL_SIG_KEY: deserialize.SPECIAL_SECRET_SIG,
+                          "value": proxy.UNKNOWN_STRING_VALUE},
+        "asset": {deserialize.SPECIAL_SIG_KEY: deserialize.SPECIAL_ASSET_SIG, "text": "some text"},
+    }
+
+    def setUp(self):
+        struct = struct_pb2.Struct()
+        struct.update(self.PROPS)
+        self.struct = struct
+        self.view = proxy.struct_view(struct)
+        self.eager = proxy.unknown_checking_proxy(deserialize.deserialize_struct(struct))
+
+    def test_reads_like_eager_proxy(self):
+        for props in [self.view, self.eager]:
+            self.assertEqual(len(self.PROPS), len(props))
+            self.assertEqual(sorted(self.PROPS), sorted(props))
+            self.assertEqual("a", props["string"])
+            self.assertEqual(1.0, props["number"])
+            self.assertIsInstance(props["number"], float)
+            self.assertEqual(True, props["bool"])
+            self.assertIsNone(props["null"])
+            self.assertEqual("d", props["map"]["c"])
+            self.assertEqual(1.0, props["map"]["list"][0])
+            self.assertEqual(3, len(props["map"]["list"]))
+            self.assertEqual({"e": "f"}, dict(props["secret"]))
+            self.assertEqual("some text", props["asset"].text)
+            self.assertIs(props["map"], props["map"])
+            self.assertIs(props["asset"], props["asset"])
+            self.assertNotIn("missing", props)
+            self.assertIn("map", props)
+            with self.assertRaises(KeyError):
+                props["missing"]  # pylint: disable=pointless-statement
+
+    def test_raises_like_eager_proxy(self):
+        cases = [
+            (lambda p: p["unknown"], proxy.UNKNOWN_STRING_VALUE, ["unknown"]),
+            (lambda p: p["map"]["list"][1]["b"], proxy.UNKNOWN_NUMBER_VALUE, ["map", "list", "1", "b"]),
+            (lambda p: p["map"]["list"][-2]["b"], proxy.UNKNOWN_NUMBER_VALUE, ["map", "list", "1", "b"]),
+            (lambda p: list(p["map"]["list"][2]), proxy.UNKNOWN_BOOLEAN_VALUE, ["map", "list", "2", "0"]),
+            (lambda p: p["unknownSecret"], proxy.UNKNOWN_STRING_VALUE, ["unknownSecret"]),
+        ]
+        for read, sentinel, path in cases:
+            for props in [self.view, self.eager]:
+                with self.assertRaises(proxy.UnknownValueError) as cm:
+                    read(props)
+                self.assertEqual(sentinel, cm.exception.unknown_type_sentinel)
+                self.assertEqual(path, cm.exception.props)
+
+    def test_slices_like_eager_proxy(self):
+        view_slice, eager_slice = self.view["map"]["list"][::2], self.eager["map"]["list"][::2]
+        self.assertEqual(2, len(view_slice))
+        self.assertEqual(eager_slice[0], view_slice[0])
+        self.assertIs(self.view["map"]["list"][2], view_slice[1])
+
+    def test_does_not_modify_struct(self):
+        self.assertNotIn("missing", self.view)
+        self.assertNotIn("missing", self.struct.fields)
+
+
+def thaw(value):
+    if isinstance(value, Mapping):
+        return {k: thaw(v) for k, v in value.items()}
+    if isinstance(value, tuple):
+        return [thaw(v) for v in value]
+    return value
+
+
+class FrozenPropertiesTests(unittest.TestCase):
+    def make_struct(self, props) -> struct_pb2.Struct:
+        struct = struct_pb2.Struct()
+        struct.update(props)
+        return struct
+
+    def test_known_properties(self):
+        struct = self.make_struct({
+            "string": "a",
+            "number": 1,
+            "list": [1, [2, {"three": [3]}], {"four": 4}],
+            "map": {"a": {"b": None}},
+            "secret": {deserialize.SPECIAL_SIG_KEY: deserialize.SPECIAL_SECRET_SIG, "value": [1]},
+        })
+        props, unknown_paths = proxy.frozen_properties(struct)
+
+        self.assertEqual(frozenset(), unknown_paths)
+        self.assertEqual(deserialize.deserialize_struct(struct), thaw(props))
+        self.assertIsInstance(props, proxy.FrozenDict)
+        self.assertIsInstance(props["list"], tuple)
+        self.assertIsInstance(props["list"][1], tuple)
+        self.assertIsInstance(props["list"][1][1], proxy.FrozenDict)
+        self.assertIsInstance(props["list"][1][1]["three"], tuple)
+        self.assertIsInstance(props["map"]["a"], proxy.FrozenDict)
+        self.assertIsInstance(props["secret"], tuple)
+        with self.assertRaises(TypeError):
+            props["map"]["c"] = "d"  # type: ignore
+
+    def test_unknown_paths(self):
+        struct = self.make_struct({
+            "unknown": proxy.UNKNOWN_STRING_VALUE,
+            "list": ["a", proxy.UNKNOWN_NUMBER_VALUE, [{"b": proxy.UNKNOWN_BOOLEAN_VALUE}]],
+            "map": {"c": {"d": proxy.UNKNOWN_OBJECT_VALUE}},
+            "secret": {deserialize.SPECIAL_SIG_KEY: deserialize.SPECIAL_SECRET_SIG,
+                       "value": proxy.UNKNOWN_STRING_VALUE},
+            "asset": {deserialize.SPECIAL_SIG_KEY: deserialize.SPECIAL_ASSET_SIG, "text": "some text"},
+        })
+        expected = {("unknown",), ("list", "1"), ("list", "2", "0", "b"), ("map", "c", "d"), ("secret",)}
+
+        props, unknown_paths = proxy.frozen_properties(struct)
+        self.assertEqual(expected, unknown_paths)
+        self.assertEqual(expected, set(proxy.unknown_paths_view(struct)))
+
+        checked = proxy.unknown_checking_proxy(props)
+        for path in expected:
+            with self.assertRaises(proxy.UnknownValueError) as cm:
+                value = checked
+                for key in path:
+                    value = value[int(key)] if isinstance(value, Sequence) else value[key]
+            self.assertEqual(list(path), cm.exception.props)
+        self.assertEqual("a", checked["list"][0])
+
+    def test_copy_and_pickle(self):
+        struct = self.make_struct({
+            "list": [1, {"a": "b"}],
+            "map": {"c": {"d": None}},
+            "asset": {deserialize.SPECIAL_SIG_KEY: deserialize.SPECIAL_ASSET_SIG, "text": "some text"},
+        })
+        props, _ = proxy.frozen_properties(struct)
+
+        self.assertIs(props, copy.copy(props))
+        for copied in (copy.deepcopy(props), pickle.loads(pickle.dumps(props))):
+            self.assertIsInstance(copied, proxy.FrozenDict)
+            self.assertIsInstance(copied["list"][1], proxy.FrozenDict)
+            self.assertEqual(thaw(props)["map"], thaw(copied)["map"])
+            self.assertEqual("some text", copied["asset"].text)
+            self.assertIsNot(props["asset"], copied["asset"])
+
+        editable = dict(props)
+        editable["map"] = "changed"
+        self.assertEqual("changed", editable["map"])
+        self.assertEqual({"c": {"d": None}}, props["map"])
+        for modify in (lambda p: p.update(map=1), lambda p: p.pop("map"), lambda p: p.setdefault("e", 1),
+                       lambda p: p.clear(), lambda p: p.__delitem__("map")):
+            with self.assertRaises(TypeError):
+                modify(props)
+
+        checked = proxy.unknown_checking_proxy(
+            proxy.frozen_properties(self.make_struct({"a": proxy.UNKNOWN_STRING_VALUE, "b": {"c": 1}}))[0])
+        for copied in (copy.deepcopy(checked), pickle.loads(pickle.dumps(checked))):
+            self.assertEqual(1, copied["b"]["c"])
+            with self.assertRaises(proxy.UnknownValueError):
+                copied["a"]  # pylint: disable=pointless-statement
@@ -0,0 +1,123 @@
+# Copyright 2016-2020, Pulumi Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from concurrent import futures
+import threading
+from typing import List
+import unittest
+
+from pulumi_policy import PolicyCustomTimeouts, PolicyResource, PolicyResourceOptions, StackValidationArgs
+from pulumi_policy.table import ResourceData, ResourceTable, ResourceTableBuilder
+
+OPTS = PolicyResourceOptions(False, [], None, [], PolicyCustomTimeouts(0, 0, 0), [])
+
+
+def make_table(loaded: List[int]) -> ResourceTable:
+    def load(i: int) -> ResourceData:
+        loaded.append(i)
+        return ResourceData({"index": i}, OPTS, None, frozenset())
+
+    # The instance's tags depend on a resource outside of the stack.
+    builder = ResourceTableBuilder()
+    builder.add("aws:ec2/vpc:Vpc", "vpc", "urn:vpc", None, [], [])
+    builder.add("aws:ec2/subnet:Subnet", "subnet", "urn:subnet", "urn:vpc", [], [])
+    builder.add("aws:ec2/instance:Instance", "instance", "urn:instance", "urn:subnet",
+                ["urn:subnet", "urn:vpc", "urn:missing"], [("subnetId", ["urn:subnet"]), ("tags", ["urn:missing"])])
+    return builder.build(load)
+
+
+class ResourceTableTests(unittest.TestCase):
+    def test_columns(self):
+        table = make_table([])
+        self.assertEqual(3, len(table))
+        self.assertEqual(2, table.id("urn:instance"))
+        self.assertIsNone(table.id("urn:missing"))
+        self.assertIsNone(table.parent(0))
+        self.assertEqual(1, table.parent(2))
+        self.assertEqual([1, 0], list(table.dependencies(2)))
+        self.assertEqual([], list(table.dependencies(0)))
+        self.assertEqual({"subnetId": [1], "tags": []}, table.property_dependencies(2))
+        self.assertEqual({}, table.property_dependencies(1))
+
+    def test_resources_created_on_demand(self):
+        loaded: List[int] = []
+        table = make_table(loaded)
+
+        instance = table.resources[-1]
+        self.assertEqual([2], loaded)
+        self.assertIsInstance(instance, PolicyResource)
+        self.assertEqual("instance", instance.name)
+        self.assertEqual("aws:ec2/instance:Instance", instance.resource_type)
+        self.assertEqual({"index": 2}, instance.props)
+        self.assertIs(OPTS, instance.opts)
+
+        subnet = instance.parent
+        self.assertEqual([2, 1], loaded)
+        self.assertIs(table.resource(1), subnet)
+        self.assertIs(table.resource(0), subnet.parent)
+        self.assertIsNone(subnet.parent.parent)
+        self.assertEqual([subnet, subnet.parent], instance.dependencies)
+        self.assertEqual({"subnetId": [subnet], "tags": []}, instance.property_dependencies)
+        self.assertIs(instance.dependencies, instance.dependencies)
+
+        self.assertEqual(list(table.resources), list(table.resources[0:3]))
+        self.assertEqual([2, 1, 0], loaded)
+        with self.assertRaises(IndexError):
+            table.resources[3]  # pylint: disable=pointless-statement
+
+    def test_load_all(self):
+        loaded: List[int] = []
+        table = make_table(loaded)
+        table.resource(1)
+        table.load_all()
+        self.assertEqual([1, 0, 2], loaded)
+        table.load_all()
+        self.assertEqual([1, 0, 2], loaded)
+
+    def test_resources_created_concurrently(self):
+        loaded: List[int] = []
+        # Resources 0 and 1 can only finish loading once both have started.
+        barrier = threading.Barrier(2, timeout=5)
+
+        def load(i: int) -> ResourceData:
+            if i < 2:
+                barrier.wait()
+            loaded.append(i)
+            return ResourceData({"index": i}, OPTS, None, frozenset())
+
+        builder = ResourceTableBuilder()
+        for name in ("a", "b", "c"):
+            builder.add("test:index:Resource", name, f"urn:{name}", None, [], [])
+        table = builder.build(load)
+
+        with futures.ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(table.resource, [0, 1, 2, 2, 2, 2, 2, 2]))
+
+        self.assertEqual([0, 1, 2], sorted(loaded))
+        self.assertTrue(all(r is results[2] for r in results[2:]))
+        self.assertEqual(["a", "b", "c"], [r.name for r in results[:3]])
+
+    def test_from_resources(self):
+        vpc = PolicyResource("aws:ec2/vpc:Vpc", {}, "urn:vpc", "vpc", OPTS, None, None, [], {})
+        subnet = PolicyResource("aws:ec2/subnet:Subnet", {}, "urn:subnet", "subnet", OPTS, None, vpc, [vpc],
+                                {"vpcId": [vpc], "tags": []})
+        args = StackValidationArgs([vpc, subnet])
+
+        table = args.table
+        self.assertIs(table, args.table)
+        self.assertEqual(["vpc", "subnet"], list(table.names))
+        self.assertEqual(0, table.parent(1))
+        self.assertEqual([0], list(table.dependencies(1)))
+        self.assertEqual({"vpcId": [0], "tags": []}, table.property_dependencies(1))
+        self.assertIs(subnet, table.resource(1))
@@ -0,0 +1,87 @@
+# Copyright 2016-2020, Pulumi Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import pulumi_policy.tracing as tracing_module
+from pulumi_policy.tracing import Tracer
+
+
+class TracerTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.addCleanup(self.directory.cleanup)
+        self.path = os.path.join(self.directory.name, "trace.json")
+
+    def read(self):
+        with open(self.path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def test_spans(self):
+        tracer = Tracer(self.path)
+        tracer.span("outer", "rpc", 1.0, 1.5, {"urn": "urn"})
+        thread = threading.Thread(target=lambda: tracer.span("inner", "policies", 1.1, 1.2), name="worker")
+        thread.start()
+        thread.join()
+        tracer.close()
+
+        events = self.read()
+        spans = [e for e in events if e["ph"] == "X"]
+        self.assertEqual(["outer", "inner"], [e["name"] for e in spans])
+        self.assertEqual({"name": "outer", "cat": "rpc", "ph": "X", "pid": os.getpid(),
+                          "tid": threading.get_ident(), "ts": 1_000_000.0, "dur": 500_000.0,
+                          "args": {"urn": "urn"}}, spans[0])
+        self.assertNotIn("args", spans[1])
+        thread_names = {e["tid"]: e["args"]["name"] for e in events if e["ph"] == "M"}
+        self.assertEqual("worker", thread_names[spans[1]["tid"]])
+
+    def test_empty(self):
+        Tracer(self.path).close()
+        self.assertEqual([], self.read())
+
+    def test_closed(self):
+        tracer = Tracer(self.path)
+        tracer.close()
+        tracer.span("late", "rpc", 1.0, 2.0)
+        tracer.close()
+        self.assertEqual([], self.read())
+
+    def test_drops_when_full(self):
+        # Block the writer so that the buffer fills up.
+        unblocked = threading.Event()
+
+        def dumps(*args, **kwargs):
+            unblocked.wait(5)
+            return json.dumps(*args, **kwargs)
+
+        with mock.patch.object(tracing_module, "json", mock.Mock(dumps=dumps)):
+            tracer = Tracer(self.path, max_buffered_events=1)
+            for _ in range(100):
+                tracer.span("span", "rpc", 1.0, 2.0)
+            dropped = tracer.dropped()
+            unblocked.set()
+            tracer.close()
+        self.assertGreater(dropped, 0)
+        events = self.read()
+        self.assertEqual(dropped, events[-1]["args"]["count"])
+        self.assertEqual(101 - dropped, len(events) - 1)
+
+    def test_invalid_path(self):
+        self.assertRaises(TypeError, lambda: Tracer(""))
+        self.assertRaises(TypeError, lambda: Tracer(None))